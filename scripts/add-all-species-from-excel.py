@@ -8,6 +8,9 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from red_list_sync import catalogo_resolver, load_catalogos, sync_red_list
+from supabase_fetch import fetch_all
+from taxonomy_cache import invalidate
 from collections import defaultdict
 
 # Cargar variables de entorno
@@ -93,7 +96,7 @@ def main():
 
     # Obtener taxones existentes
     print("\n🔍 Obteniendo taxones existentes de la base de datos...")
-    taxon_response = supabase.table('taxon').select('id_taxon, taxon, rank_id, taxon_id').execute()
+    taxones = fetch_all(supabase, 'taxon', 'id_taxon, taxon, rank_id, taxon_id', key='id_taxon')
 
     familias_existentes = {}  # nombre -> id_taxon
     generos_existentes = {}  # nombre -> id_taxon
@@ -103,7 +106,7 @@ def main():
     generos_map = {}  # id_taxon -> nombre
     especies_map = {}  # id_taxon -> {nombre_especie, genero_id}
 
-    for taxon in taxon_response.data:
+    for taxon in taxones:
         if taxon['rank_id'] == 5:  # Familia
             familias_existentes[taxon['taxon']] = taxon['id_taxon']
         elif taxon['rank_id'] == 6:  # Género
@@ -129,27 +132,10 @@ def main():
 
     # Obtener catálogos de Red List
     print("\n🔍 Obteniendo catálogos de Lista Roja UICN...")
-    catalogo_response = supabase.table('catalogo_awe').select('id_catalogo_awe, nombre, sigla').eq('tipo_catalogo_awe_id', 10).execute()
+    catalogos = load_catalogos(supabase)
+    obtener_id_catalogo = catalogo_resolver(catalogos)
 
-    catalogo_map = {}
-    for cat in catalogo_response.data:
-        sigla = str(cat['sigla']).strip().upper() if cat['sigla'] else None
-        nombre = str(cat['nombre']).strip().upper()
-        if sigla:
-            catalogo_map[sigla] = cat['id_catalogo_awe']
-        catalogo_map[nombre] = cat['id_catalogo_awe']
-
-    print(f"✅ Catálogos de Red List: {len(catalogo_map)}")
-
-    # Función para obtener id_catalogo_awe
-    def obtener_id_catalogo(valor):
-        if pd.isna(valor) or valor == '' or str(valor).lower() == 'nan':
-            return None
-        valor_str = str(valor).strip().upper()
-        if 'CR' in valor_str and ('PE' in valor_str or '(PE)' in valor_str):
-            return catalogo_map.get('CR(PE)')
-        valor_normalizado = valor_str.replace(' ', '').replace('(', '').replace(')', '')
-        return catalogo_map.get(valor_str) or catalogo_map.get(valor_normalizado)
+    print(f"✅ Catálogos de Red List: {len(catalogos)}")
 
     # Función para determinar endemismo
     def es_endemica(valor):
@@ -166,7 +152,7 @@ def main():
     generos_creados = 0
     especies_creadas = 0
     fichas_creadas = 0
-    red_list_asignadas = 0
+    red_list_deseada = {}  # taxon_id -> id_catalogo_awe
     altitudinal_actualizado = 0
     endemismo_actualizado = 0
     errores = []
@@ -179,30 +165,11 @@ def main():
 
             # Verificar si ya existe usando nombre completo
             if nombre_cientifico in especies_existentes:
-                # Ya existe, verificar si tiene Red List
+                # Ya existe: la Red List se completa al final, en bloque
                 especie_id_existente = especies_existentes[nombre_cientifico]
-                # Verificar Red List (consulta simple sin join)
-                red_list_check = supabase.table('taxon_catalogo_awe').select('id_taxon_catalogo_awe, catalogo_awe_id').eq('taxon_id', especie_id_existente).execute()
-
-                # Verificar si alguno de los catálogos es de tipo Red List (tipo_catalogo_awe_id = 10)
-                tiene_red_list = False
-                if red_list_check.data:
-                    # Obtener los IDs de catálogo y verificar si alguno es de Red List
-                    catalogo_ids = [r['catalogo_awe_id'] for r in red_list_check.data]
-                    if catalogo_ids:
-                        catalogo_verificacion = supabase.table('catalogo_awe').select('id_catalogo_awe, tipo_catalogo_awe_id').in_('id_catalogo_awe', catalogo_ids).execute()
-                        if catalogo_verificacion.data:
-                            tiene_red_list = any(c['tipo_catalogo_awe_id'] == 10 for c in catalogo_verificacion.data)
-
-                if not tiene_red_list:
-                    # Existe pero no tiene Red List, asignarla
-                    id_catalogo = obtener_id_catalogo(row[red_list_col] if red_list_col else None)
-                    if id_catalogo:
-                        supabase.table('taxon_catalogo_awe').insert({
-                            'taxon_id': especie_id_existente,
-                            'catalogo_awe_id': id_catalogo
-                        }).execute()
-                        red_list_asignadas += 1
+                id_catalogo = obtener_id_catalogo(row[red_list_col] if red_list_col else None)
+                if id_catalogo:
+                    red_list_deseada[especie_id_existente] = id_catalogo
                 continue  # Ya existe, saltar creación
 
             # Extraer género y especie
@@ -304,18 +271,10 @@ def main():
                 supabase.table('taxon').update({'endemica': endemica}).eq('id_taxon', especie_id).execute()
                 endemismo_actualizado += 1
 
-            # Asignar Red List
+            # Red List: se asigna al final, en bloque
             id_catalogo = obtener_id_catalogo(row[red_list_col] if red_list_col else None)
             if id_catalogo:
-                # Verificar que no exista ya
-                existing = supabase.table('taxon_catalogo_awe').select('id_taxon_catalogo_awe').eq('taxon_id', especie_id).eq('catalogo_awe_id', id_catalogo).execute()
-
-                if not existing.data:
-                    supabase.table('taxon_catalogo_awe').insert({
-                        'taxon_id': especie_id,
-                        'catalogo_awe_id': id_catalogo
-                    }).execute()
-                    red_list_asignadas += 1
+                red_list_deseada[especie_id] = id_catalogo
 
             if especies_creadas % 50 == 0:
                 print(f"  📊 Progreso: {especies_creadas} especies creadas...")
@@ -324,6 +283,11 @@ def main():
             errores.append(f"{nombre_cientifico}: {str(e)}")
             print(f"  ❌ Error procesando {nombre_cientifico}: {str(e)}")
 
+    # Asignar Red List a las especies que no tienen (un solo paso, sin duplicados)
+    print("\n🔄 Asignando Lista Roja a especies sin categoría...")
+    _, red_list_resultado = sync_red_list(supabase, red_list_deseada, solo_faltantes=True)
+    red_list_asignadas = red_list_resultado['insertados']
+
     # Resumen
     print(f"\n📊 Resumen:")
     print(f"  ➕ Géneros creados: {generos_creados}")
@@ -339,6 +303,9 @@ def main():
         for error in errores[:10]:
             print(f"    - {error}")
 
+    # Se crearon taxones/fichas: el snapshot de taxonomía ya no sirve
+    invalidate()
+
 if __name__ == "__main__":
     main()
 
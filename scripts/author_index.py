@@ -0,0 +1,162 @@
+"""
+Índice de la tabla autor para resolver autores en lote.
+
+Antes cada script buscaba autor por autor con un ilike sobre apellidos y
+creaba los que faltaban uno a uno. Aquí la tabla se lee una vez por keyset
+(iter_rows de supabase_fetch, sin tope de max-rows) y cada autor queda indexado
+por sus apellidos normalizados:
+- sin tildes ni mayúsculas, sin '†';
+- guiones como espacios ('Reyes-Puig' = 'Reyes Puig');
+- sin partículas ('de la Riva' = 'Riva', 'von May' = 'May');
+- letras sueltas que vienen pegadas a los apellidos ('Coloma L. A.') pasan a
+  los nombres como iniciales.
+Los nombres se comparan palabra por palabra ('J. P.', 'J.P.' y 'JP' dan
+('j', 'p')). Dos autores con los mismos apellidos son compatibles si alguno
+no tiene nombres o si cada par de palabras coincide: dos nombres completos
+deben ser iguales (o uno abreviar al otro: 'Chris' / 'Christopher'), y si
+alguno es una inicial basta la primera letra. Así 'J.' y 'Juan Pablo' son
+compatibles, pero 'Elke' y 'Erich' no.
+
+Los autores que no existen se juntan como pendientes (uno por apellidos +
+nombres compatibles) y se crean con un solo insert que devuelve los ids.
+
+Uso:
+    from author_index import clave_autor, insertar_autores, load_autores
+
+    indice = load_autores(supabase)
+    id_autor = indice.resolve('Coloma', 'L. A.')          # None si no existe
+    clave = indice.pendiente('Nuevo-Autor', 'X.')          # se crea después
+    ids = insertar_autores(supabase, indice.filas_pendientes())   # clave → id_autor
+"""
+
+import re
+
+from name_resolver import quitar_tildes
+from supabase_fetch import iter_rows
+
+PARTICULAS = {'de', 'del', 'la', 'las', 'los', 'da', 'das', 'do', 'dos', 'di', 'du', 'le',
+              'van', 'der', 'den', 'von', 'y', 'jr', 'sr'}
+
+
+def _tokens(texto) -> list[str]:
+    if not texto:
+        return []
+    texto = quitar_tildes(str(texto)).lower().replace('†', ' ')
+    return [t for t in re.split(r'[\s.\-_,]+', re.sub(r"[^a-z\s.\-_,]", '', texto)) if t]
+
+
+def nombres_de(nombres) -> tuple[str, ...]:
+    """'Juan Pablo' → ('juan', 'pablo'); 'J. P.', 'J.-P.', 'JP' → ('j', 'p')."""
+    if not nombres:
+        return ()
+    partes = []
+    for palabra in re.split(r'[\s.\-_,]+', str(nombres)):
+        # Iniciales pegadas en mayúsculas ('JP', 'LA')
+        if 1 < len(palabra) <= 3 and palabra.isupper():
+            palabra = ' '.join(palabra)
+        partes.extend(_tokens(palabra))
+    return tuple(partes)
+
+
+def separar(apellidos, nombres=None) -> tuple[str, tuple[str, ...]]:
+    """(apellidos normalizados, nombres normalizados) de un autor."""
+    tokens = _tokens(apellidos)
+    sueltas = tuple(t for t in tokens if len(t) == 1)
+    tokens = [t for t in tokens if len(t) > 1]
+    sin_particulas = [t for t in tokens if t not in PARTICULAS]
+    # Un apellido que solo tiene partículas ('La', 'Da') se conserva tal cual
+    normalizados = ' '.join(sin_particulas or tokens)
+    return normalizados, nombres_de(nombres) or sueltas
+
+
+def clave_autor(apellidos, nombres=None) -> str:
+    normalizados, nombres_n = separar(apellidos, nombres)
+    return f'{normalizados}|{" ".join(nombres_n)}'
+
+
+def compatibles(a: tuple[str, ...], b: tuple[str, ...]) -> bool:
+    """Nombres compatibles: completos iguales (o uno abrevia al otro); con una inicial, la primera letra."""
+    for x, y in zip(a, b):
+        if len(x) > 1 and len(y) > 1:
+            if not (x.startswith(y) or y.startswith(x)):
+                return False
+        elif x[0] != y[0]:
+            return False
+    return True
+
+
+class AutorIndex:
+    """
+    por_apellidos[apellidos normalizados]  [(nombres normalizados, id_autor)]
+    filas[id_autor]                        fila leída de la BD
+    pendientes[clave]                      {apellidos, nombres} por crear
+    """
+
+    def __init__(self):
+        self.por_apellidos = {}
+        self.filas = {}
+        self.pendientes = {}
+        self._pendientes_por_apellidos = {}
+
+    def __len__(self):
+        return len(self.filas)
+
+    def add(self, fila: dict) -> None:
+        normalizados, nombres_n = separar(fila.get('apellidos'), fila.get('nombres'))
+        if not normalizados:
+            return
+        self.filas[fila['id_autor']] = fila
+        self.por_apellidos.setdefault(normalizados, []).append((nombres_n, fila['id_autor']))
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def buscar(self, apellidos, nombres=None) -> list[int]:
+        """Ids con los mismos apellidos normalizados y nombres compatibles."""
+        normalizados, nombres_n = separar(apellidos, nombres)
+        return [id_autor for otros, id_autor in self.por_apellidos.get(normalizados, ())
+                if compatibles(nombres_n, otros)]
+
+    def resolve(self, apellidos, nombres=None) -> int | None:
+        """Un solo id_autor (el más antiguo si hay varios compatibles), o None."""
+        ids = self.buscar(apellidos, nombres)
+        return min(ids) if ids else None
+
+    # ─── Autores por crear ────────────────────────────────────────────────────
+
+    def pendiente(self, apellidos: str, nombres: str | None = None) -> str:
+        """
+        Registra un autor que no existe y devuelve su clave. Si ya hay un
+        pendiente con los mismos apellidos y nombres compatibles, devuelve
+        la clave de ese.
+        """
+        normalizados, nombres_n = separar(apellidos, nombres)
+        for otros, clave in self._pendientes_por_apellidos.get(normalizados, ()):
+            if compatibles(nombres_n, otros):
+                return clave
+        clave = clave_autor(apellidos, nombres)
+        self.pendientes[clave] = {'apellidos': apellidos, 'nombres': nombres or None}
+        self._pendientes_por_apellidos.setdefault(normalizados, []).append((nombres_n, clave))
+        return clave
+
+    def filas_pendientes(self) -> list[dict]:
+        return list(self.pendientes.values())
+
+
+def insertar_autores(supabase, filas: list[dict]) -> dict[str, int]:
+    """Crea los autores con un insert que devuelve los ids; clave → id_autor."""
+    if not filas:
+        return {}
+    resp = supabase.table('autor').insert(filas).execute()
+    return claves_de(resp.data or [])
+
+
+def claves_de(filas: list[dict]) -> dict[str, int]:
+    return {clave_autor(f['apellidos'], f.get('nombres')): f['id_autor'] for f in filas}
+
+
+def load_autores(supabase, columnas: str = 'id_autor, apellidos, nombres', prefetch: bool = True) -> AutorIndex:
+    """Recorre autor por keyset y arma el índice."""
+    indice = AutorIndex()
+    for fila in iter_rows(supabase, 'autor', columnas, key='id_autor', prefetch=prefetch):
+        indice.add(fila)
+    return indice
@@ -0,0 +1,94 @@
+"""
+Inserción por lotes con reintento por bisección.
+
+Cuando un lote falla, se divide en mitades y se reintenta cada mitad hasta
+aislar las filas problemáticas: con k filas malas en un lote de n se hacen del
+orden de 2·k·log2(n) peticiones en lugar de n inserts uno a uno. Las filas
+rechazadas se registran en un archivo JSONL (tabla, fila, error) para poder
+revisarlas y recargarlas después.
+
+Uso:
+    from batch_insert import RejectLog, insert_with_bisection
+
+    with RejectLog(ROOT_DIR / 'reports' / 'rechazos.jsonl') as rejects:
+        inserted = insert_with_bisection(supabase, 'coleccion', batch, rejects)
+
+Si el lote completo ya se intentó y falló, retry_by_bisection(...) parte
+directamente en mitades sin repetir esa petición.
+"""
+
+import json
+import threading
+from datetime import datetime
+
+
+class RejectLog:
+    """Archivo JSONL de filas rechazadas; seguro para usar desde varios hilos."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, table, row, error):
+        entry = {
+            'table': table,
+            'row': row,
+            'error': str(error),
+            'code': getattr(error, 'code', None),
+            'at': datetime.now().isoformat(timespec='seconds'),
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            # El archivo se crea solo si hay rechazos
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def insert_with_bisection(supabase, table, records, reject_log=None):
+    """
+    Inserta `records` en `table`. Si el insert falla, biseca el lote hasta
+    aislar las filas que fallan y las registra en `reject_log`.
+
+    Devuelve el número de filas insertadas.
+    """
+    if not records:
+        return 0
+    try:
+        supabase.table(table).insert(records).execute()
+        return len(records)
+    except Exception as e:
+        return retry_by_bisection(supabase, table, records, e, reject_log)
+
+
+def retry_by_bisection(supabase, table, records, error, reject_log=None):
+    """
+    Reintenta un lote que ya falló con `error`, partiéndolo en mitades.
+
+    Una fila individual que falla no se reintenta: se registra en `reject_log`.
+    Devuelve el número de filas insertadas.
+    """
+    if len(records) == 1:
+        if reject_log is not None:
+            reject_log.write(table, records[0], error)
+        return 0
+    mid = len(records) // 2
+    return (insert_with_bisection(supabase, table, records[:mid], reject_log)
+            + insert_with_bisection(supabase, table, records[mid:], reject_log))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark y verificación del clasificador de tipos de publicación
+(publication_classifier.py).
+
+1. Exactitud: clasifica cada fila de fixtures/publicaciones-clasificadas.csv
+   (titulo, resumen, editorial, tipo esperado) con clasificar y con
+   clasificar_secuencial, y lista las que no coinciden con la etiqueta.
+   Al cambiar una regla, actualizar o agregar filas en el fixture.
+2. Velocidad: mide ambos sobre textos del tamaño de un resumen real (el
+   resumen del fixture relleno con texto neutro hasta --largo caracteres).
+
+Sale con código 1 si alguna fila no coincide, para poder usarlo antes de
+subir cambios a las reglas.
+
+Uso:
+    python scripts/benchmark-clasificador-publicaciones.py
+    python scripts/benchmark-clasificador-publicaciones.py --repeticiones 500 --largo 2000
+"""
+
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+
+from publication_classifier import clasificar, clasificar_secuencial
+
+FIXTURE_PATH = Path(__file__).resolve().parent / 'fixtures' / 'publicaciones-clasificadas.csv'
+
+# Relleno sin ninguna palabra clave de las reglas
+RELLENO = ('the frogs were collected at night along streams in montane forest and deposited in '
+           'a museum collection where morphological measurements were taken for each adult ').split()
+
+
+def leer_fixture(path: Path) -> list[dict]:
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def verificar(filas: list[dict]) -> int:
+    errores = 0
+    for fila in filas:
+        args = (fila['titulo'], fila['resumen'], fila['editorial'])
+        obtenido, referencia = clasificar(*args), clasificar_secuencial(*args)
+        if obtenido != fila['tipo'] or referencia != fila['tipo']:
+            errores += 1
+            print(f"  ❌ {fila['titulo'][:60]!r}: esperado {fila['tipo']}, "
+                  f"clasificar={obtenido}, secuencial={referencia}")
+    return errores
+
+
+def medir(fn, casos) -> float:
+    inicio = time.perf_counter()
+    for caso in casos:
+        fn(*caso)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del clasificador de publicaciones')
+    parser.add_argument('--repeticiones', type=int, default=200, help='Veces que se repite el fixture')
+    parser.add_argument('--largo', type=int, default=1500, help='Largo aproximado del resumen (caracteres)')
+    args = parser.parse_args()
+
+    filas = leer_fixture(FIXTURE_PATH)
+    print(f"📋 Fixture: {len(filas)} publicaciones etiquetadas")
+    errores = verificar(filas)
+    print(f"   Correctas: {len(filas) - errores}/{len(filas)}")
+
+    rng = random.Random(0)
+    casos = []
+    for _ in range(args.repeticiones):
+        for fila in filas:
+            palabras = [fila['resumen']]
+            while sum(len(p) + 1 for p in palabras) < args.largo:
+                palabras.append(rng.choice(RELLENO))
+            rng.shuffle(palabras)
+            casos.append((fila['titulo'], ' '.join(palabras), fila['editorial']))
+
+    print(f"\n⏱️  {len(casos)} textos de ~{args.largo} caracteres")
+    t_sec = medir(clasificar_secuencial, casos)
+    t_nuevo = medir(clasificar, casos)
+    print(f"   secuencial (una regex por regla): {t_sec:.2f} s  ({t_sec / len(casos) * 1e6:.0f} µs/texto)")
+    print(f"   con claves:                       {t_nuevo:.2f} s  ({t_nuevo / len(casos) * 1e6:.0f} µs/texto)")
+    print(f"   Aceleración: {t_sec / t_nuevo:.1f}x")
+
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark del lector de Excel: acceso por celda (load_workbook + sheet.cell)
+vs. lector streaming compartido (read_only + iter_rows) sobre los archivos de Datos/.
+
+Verifica además que ambos métodos devuelven exactamente los mismos valores.
+El pico de memoria se mide en una segunda pasada con tracemalloc (que ralentiza
+mucho el parseo), solo si se pasa --memoria.
+
+Uso:
+    python scripts/benchmark-excel-reader.py                 # todos los .xlsx de Datos/
+    python scripts/benchmark-excel-reader.py Coleccion.xlsx Tejido.xlsx
+    python scripts/benchmark-excel-reader.py --memoria Coleccion.xlsx
+"""
+
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import openpyxl
+
+from excel_reader import iter_excel_rows, map_headers, open_workbook
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATOS_DIR = ROOT_DIR / 'Datos'
+
+warnings.filterwarnings('ignore')
+
+
+def read_headers(filepath):
+    """Todas las columnas del encabezado (para leer el archivo completo)."""
+    wb = open_workbook(filepath)
+    try:
+        first = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    return list(map_headers(first))
+
+
+def read_per_cell(filepath, columns):
+    """Método anterior: libro completo en memoria y sheet.cell() por celda."""
+    wb = openpyxl.load_workbook(filepath, data_only=True)
+    sheet = wb.active
+
+    headers = {}
+    for col in range(1, 200):
+        cell = sheet.cell(row=1, column=col)
+        if cell.value:
+            headers[str(cell.value).strip()] = col
+        elif col > len(headers) + 5:
+            break
+
+    rows = []
+    row = 2
+    empty = 0
+    while empty < 5 and row < 50000:
+        data = {}
+        for excel_col in columns:
+            if excel_col in headers:
+                data[excel_col] = sheet.cell(row=row, column=headers[excel_col]).value
+        if any(v is not None for v in data.values()):
+            rows.append(data)
+            empty = 0
+        else:
+            empty += 1
+        row += 1
+
+    wb.close()
+    return rows
+
+
+def read_streaming(filepath, columns):
+    """Método nuevo: excel_reader.iter_excel_rows."""
+    rows = []
+    empty = 0
+    for data in iter_excel_rows(filepath, columns):
+        if any(v is not None for v in data.values()):
+            rows.append(data)
+            empty = 0
+        else:
+            empty += 1
+            if empty >= 5:
+                break
+    return rows
+
+
+def measure(fn, *args, memory=False):
+    """Devuelve (resultado, segundos, pico de memoria en MB o None)."""
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+    return result, elapsed, peak_mb
+
+
+def fmt_mb(value):
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    memory = '--memoria' in sys.argv
+
+    if args:
+        files = [DATOS_DIR / name for name in args]
+    else:
+        files = sorted(DATOS_DIR.glob('*.xlsx'))
+
+    print("=" * 78)
+    print("📊 BENCHMARK LECTOR EXCEL (por celda vs. streaming)")
+    print("=" * 78)
+    print(f"{'Archivo':<32}{'Filas':>8}{'Celda (s)':>11}{'Stream (s)':>11}{'x':>6}{'MB celda':>10}{'MB stream':>10}")
+    print("-" * 78)
+
+    total_old = total_new = 0.0
+    for filepath in files:
+        if not filepath.exists():
+            print(f"⚠️  {filepath.name} no existe")
+            continue
+
+        columns = read_headers(filepath)
+        old_rows, old_t, old_mb = measure(read_per_cell, filepath, columns, memory=memory)
+        new_rows, new_t, new_mb = measure(read_streaming, filepath, columns, memory=memory)
+        total_old += old_t
+        total_new += new_t
+
+        speedup = old_t / new_t if new_t else float('inf')
+        print(f"{filepath.name:<32}{len(new_rows):>8}{old_t:>11.2f}{new_t:>11.2f}{speedup:>6.1f}{fmt_mb(old_mb)}{fmt_mb(new_mb)}")
+
+        if old_rows != new_rows:
+            print(f"   ❌ Los resultados difieren ({len(old_rows)} vs {len(new_rows)} filas)")
+
+    print("-" * 78)
+    speedup = total_old / total_new if total_new else float('inf')
+    print(f"{'TOTAL':<32}{'':>8}{total_old:>11.2f}{total_new:>11.2f}{speedup:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
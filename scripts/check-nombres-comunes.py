@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Verificación de la reconciliación de nombre_comun (common_names_sync.py), sin BD.
+
+Cada caso parte de filas actuales en memoria y un estado deseado, calcula el
+plan con plan_names, lo aplica sobre una copia (como apply_plan: borra,
+actualiza por id, inserta) y revisa:
+- que no queden dos filas con la misma clave natural
+  (taxon_id, catalogo_awe_idioma_id, nombre), que rompería el índice único;
+- que cada nombre deseado quede con el `principal` pedido;
+- que una segunda pasada no tenga nada que hacer.
+
+Además arma el estado deseado de nombre_comun_vernaculo
+(registros_desde_excel de load-nombre-comun-vernaculo-from-excel.py) con una
+taxonomía mínima: una celda con varios taxones da un registro por taxón
+resuelto y a lo sumo uno con taxon_id NULL, aunque no se resuelvan varios.
+
+Sale con código 1 si algún caso falla.
+
+Uso:
+    python scripts/check-nombres-comunes.py
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from common_names_sync import CLAVE_NATURAL, COLUMNAS, IDIOMA_EN, IDIOMA_ES, plan_names
+from name_resolver import NameResolver
+from taxonomy_cache import RANK_ESPECIE, RANK_FAMILIA, RANK_GENERO, RANK_ORDEN, TaxonomySnapshot
+
+VERNACULO_PATH = Path(__file__).resolve().parent / 'load-nombre-comun-vernaculo-from-excel.py'
+
+ACTUAL = [
+    # Hermano con el nombre del Excel y otra fila principal con otro nombre
+    (1, 10, IDIOMA_ES, 'Rana de cristal', True),
+    (2, 10, IDIOMA_ES, 'Ranita de cristal', False),
+    # Cambio de nombre simple
+    (3, 11, IDIOMA_ES, 'Nombre viejo', True),
+    # Sin cambios
+    (4, 11, IDIOMA_EN, 'Glass frog', True),
+    # Duplicado exacto
+    (5, 12, IDIOMA_EN, 'Rain frog', True),
+    (6, 12, IDIOMA_EN, 'Rain frog', False),
+]
+
+DESEADO = [
+    (10, IDIOMA_ES, 'Ranita de cristal'),
+    (11, IDIOMA_ES, 'Nombre nuevo'),
+    (11, IDIOMA_EN, 'Glass frog'),
+    (12, IDIOMA_EN, 'Rain frog'),
+    (13, IDIOMA_ES, 'Sapo nuevo'),
+]
+
+
+def aplicar(actual: pd.DataFrame, plan) -> pd.DataFrame:
+    """Lo que deja apply_plan en la tabla."""
+    filas = {f['id_nombre_comun']: f for f in actual.to_dict(orient='records')
+             if f['id_nombre_comun'] not in set(plan.eliminaciones)}
+    for f in plan.actualizaciones:
+        filas[f['id_nombre_comun']] = dict(f)
+    siguiente = max(filas, default=0) + 1
+    for i, f in enumerate(plan.inserciones):
+        filas[siguiente + i] = {'id_nombre_comun': siguiente + i, **f}
+    return pd.DataFrame(list(filas.values()), columns=COLUMNAS)
+
+
+def verificar(deduplicar: bool) -> int:
+    actual = pd.DataFrame(ACTUAL, columns=COLUMNAS)
+    deseado = pd.DataFrame(DESEADO, columns=['taxon_id', 'catalogo_awe_idioma_id', 'nombre'])
+    errores = 0
+
+    def fallo(descripcion, detalle=''):
+        nonlocal errores
+        errores += 1
+        print(f"  ❌ {descripcion} {detalle}")
+
+    plan = plan_names(actual, deseado, principal=True, deduplicar=deduplicar)
+    final = aplicar(actual, plan)
+
+    repetidas = final[final.duplicated(CLAVE_NATURAL, keep=False)]
+    if deduplicar and not repetidas.empty:
+        fallo("quedan filas repetidas", repetidas.to_dict(orient='records'))
+    # Sin deduplicar los duplicados previos siguen, pero el plan no debe crear otros
+    nuevas = repetidas[~repetidas['id_nombre_comun'].isin([5, 6])]
+    if not nuevas.empty:
+        fallo("el plan crea filas con la misma clave natural", nuevas.to_dict(orient='records'))
+
+    cruce = deseado.merge(final, on=CLAVE_NATURAL, how='left')
+    principal = cruce['principal'].eq(True).groupby([cruce[c] for c in CLAVE_NATURAL]).any()
+    if not principal.all():
+        fallo("nombres deseados sin fila principal", principal[~principal].index.tolist())
+
+    if not deduplicar:
+        hermano = final[final['id_nombre_comun'] == 2]
+        if hermano.empty or not hermano['principal'].item():
+            fallo("el hermano con el nombre del Excel debe quedar como principal (sin renombrar otra fila)")
+
+    segundo = plan_names(final, deseado, principal=True, deduplicar=deduplicar)
+    if not segundo.vacio:
+        fallo("la segunda pasada tiene cambios", (segundo.inserciones, segundo.actualizaciones,
+                                                  segundo.eliminaciones))
+    return errores
+
+
+TAXA = [
+    {'id_taxon': 1, 'taxon': 'Anura', 'taxon_id': None, 'rank_id': RANK_ORDEN},
+    {'id_taxon': 2, 'taxon': 'Strabomantidae', 'taxon_id': 1, 'rank_id': RANK_FAMILIA},
+    {'id_taxon': 3, 'taxon': 'Pristimantis', 'taxon_id': 2, 'rank_id': RANK_GENERO},
+    {'id_taxon': 4, 'taxon': 'unistrigatus', 'taxon_id': 3, 'rank_id': RANK_ESPECIE},
+]
+
+# (nombre, celda Taxon, taxon_ids esperados; None = registro sin taxón)
+VERNACULOS = [
+    ('varios sin resolver', 'Foo, Bar', [None]),
+    ('uno resuelto y uno no', 'Pristimantis unistrigatus, Foo', [4, None]),
+    ('dos resueltos', 'Pristimantis, Strabomantidae', [2, 3]),
+    ('vacío', None, [None]),
+    ('solo ignorados', 'Anura', [None]),
+]
+
+
+def verificar_vernaculos() -> int:
+    spec = importlib.util.spec_from_file_location('vernaculo', VERNACULO_PATH)
+    vernaculo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(vernaculo)
+
+    tax = TaxonomySnapshot(TAXA, [], [{'id_rank': r, 'rank': str(r), 'orden': r}
+                                      for r in (RANK_ORDEN, RANK_FAMILIA, RANK_GENERO, RANK_ESPECIE)])
+    df = pd.DataFrame({'nombre': [n for n, _, _ in VERNACULOS], 'idioma': 'español',
+                       'taxon': [c for _, c, _ in VERNACULOS]})
+    registros = vernaculo.registros_desde_excel(df, 'nombre', 'idioma', 'taxon', NameResolver(tax))
+
+    errores = 0
+    for nombre, celda, esperado in VERNACULOS:
+        obtenido = registros.loc[registros['nombre'] == nombre, 'taxon_id']
+        obtenido = sorted((None if pd.isna(t) else int(t) for t in obtenido), key=lambda t: (t is None, t))
+        if obtenido != esperado:
+            errores += 1
+            print(f"  ❌ {nombre} ({celda!r}): esperado {esperado}, obtenido {obtenido}")
+    return errores
+
+
+def main():
+    errores = 0
+    for deduplicar in (False, True):
+        print(f"📋 plan_names(principal=True, deduplicar={deduplicar})")
+        n = verificar(deduplicar)
+        print("   ✓ sin errores" if not n else f"   {n} errores")
+        errores += n
+    print("📋 registros_desde_excel (nombre_comun_vernaculo)")
+    n = verificar_vernaculos()
+    print("   ✓ sin errores" if not n else f"   {n} errores")
+    errores += n
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
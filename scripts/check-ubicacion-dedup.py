@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Verificación del índice de ubicaciones existentes (ubicacion_dedup.py), sin BD.
+
+Arma un UbicacionIndex con páginas como las que devuelve iter_pages y busca una
+hoja como la que arma load-ubicacion-especie.py. Casos:
+- coincidencia exacta y fila nueva;
+- página con NULL en id_ficha_especie o id_taxon (pandas la vuelve float64) y
+  hoja con la ficha como Int64 o float: deben dar el mismo digest;
+- coordenadas redondeadas a 6 decimales y texto con espacios de borde;
+- modo con tolerancia: punto a pocos metros con la misma ficha, taxon y voucher.
+
+Sale con código 1 si algún caso falla.
+
+Uso:
+    python scripts/check-ubicacion-dedup.py
+"""
+
+import sys
+
+import pandas as pd
+
+from ubicacion_dedup import UbicacionIndex
+
+PAGINAS = [
+    [
+        {'id_ubicacion_especie': 1, 'id_ficha_especie': 100, 'id_taxon': 7, 'latitud': -0.2, 'longitud': -78.5,
+         'voucher': 'QCAZ 1', 'localidad': 'Quito'},
+        {'id_ubicacion_especie': 2, 'id_ficha_especie': None, 'id_taxon': 8, 'latitud': -1.0, 'longitud': -79.0,
+         'voucher': 'QCAZ 2', 'localidad': None},
+    ],
+    [
+        {'id_ubicacion_especie': 3, 'id_ficha_especie': 101, 'id_taxon': None, 'latitud': -2.1234567,
+         'longitud': -79.9, 'voucher': 'QCAZ 3', 'localidad': 'Guayaquil'},
+        {'id_ubicacion_especie': 4, 'id_ficha_especie': 102, 'id_taxon': 9, 'latitud': -3.5, 'longitud': -80.1,
+         'voucher': 'QCAZ 4', 'localidad': 'Machala'},
+    ],
+]
+
+# (descripción, fila de la hoja, id esperado sin tolerancia, id esperado con tolerancia)
+CASOS = [
+    ('coincidencia exacta', (100, 7, -0.2, -78.5, 'QCAZ 1', 'Quito'), 1, 1),
+    ('ficha NULL en la página', (None, 8, -1.0, -79.0, 'QCAZ 2', None), 2, 2),
+    ('taxon NULL en la página', (101, None, -2.1234571, -79.9, ' QCAZ 3 ', 'Guayaquil '), 3, 3),
+    ('ficha 100 junto a NULL en la página', (100, 7, -0.2, -78.5, 'QCAZ 1', 'Quito'), 1, 1),
+    ('fila nueva', (100, 9, -0.2, -78.5, 'X', 'Q'), None, None),
+    ('a ~11 m con el mismo voucher', (102, 9, -3.5001, -80.1, 'QCAZ 4', 'Machala'), None, 4),
+    ('a ~11 m con otro voucher', (102, 9, -3.5001, -80.1, 'QCAZ 5', 'Machala'), None, None),
+]
+
+COLUMNAS_HOJA = ['id_ficha_especie', 'id_taxon', 'latitud', 'longitud', 'voucher', 'localidad']
+
+
+def hojas() -> dict[str, pd.DataFrame]:
+    hoja = pd.DataFrame([fila for _, fila, _, _ in CASOS], columns=COLUMNAS_HOJA)
+    enteros = hoja.astype({'id_ficha_especie': 'Int64', 'id_taxon': 'Int64'})
+    return {'float64': hoja, 'Int64': enteros}
+
+
+def verificar(tolerancia_m) -> int:
+    indice = UbicacionIndex(tolerancia_m)
+    for pagina in PAGINAS:
+        indice.add_rows(pagina)
+    indice.finish()
+
+    errores = 0
+    for tipo, hoja in hojas().items():
+        ids = indice.lookup(hoja)
+        for (descripcion, _, exacto, cercano), obtenido in zip(CASOS, ids):
+            esperado = cercano if tolerancia_m else exacto
+            obtenido = None if pd.isna(obtenido) else int(obtenido)
+            if obtenido != esperado:
+                errores += 1
+                print(f"  ❌ {descripcion} (hoja {tipo}): esperado {esperado}, obtenido {obtenido}")
+    return errores
+
+
+def main():
+    errores = 0
+    for tolerancia_m in (None, 50):
+        print(f"📋 Tolerancia: {tolerancia_m or 'ninguna'}")
+        n = verificar(tolerancia_m)
+        print(f"   Correctos: {2 * len(CASOS) - n}/{2 * len(CASOS)}")
+        errores += n
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
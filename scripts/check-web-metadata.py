@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Verificación de web_metadata.py contra servidores HTTP locales (http.server en
+un hilo), sin salir a internet. Dos servidores en puertos distintos hacen de
+dos hosts. Casos:
+- nunca más de `por_host` peticiones simultáneas a un mismo host;
+- un host lento con muchas URLs no frena las de otro host;
+- la lectura se corta en </head>: una página que manda el resto del cuerpo
+  segundos después se resuelve sin esperarlo;
+- ETag: con la entrada vencida se revalida con If-None-Match, el 304 reusa el
+  texto guardado; con la entrada fresca no hay petición;
+- 404, PDF y conexión rechazada no rompen la corrida (los dos primeros quedan
+  con texto vacío; la rechazada no se guarda).
+
+Sale con código 1 si algún caso falla.
+
+Uso:
+    python scripts/check-web-metadata.py
+"""
+
+import logging
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from web_metadata import leer_cache, obtener_metadatos
+
+POR_HOST = 2
+DEMORA_LENTA = 0.4          # segundos de respuesta de /lenta*
+DEMORA_GOTEO = 3.0          # segundos entre </head> y el resto del cuerpo en /goteo
+ETAG = '"v1"'
+
+
+class Servidor:
+    """http.server en un hilo que registra peticiones y concurrencia."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.activas = self.max_activas = 0
+        self.peticiones = []        # (path, segundos desde `inicio`, status)
+        self.inicio = time.perf_counter()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with servidor.lock:
+                    servidor.activas += 1
+                    servidor.max_activas = max(servidor.max_activas, servidor.activas)
+                    llegada = time.perf_counter() - servidor.inicio
+                try:
+                    status = servidor.responder(self)
+                finally:
+                    with servidor.lock:
+                        servidor.activas -= 1
+                        servidor.peticiones.append((self.path, llegada, status))
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base = f'http://127.0.0.1:{self.httpd.server_port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reiniciar(self):
+        with self.lock:
+            self.activas = self.max_activas = 0
+            self.peticiones = []
+            self.inicio = time.perf_counter()
+
+    @staticmethod
+    def _enviar(handler, status, cuerpo=b'', tipo='text/html; charset=utf-8', **headers):
+        handler.send_response(status)
+        handler.send_header('Content-Type', tipo)
+        handler.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in headers.items():
+            handler.send_header(nombre.replace('_', '-'), valor)
+        handler.end_headers()
+        try:
+            handler.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        return status
+
+    def responder(self, handler) -> int:
+        path = handler.path
+        cabecera = (f'<html><head><title>Pagina {path}</title>'
+                    '<meta content="Una descripcion" name="description"></head><body>').encode()
+        if path.startswith('/lenta'):
+            time.sleep(DEMORA_LENTA)
+            return self._enviar(handler, 200, cabecera)
+        if path == '/etag':
+            if handler.headers.get('If-None-Match') == ETAG:
+                return self._enviar(handler, 304, ETag=ETAG)
+            return self._enviar(handler, 200, cabecera, ETag=ETAG)
+        if path == '/404':
+            return self._enviar(handler, 404)
+        if path == '/pdf':
+            return self._enviar(handler, 200, b'%PDF-1.4 ' + b'x' * 100_000, tipo='application/pdf')
+        if path == '/goteo':
+            resto = b'<p>relleno</p>' * 50_000
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html')
+            handler.send_header('Content-Length', str(len(cabecera) + len(resto)))
+            handler.end_headers()
+            try:
+                handler.wfile.write(cabecera)
+                handler.wfile.flush()
+                time.sleep(DEMORA_GOTEO)
+                handler.wfile.write(resto)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return 200
+        return self._enviar(handler, 200, cabecera)
+
+
+def puerto_cerrado() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Resultados:
+    def __init__(self):
+        self.errores = 0
+        self.total = 0
+
+    def verificar(self, condicion: bool, descripcion: str, detalle=''):
+        self.total += 1
+        if condicion:
+            print(f"  ✓ {descripcion}")
+        else:
+            self.errores += 1
+            print(f"  ❌ {descripcion} {detalle}")
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR, format='%(message)s')
+    a, b = Servidor(), Servidor()
+    r = Resultados()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = Path(tmp) / 'web-metadata.json'
+
+        print("📋 Concurrencia por host")
+        lentas = [f'{a.base}/lenta{i}' for i in range(8)]
+        rapidas = [f'{b.base}/rapida{i}' for i in range(4)]
+        inicio = time.perf_counter()
+        textos = obtener_metadatos(lentas + rapidas, cache_path=cache, workers=4, por_host=POR_HOST)
+        duracion = time.perf_counter() - inicio
+        r.verificar(len(textos) == 12 and all(textos.values()), "todas las páginas con texto", textos)
+        r.verificar(a.max_activas == POR_HOST, f"host lento: máximo {POR_HOST} simultáneas",
+                    f"(hubo {a.max_activas})")
+        r.verificar(b.max_activas <= POR_HOST, f"host rápido: máximo {POR_HOST} simultáneas",
+                    f"(hubo {b.max_activas})")
+        ultima_rapida = max(t for _, t, _ in b.peticiones)
+        r.verificar(ultima_rapida < DEMORA_LENTA * 2, "el host lento no frena al rápido",
+                    f"(última petición rápida a los {ultima_rapida:.2f} s)")
+        r.verificar(duracion < DEMORA_LENTA * 8 / POR_HOST + 1, f"duración {duracion:.2f} s")
+
+        print("\n📋 Lectura hasta </head>")
+        inicio = time.perf_counter()
+        textos = obtener_metadatos([f'{a.base}/goteo'], cache_path=cache)
+        duracion = time.perf_counter() - inicio
+        r.verificar(textos.get(f'{a.base}/goteo') == 'Pagina /goteo Una descripcion', "título y description",
+                    textos)
+        r.verificar(duracion < DEMORA_GOTEO / 2, f"no espera el resto del cuerpo ({duracion:.2f} s)")
+
+        print("\n📋 Caché y revalidación")
+        url = f'{a.base}/etag'
+        primera = obtener_metadatos([url], cache_path=cache)
+        revisado = leer_cache(cache)[url]['revisado']
+        a.reiniciar()
+        segunda = obtener_metadatos([url], cache_path=cache, frescura_dias=0)
+        r.verificar([s for p, _, s in a.peticiones] == [304], "entrada vencida: una petición condicional → 304",
+                    a.peticiones)
+        r.verificar(segunda == primera and primera[url], "el 304 reusa el texto guardado", segunda)
+        r.verificar(leer_cache(cache)[url]['revisado'] > revisado, "el 304 renueva la fecha de revisión")
+        a.reiniciar()
+        tercera = obtener_metadatos([url], cache_path=cache)
+        r.verificar(not a.peticiones and tercera == primera, "entrada fresca: sin petición", a.peticiones)
+
+        print("\n📋 Errores")
+        rechazada = f'http://127.0.0.1:{puerto_cerrado()}/nada'
+        urls = [f'{b.base}/404', f'{b.base}/pdf', rechazada, 'ftp://x', '']
+        textos = obtener_metadatos(urls, cache_path=cache, timeout=2)
+        r.verificar(textos.get(f'{b.base}/404') == '', "404 → texto vacío", textos)
+        r.verificar(textos.get(f'{b.base}/pdf') == '', "PDF → texto vacío", textos)
+        r.verificar(rechazada not in textos and rechazada not in leer_cache(cache),
+                    "conexión rechazada: fuera del resultado y de la caché")
+        r.verificar(set(textos) == {f'{b.base}/404', f'{b.base}/pdf'}, "URLs no http descartadas", textos)
+
+    a.httpd.shutdown()
+    b.httpd.shutdown()
+    print(f"\n   Correctos: {r.total - r.errores}/{r.total}")
+    if r.errores:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
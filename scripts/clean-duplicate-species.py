@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 """
 Script para limpiar especies duplicadas y asegurar que solo haya 690 especies del Excel
+
+Los duplicados se fusionan en la especie más antigua (sus referencias pasan a
+ella) y las especies fuera del Excel se eliminan, todo con public.fusionar_taxones
+(ver taxon_dedup.py).
 """
 import pandas as pd
 import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
+from taxon_dedup import fusionar_taxones, print_resumen
+from taxonomy_cache import invalidate
 from collections import defaultdict
 
 # Cargar variables de entorno
@@ -68,23 +75,27 @@ def main():
 
     # Obtener todas las especies de la BD
     print("\n🔍 Obteniendo especies de la base de datos...")
-    taxon_response = supabase.table('taxon').select('id_taxon, taxon, rank_id, taxon_id').eq('rank_id', 7).execute()
+    especies = fetch_all(supabase, 'taxon', 'id_taxon, taxon, rank_id, taxon_id', key='id_taxon',
+                         where=lambda q: q.eq('rank_id', 7))
 
-    if not taxon_response.data:
+    if not especies:
         print("❌ Error: No se pudieron obtener las especies")
         sys.exit(1)
 
     # Obtener géneros
     generos_map = {}  # id_taxon -> nombre
-    generos_response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 6).execute()
-    if generos_response.data:
-        for gen in generos_response.data:
+    generos = fetch_all(
+        supabase, 'taxon', 'id_taxon, taxon',
+        key='id_taxon', where=lambda q: q.eq('rank_id', 6),
+    )
+    if generos:
+        for gen in generos:
             generos_map[gen['id_taxon']] = gen['taxon']
 
     # Construir mapa de especies en BD: nombre_completo -> lista de ids
     especies_bd = defaultdict(list)  # nombre_completo -> [id_taxon1, id_taxon2, ...]
 
-    for especie_taxon in taxon_response.data:
+    for especie_taxon in especies:
         especie_id = especie_taxon['id_taxon']
         nombre_especie = especie_taxon['taxon']
         genero_id = especie_taxon['taxon_id']
@@ -98,7 +109,7 @@ def main():
                 'genero': genero_nombre
             })
 
-    print(f"✅ Especies en BD: {len(taxon_response.data)}")
+    print(f"✅ Especies en BD: {len(especies)}")
     print(f"✅ Especies únicas en BD: {len(especies_bd)}")
 
     # Identificar duplicados
@@ -133,55 +144,25 @@ def main():
             for registro in especies_bd[nombre_completo]:
                 especies_eliminar_no_excel.append(registro['id_taxon'])
 
-    # Eliminar duplicados y especies no en Excel
-    eliminados = 0
-    eliminados_no_excel = 0
-    errores = []
-
-    # Primero eliminar duplicados
-    if duplicados:
-        print(f"\n🔄 Eliminando {total_duplicados} registros duplicados...")
-
-        for nombre_completo, registros in duplicados.items():
-            for registro in registros:
-                try:
-                    # Eliminar de taxon_catalogo_awe primero (si existe)
-                    supabase.table('taxon_catalogo_awe').delete().eq('taxon_id', registro['id_taxon']).execute()
-
-                    # Eliminar de ficha_especie (si existe)
-                    supabase.table('ficha_especie').delete().eq('taxon_id', registro['id_taxon']).execute()
-
-                    # Eliminar de taxon
-                    supabase.table('taxon').delete().eq('id_taxon', registro['id_taxon']).execute()
-
-                    eliminados += 1
-                    if eliminados % 50 == 0:
-                        print(f"  📊 Progreso: {eliminados} duplicados eliminados...")
-
-                except Exception as e:
-                    errores.append(f"{nombre_completo} (ID: {registro['id_taxon']}): {str(e)}")
+    # Pares para fusionar_taxones: duplicado -> especie conservada, fuera del Excel -> eliminar
+    pares = []
+    for nombre_completo, registros in duplicados.items():
+        if nombre_completo in especies_no_en_excel:
+            continue  # Se eliminan todos sus registros más abajo
+        destino = especies_sin_duplicados[nombre_completo]['id_taxon']
+        pares.extend({'id_taxon': r['id_taxon'], 'id_taxon_destino': destino} for r in registros)
+    pares.extend({'id_taxon': especie_id, 'id_taxon_destino': None} for especie_id in especies_eliminar_no_excel)
 
-    # Luego eliminar especies que no están en Excel
-    if especies_eliminar_no_excel:
-        print(f"\n🔄 Eliminando {len(especies_eliminar_no_excel)} especies que NO están en Excel...")
-
-        for especie_id in especies_eliminar_no_excel:
-            try:
-                # Eliminar de taxon_catalogo_awe primero (si existe)
-                supabase.table('taxon_catalogo_awe').delete().eq('taxon_id', especie_id).execute()
-
-                # Eliminar de ficha_especie (si existe)
-                supabase.table('ficha_especie').delete().eq('taxon_id', especie_id).execute()
-
-                # Eliminar de taxon
-                supabase.table('taxon').delete().eq('id_taxon', especie_id).execute()
-
-                eliminados_no_excel += 1
-                if eliminados_no_excel % 50 == 0:
-                    print(f"  📊 Progreso: {eliminados_no_excel} especies eliminadas...")
+    resumen = {}
+    errores = []
+    if pares:
+        print(f"\n🔄 Fusionando {len(pares) - len(especies_eliminar_no_excel)} duplicados y eliminando "
+              f"{len(especies_eliminar_no_excel)} especies que NO están en Excel...")
+        resumen, errores = fusionar_taxones(supabase, pares)
 
-            except Exception as e:
-                errores.append(f"Especie ID {especie_id}: {str(e)}")
+    fallidos = {par['id_taxon'] for par, _ in errores}
+    eliminados = sum(1 for p in pares if p['id_taxon_destino'] is not None and p['id_taxon'] not in fallidos)
+    eliminados_no_excel = sum(1 for p in pares if p['id_taxon_destino'] is None and p['id_taxon'] not in fallidos)
 
     # Resumen
     print(f"\n📊 Resumen de limpieza:")
@@ -190,15 +171,21 @@ def main():
     print(f"  ➖ Total eliminados: {eliminados + eliminados_no_excel}")
     print(f"  ❌ Errores: {len(errores)}")
 
+    print(f"\n📋 Filas afectadas por tabla:")
+    print_resumen(resumen)
+
     if errores:
         print(f"\n❌ Errores (primeros 10):")
-        for error in errores[:10]:
-            print(f"    - {error}")
+        for par, error in errores[:10]:
+            print(f"    - Especie ID {par['id_taxon']}: {error}")
+
+    # Se eliminaron taxones: el snapshot de taxonomía ya no sirve
+    invalidate()
 
     # Verificación final
     print(f"\n🔍 Verificación final...")
-    taxon_final = supabase.table('taxon').select('id_taxon').eq('rank_id', 7).execute()
-    total_final = len(taxon_final.data) if taxon_final.data else 0
+    taxon_final = fetch_all(supabase, 'taxon', 'id_taxon', key='id_taxon', where=lambda q: q.eq('rank_id', 7))
+    total_final = len(taxon_final) if taxon_final else 0
 
     print(f"  📊 Total especies después de limpieza: {total_final}")
     print(f"  📋 Total especies esperadas (Excel): {len(especies_excel)}")
@@ -0,0 +1,288 @@
+"""
+Reconciliación de nombre_comun en español (idioma 1) e inglés (idioma 8).
+
+Los scripts de nombres comunes recorrían el Excel fila a fila con un
+insert/update por nombre y terminaban borrando duplicados uno a uno. Aquí:
+1. Se arma el estado deseado completo: un nombre por
+   (taxon_id, catalogo_awe_idioma_id), con `principal` fijo para todo el lote.
+2. Se leen las filas actuales de esos idiomas en una lectura paginada.
+3. El diff se calcula en memoria con pandas. Por cada (taxon, idioma) se
+   conserva una fila: la que ya tiene el `principal` pedido, luego la que ya
+   tiene el nombre y luego la de id más bajo. El resto son duplicados. Sin
+   deduplicar, primero va la que ya tiene el nombre: renombrar otra dejaría
+   dos filas iguales (choca con el índice único de la clave natural).
+4. Se aplica con upserts por chunk (filas que cambian), inserts por chunk
+   (faltantes) y un delete con in_ por chunk (duplicados).
+
+Sincronizar los 690×2 nombres cuesta unas pocas peticiones; una segunda
+ejecución, una lectura y ninguna escritura.
+
+Para los idiomas con varios nombres por especie (la carga multiidioma) la
+clave es natural: (taxon_id, catalogo_awe_idioma_id, nombre), con un índice
+único en la tabla (supabase/migrations/20261017150000_nombre_comun_clave_natural.sql).
+plan_natural_key compara sin mayúsculas ni espacios de borde y los faltantes
+se envían con upsert sobre esa clave, así que repetir la carga no duplica.
+
+Uso:
+    from common_names_sync import excel_names, sync_common_names
+
+    deseado, no_encontrados = excel_names(df, species_col, es_col, en_col, tax)
+    plan, resultado = sync_common_names(supabase, deseado, alcance=tax.ficha_by_taxon.keys(),
+                                        principal=True, dry_run=True)
+"""
+
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from supabase_fetch import fetch_all
+
+IDIOMA_ES = 1
+IDIOMA_EN = 8
+IDIOMAS = (IDIOMA_ES, IDIOMA_EN)
+DEFAULT_CHUNK_SIZE = 500
+
+COLUMNAS = ['id_nombre_comun', 'taxon_id', 'catalogo_awe_idioma_id', 'nombre', 'principal']
+CLAVE_NATURAL = ['taxon_id', 'catalogo_awe_idioma_id', 'nombre']
+
+
+def find_name_columns(df: pd.DataFrame):
+    """(species_col, es_col, en_col) según los encabezados del Excel de especies."""
+    species_col = es_col = en_col = None
+    for col in df.columns:
+        col_lower = str(col).lower().strip()
+        if 'species' in col_lower and not species_col:
+            species_col = col
+        if 'nombre común español' in col_lower or 'nombre comun español' in col_lower:
+            es_col = col
+        if 'english common name' in col_lower or 'nombre común inglés' in col_lower:
+            en_col = col
+    return species_col, es_col, en_col
+
+
+def _limpiar(serie: pd.Series) -> pd.Series:
+    texto = serie.astype('string').str.strip()
+    return texto.mask(texto.str.lower().isin(['', 'nan', 'none']))
+
+
+def excel_names(df: pd.DataFrame, species_col, es_col, en_col, tax):
+    """
+    Estado deseado desde el Excel: DataFrame taxon_id, catalogo_awe_idioma_id,
+    nombre, más la lista de nombres científicos que no están en la taxonomía.
+    """
+    base = df[df[species_col].notna()]
+    especies = base[species_col].astype(str).str.strip()
+    taxon_ids = especies.map(tax.species_id)
+    no_encontrados = especies[taxon_ids.isna()].tolist()
+
+    partes = []
+    for idioma, col in ((IDIOMA_ES, es_col), (IDIOMA_EN, en_col)):
+        if col is None:
+            continue
+        partes.append(pd.DataFrame({
+            'taxon_id': taxon_ids,
+            'catalogo_awe_idioma_id': idioma,
+            'nombre': _limpiar(base[col]),
+        }))
+    if not partes:
+        return pd.DataFrame(columns=['taxon_id', 'catalogo_awe_idioma_id', 'nombre']), no_encontrados
+
+    deseado = pd.concat(partes, ignore_index=True).dropna(subset=['taxon_id', 'nombre'])
+    deseado['taxon_id'] = deseado['taxon_id'].astype(int)
+    deseado['nombre'] = deseado['nombre'].astype(object)
+    return deseado.drop_duplicates(['taxon_id', 'catalogo_awe_idioma_id'], keep='last'), no_encontrados
+
+
+def load_current(supabase, idiomas=IDIOMAS) -> pd.DataFrame:
+    filas = fetch_all(supabase, 'nombre_comun', ', '.join(COLUMNAS), key='id_nombre_comun',
+                      where=lambda q: q.in_('catalogo_awe_idioma_id', list(idiomas)))
+    return pd.DataFrame(filas, columns=COLUMNAS)
+
+
+@dataclass
+class NamesPlan:
+    inserciones: list = field(default_factory=list)     # [{taxon_id, catalogo_awe_idioma_id, nombre, principal}]
+    actualizaciones: list = field(default_factory=list)  # [fila completa con id_nombre_comun]
+    eliminaciones: list = field(default_factory=list)   # [id_nombre_comun]
+    cambios: pd.DataFrame | None = None                 # taxon_id, idioma, nombre_anterior, nombre_nuevo
+    sin_cambios: int = 0
+    sin_registro: pd.DataFrame | None = None            # deseados sin fila (cuando crear=False)
+
+    @property
+    def vacio(self) -> bool:
+        return not (self.inserciones or self.actualizaciones or self.eliminaciones)
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    return [{k: (v.item() if hasattr(v, 'item') else v) for k, v in fila.items()}
+            for fila in df.to_dict(orient='records')]
+
+
+def plan_names(actual: pd.DataFrame, deseado: pd.DataFrame, alcance=None, principal: bool | None = None,
+               crear: bool = True, actualizar: bool = True, deduplicar: bool = True) -> NamesPlan:
+    """
+    Diff entre `actual` (filas de nombre_comun) y `deseado`.
+
+    - alcance: taxon_ids que se reconcilian (None = todos los de `actual`);
+      filas de otros taxones no se tocan.
+    - principal: valor de `principal` para el lote; None conserva el de cada
+      fila existente y usa False en las nuevas.
+    - crear / actualizar / deduplicar: qué tipo de cambios se aplican.
+    """
+    clave = ['taxon_id', 'catalogo_awe_idioma_id']
+    if alcance is not None:
+        alcance = set(alcance)
+        actual = actual[actual['taxon_id'].isin(alcance)]
+        deseado = deseado[deseado['taxon_id'].isin(alcance)]
+
+    cruce = actual.merge(deseado.rename(columns={'nombre': 'nombre_nuevo'}), on=clave, how='left')
+    mismo_nombre = cruce['nombre'].astype(str).str.strip() == cruce['nombre_nuevo'].astype(str)
+    mismo_principal = (cruce['principal'] == principal) if principal is not None else False
+    cruce = cruce.assign(_p=~pd.Series(mismo_principal, index=cruce.index),
+                         _n=~mismo_nombre & cruce['nombre_nuevo'].notna())
+    # Sin deduplicar los hermanos se quedan: se conserva el que ya tiene el nombre
+    prioridad = ['_p', '_n'] if deduplicar else ['_n', '_p']
+    cruce = cruce.sort_values(clave + prioridad + ['id_nombre_comun'], kind='stable')
+    cruce['orden'] = cruce.groupby(clave).cumcount()
+
+    plan = NamesPlan()
+    if deduplicar:
+        plan.eliminaciones = cruce.loc[cruce['orden'] > 0, 'id_nombre_comun'].astype(int).tolist()
+
+    conservadas = cruce[(cruce['orden'] == 0) & cruce['nombre_nuevo'].notna()].copy()
+    nuevo_principal = conservadas['principal'] if principal is None else principal
+    cambia = (conservadas['nombre'].astype(str).str.strip() != conservadas['nombre_nuevo']) | \
+             (conservadas['principal'] != nuevo_principal)
+    plan.sin_cambios = int((~cambia).sum())
+
+    cambiadas = conservadas[cambia].assign(principal=nuevo_principal)
+    plan.cambios = cambiadas[clave + ['nombre', 'nombre_nuevo']].rename(
+        columns={'catalogo_awe_idioma_id': 'idioma', 'nombre': 'nombre_anterior'}).reset_index(drop=True)
+    if actualizar:
+        filas = cambiadas.assign(nombre=cambiadas['nombre_nuevo'])[COLUMNAS]
+        plan.actualizaciones = _records(filas.astype({'principal': bool}))
+    else:
+        plan.sin_cambios += len(cambiadas)
+
+    faltantes = deseado.merge(actual[clave].drop_duplicates(), on=clave, how='left', indicator=True)
+    faltantes = faltantes[faltantes['_merge'] == 'left_only'][clave + ['nombre']]
+    if crear:
+        plan.inserciones = _records(faltantes.assign(principal=bool(principal)))
+    else:
+        plan.sin_registro = faltantes.reset_index(drop=True)
+    return plan
+
+
+def plan_natural_key(actual: pd.DataFrame, deseado: pd.DataFrame, principal: bool = True,
+                     podar: bool = False, deduplicar: bool = True) -> NamesPlan:
+    """
+    Diff por clave natural (taxon_id, catalogo_awe_idioma_id, nombre); un
+    taxon puede tener varios nombres por idioma.
+
+    - inserciones: nombres deseados que no existen.
+    - actualizaciones: nombres existentes con otro `principal`.
+    - eliminaciones: repeticiones de una misma clave (queda la de id más bajo)
+      y, con podar=True, los nombres de un (taxon, idioma) del lote que ya no
+      están en `deseado`.
+    """
+    clave = ['taxon_id', 'catalogo_awe_idioma_id']
+    actual = actual.assign(_nombre=actual['nombre'].astype(str).str.strip().str.lower())
+    deseado = deseado.assign(_nombre=deseado['nombre'].astype(str).str.strip().str.lower()) \
+        .drop_duplicates(clave + ['_nombre'])
+    actual = actual.sort_values('id_nombre_comun', kind='stable')
+    repetida = actual.duplicated(clave + ['_nombre'])
+
+    plan = NamesPlan()
+    eliminar = repetida if deduplicar else pd.Series(False, index=actual.index)
+    if podar:
+        lote = actual.merge(deseado[clave].drop_duplicates(), on=clave, how='left', indicator=True)
+        sigue = actual.merge(deseado[clave + ['_nombre']], on=clave + ['_nombre'], how='left', indicator=True)
+        sobra = (lote['_merge'] == 'both').to_numpy() & (sigue['_merge'] == 'left_only').to_numpy()
+        eliminar = eliminar | pd.Series(sobra, index=actual.index)
+    plan.eliminaciones = actual.loc[eliminar, 'id_nombre_comun'].astype(int).tolist()
+
+    vigentes = actual[~repetida].merge(deseado[clave + ['_nombre']], on=clave + ['_nombre'])
+    cambia = vigentes['principal'] != principal
+    plan.sin_cambios = int((~cambia).sum())
+    plan.actualizaciones = _records(vigentes.loc[cambia, COLUMNAS].assign(principal=principal))
+    plan.cambios = vigentes.loc[cambia, clave + ['nombre']].rename(
+        columns={'catalogo_awe_idioma_id': 'idioma', 'nombre': 'nombre_anterior'}).reset_index(drop=True)
+
+    faltantes = deseado.merge(actual[clave + ['_nombre']].drop_duplicates(), on=clave + ['_nombre'],
+                              how='left', indicator=True)
+    faltantes = faltantes[faltantes['_merge'] == 'left_only'][CLAVE_NATURAL]
+    plan.inserciones = _records(faltantes.assign(principal=principal))
+    return plan
+
+
+def _chunks(filas, chunk_size):
+    return [filas[i:i + chunk_size] for i in range(0, len(filas), chunk_size)]
+
+
+def apply_plan(supabase, plan: NamesPlan, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               on_conflict: str | None = None) -> dict:
+    """
+    Borra duplicados, actualiza (upsert sobre id_nombre_comun) e inserta
+    faltantes. Con on_conflict (p. ej. la clave natural) los faltantes van con
+    upsert ignorando los que ya existan, por si otra carga se adelantó.
+    """
+    for chunk in _chunks(plan.eliminaciones, chunk_size):
+        supabase.table('nombre_comun').delete().in_('id_nombre_comun', chunk).execute()
+    for chunk in _chunks(plan.actualizaciones, chunk_size):
+        supabase.table('nombre_comun') \
+            .upsert(chunk, on_conflict='id_nombre_comun', returning='minimal') \
+            .execute()
+    for chunk in _chunks(plan.inserciones, chunk_size):
+        if on_conflict:
+            supabase.table('nombre_comun') \
+                .upsert(chunk, on_conflict=on_conflict, ignore_duplicates=True, returning='minimal') \
+                .execute()
+        else:
+            supabase.table('nombre_comun').insert(chunk, returning='minimal').execute()
+    return {
+        'eliminados': len(plan.eliminaciones),
+        'actualizados': len(plan.actualizaciones),
+        'creados': len(plan.inserciones),
+    }
+
+
+def sync_common_names(supabase, deseado: pd.DataFrame, alcance=None, principal: bool | None = None,
+                      crear: bool = True, actualizar: bool = True, deduplicar: bool = True,
+                      dry_run: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Lee el estado actual, calcula el plan y, salvo dry_run, lo aplica.
+    Devuelve (plan, resultado) con resultado = {eliminados, actualizados, creados}.
+    """
+    idiomas = sorted(deseado['catalogo_awe_idioma_id'].unique().tolist()) or list(IDIOMAS)
+    plan = plan_names(load_current(supabase, idiomas), deseado, alcance, principal,
+                      crear, actualizar, deduplicar)
+    print(f"🔎 nombre_comun: {len(plan.inserciones)} por crear, {len(plan.actualizaciones)} por actualizar, "
+          f"{len(plan.eliminaciones)} duplicados por eliminar, {plan.sin_cambios} sin cambios")
+
+    if dry_run or plan.vacio:
+        return plan, {'eliminados': 0, 'actualizados': 0, 'creados': 0}
+    return plan, apply_plan(supabase, plan, chunk_size)
+
+
+def sync_natural_key(supabase, deseado: pd.DataFrame, principal: bool = True, podar: bool = False,
+                     dry_run: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Como sync_common_names, pero con la clave natural de plan_natural_key.
+    Devuelve (plan, resultado) con resultado = {eliminados, actualizados, creados}.
+    """
+    idiomas = sorted(deseado['catalogo_awe_idioma_id'].unique().tolist())
+    plan = plan_natural_key(load_current(supabase, idiomas), deseado, principal, podar)
+    print(f"🔎 nombre_comun: {len(plan.inserciones)} por crear, {len(plan.actualizaciones)} por actualizar, "
+          f"{len(plan.eliminaciones)} por eliminar, {plan.sin_cambios} sin cambios")
+
+    if dry_run or plan.vacio:
+        return plan, {'eliminados': 0, 'actualizados': 0, 'creados': 0}
+    return plan, apply_plan(supabase, plan, chunk_size, on_conflict=','.join(CLAVE_NATURAL))
+
+
+def coverage(supabase, alcance, idiomas=IDIOMAS) -> dict:
+    """{idioma: (especies con nombre, filas)} dentro de `alcance`, para la verificación final."""
+    actual = load_current(supabase, idiomas)
+    actual = actual[actual['taxon_id'].isin(set(alcance))]
+    return {idioma: (grupo['taxon_id'].nunique(), len(grupo))
+            for idioma, grupo in actual.groupby('catalogo_awe_idioma_id')}
@@ -7,6 +7,7 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
 
 load_dotenv('.env.local')
 
@@ -34,17 +35,19 @@ def main():
     
     # Obtener especies de BD
     print("🔍 Obteniendo especies de BD...")
-    ficha_response = supabase.table('ficha_especie').select('taxon_id').execute()
-    taxon_ids = [f['taxon_id'] for f in ficha_response.data]
+    fichas = fetch_all(supabase, 'ficha_especie', 'taxon_id', key='id_ficha_especie')
+    taxon_ids = [f['taxon_id'] for f in fichas]
     
-    generos_response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 6).execute()
-    generos_map = {row['id_taxon']: row['taxon'] for row in generos_response.data}
+    generos = fetch_all(supabase, 'taxon', 'id_taxon, taxon', key='id_taxon',
+                        where=lambda q: q.eq('rank_id', 6))
+    generos_map = {row['id_taxon']: row['taxon'] for row in generos}
     
-    especies_response = supabase.table('taxon').select('id_taxon, taxon, taxon_id').eq('rank_id', 7).in_('id_taxon', taxon_ids).execute()
+    especies = fetch_all(supabase, 'taxon', 'id_taxon, taxon, taxon_id', key='id_taxon',
+                         where=lambda q: q.eq('rank_id', 7).in_('id_taxon', taxon_ids))
     
     # Mapear especies BD: nombre_completo -> taxon_id
     especies_bd = {}
-    for especie in especies_response.data:
+    for especie in especies:
         genero_id = especie.get('taxon_id')
         if genero_id and genero_id in generos_map:
             nombre_completo = f"{generos_map[genero_id]} {especie['taxon']}".lower()
@@ -69,11 +72,12 @@ def main():
     
     # Obtener nombres comunes existentes
     print("🔍 Obteniendo nombres comunes existentes...")
-    nombres_response = supabase.table('nombre_comun').select('taxon_id, catalogo_awe_idioma_id').in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]).execute()
+    nombres = fetch_all(supabase, 'nombre_comun', 'taxon_id, catalogo_awe_idioma_id', key='id_nombre_comun',
+                        where=lambda q: q.in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]))
     
     especies_con_es = set()
     especies_con_en = set()
-    for nc in nombres_response.data:
+    for nc in nombres:
         if nc['catalogo_awe_idioma_id'] == 1:
             especies_con_es.add(nc['taxon_id'])
         elif nc['catalogo_awe_idioma_id'] == 8:
@@ -127,11 +131,15 @@ def main():
     
     # Verificación final
     print("\n🔍 Verificando resultado final...")
-    nombres_finales = supabase.table('nombre_comun').select('taxon_id, catalogo_awe_idioma_id').in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]).execute()
+    nombres_finales = fetch_all(
+        supabase, 'nombre_comun', 'taxon_id, catalogo_awe_idioma_id',
+        key='id_nombre_comun',
+        where=lambda q: q.in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]),
+    )
     
     especies_final_es = set()
     especies_final_en = set()
-    for nc in nombres_finales.data:
+    for nc in nombres_finales:
         if nc['catalogo_awe_idioma_id'] == 1:
             especies_final_es.add(nc['taxon_id'])
         elif nc['catalogo_awe_idioma_id'] == 8:
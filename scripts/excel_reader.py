@@ -0,0 +1,75 @@
+"""
+Lector compartido de Excel para los scripts de carga.
+
+Abre los libros en modo read_only y recorre las filas con
+iter_rows(values_only=True), de modo que nunca se materializa la hoja completa
+ni se hace un acceso sheet.cell(row, col) por celda. Los encabezados se mapean
+una sola vez por archivo.
+
+Uso:
+    from excel_reader import iter_excel_rows
+
+    for fila in iter_excel_rows(filepath, ['ID_SALIDA', 'NOMBRE']):
+        fila['ID_SALIDA'], fila['NOMBRE']
+"""
+
+import openpyxl
+
+MAX_HEADER_COLS = 200
+MAX_ROWS = 50000
+
+
+def open_workbook(filepath):
+    """Abre un libro en modo streaming (solo lectura, valores calculados)."""
+    return openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+
+
+def get_sheet(wb, sheet_name=None):
+    """Devuelve la hoja indicada o la activa."""
+    return wb[sheet_name] if sheet_name else wb.active
+
+
+def map_headers(header_row):
+    """Encabezado -> índice (base 0) a partir de la primera fila de la hoja."""
+    headers = {}
+    for idx, value in enumerate(header_row[:MAX_HEADER_COLS]):
+        if value is not None and str(value).strip():
+            headers[str(value).strip()] = idx
+    return headers
+
+
+def iter_values(filepath, sheet_name=None, min_row=2, max_row=None):
+    """Generador de tuplas crudas por fila (sin mapear encabezados)."""
+    wb = open_workbook(filepath)
+    try:
+        ws = get_sheet(wb, sheet_name)
+        for row in ws.iter_rows(min_row=min_row, max_row=max_row, values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def iter_excel_rows(filepath, columns, sheet_name=None, max_rows=MAX_ROWS):
+    """
+    Generador de filas como dict {columna_excel: valor}.
+
+    Solo incluye las columnas de `columns` presentes en el encabezado. Las filas
+    vacías también se emiten (con valores None) para que cada loader conserve
+    su propia regla de corte por filas vacías consecutivas.
+    """
+    wb = open_workbook(filepath)
+    try:
+        ws = get_sheet(wb, sheet_name)
+        rows = ws.iter_rows(max_row=max_rows, values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+
+        headers = map_headers(header_row)
+        wanted = [(col, headers[col]) for col in columns if col in headers]
+
+        for row in rows:
+            n = len(row)
+            yield {col: (row[idx] if idx < n else None) for col, idx in wanted}
+    finally:
+        wb.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Audita la tabla publicacion en busca de publicaciones casi duplicadas
+(títulos que difieren en puntuación, tildes, separadores de subtítulo o años
+al final). Usa el índice MinHash/LSH de publication_dedup.py, que se
+sincroniza con la tabla y se guarda en .cache para la próxima corrida.
+
+Solo reporta: no borra ni fusiona nada.
+
+Uso:
+    python scripts/find-duplicate-publicaciones.py [--umbral 0.8] [--reconstruir]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+from supabase import create_client, Client
+from publication_dedup import UMBRAL_DEFAULT, load_index
+from supabase_fetch import iter_rows
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT_DIR / '.env.local')
+
+REPORT_PATH = ROOT_DIR / 'reports' / 'publicaciones-casi-duplicadas.csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reporta publicaciones casi duplicadas')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_DEFAULT,
+                        help='Similitud mínima (Jaccard estimado) para reportar un par')
+    parser.add_argument('--reconstruir', action='store_true',
+                        help='Ignora el índice guardado y recalcula todas las firmas')
+    args = parser.parse_args()
+
+    supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+    if not supabase_url or not supabase_key:
+        print("❌ Error: Variables de entorno NEXT_PUBLIC_SUPABASE_URL y SUPABASE_SERVICE_ROLE_KEY no encontradas")
+        sys.exit(1)
+
+    supabase: Client = create_client(supabase_url, supabase_key)
+
+    print("🔍 Leyendo publicaciones...")
+    filas = list(iter_rows(supabase, 'publicacion', 'id_publicacion, titulo, cita_corta',
+                           key='id_publicacion', prefetch=True))
+    print(f"   Publicaciones: {len(filas)}")
+
+    indice = load_index(supabase, reconstruir=args.reconstruir, filas=filas)
+    print(f"   Indexadas: {len(indice)}")
+
+    pares = indice.pares(args.umbral)
+    print(f"\n📊 Pares con similitud >= {args.umbral}: {len(pares)}")
+    if not pares:
+        return
+
+    por_id = {f['id_publicacion']: f for f in filas}
+    reporte = pd.DataFrame([{
+        'id_a': a,
+        'titulo_a': por_id[a].get('titulo'),
+        'cita_corta_a': por_id[a].get('cita_corta'),
+        'id_b': b,
+        'titulo_b': por_id[b].get('titulo'),
+        'cita_corta_b': por_id[b].get('cita_corta'),
+        'similitud': sim,
+    } for a, b, sim in pares])
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    reporte.to_csv(REPORT_PATH, index=False)
+
+    for fila in reporte.head(15).itertuples(index=False):
+        print(f"  {fila.similitud:.2f}  [{fila.id_a}] {fila.titulo_a}")
+        print(f"        [{fila.id_b}] {fila.titulo_b}")
+    if len(reporte) > 15:
+        print(f"  ... y {len(reporte) - 15} más")
+    print(f"\n📄 Reporte: {REPORT_PATH}")
+
+
+if __name__ == '__main__':
+    main()
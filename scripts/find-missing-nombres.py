@@ -7,6 +7,8 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
+from taxonomy_cache import load_taxonomy
 
 load_dotenv('.env.local')
 
@@ -31,22 +33,12 @@ def main():
         if 'english common name' in col_lower:
             nombre_comun_en_col = col
     
-    # Obtener especies de BD
-    ficha_response = supabase.table('ficha_especie').select('taxon_id').execute()
-    taxon_ids = [f['taxon_id'] for f in ficha_response.data]
-    
-    generos_response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 6).execute()
-    generos_map = {row['id_taxon']: row['taxon'] for row in generos_response.data}
-    
-    especies_response = supabase.table('taxon').select('id_taxon, taxon, taxon_id').eq('rank_id', 7).in_('id_taxon', taxon_ids).execute()
+    # Obtener especies de BD (con ficha_especie)
+    tax = load_taxonomy(supabase)
+    taxon_ids = list(tax.ficha_by_taxon)
     
     # Mapear especies BD
-    especies_bd = {}
-    for especie in especies_response.data:
-        genero_id = especie.get('taxon_id')
-        if genero_id and genero_id in generos_map:
-            nombre_completo = f"{generos_map[genero_id]} {especie['taxon']}".lower()
-            especies_bd[nombre_completo] = especie['id_taxon']
+    especies_bd = {nombre: tid for nombre, tid in tax.by_binomial.items() if tid in tax.ficha_by_taxon}
     
     # Mapear Excel
     excel_map = {}
@@ -61,11 +53,12 @@ def main():
         excel_map[nombre_cientifico] = {'es': nombre_es, 'en': nombre_en}
     
     # Obtener nombres comunes existentes
-    nombres_response = supabase.table('nombre_comun').select('taxon_id, catalogo_awe_idioma_id').in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]).execute()
+    nombres = fetch_all(supabase, 'nombre_comun', 'taxon_id, catalogo_awe_idioma_id', key='id_nombre_comun',
+                        where=lambda q: q.in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]))
     
     especies_con_es = set()
     especies_con_en = set()
-    for nc in nombres_response.data:
+    for nc in nombres:
         if nc['catalogo_awe_idioma_id'] == 1:
             especies_con_es.add(nc['taxon_id'])
         elif nc['catalogo_awe_idioma_id'] == 8:
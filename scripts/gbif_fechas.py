@@ -0,0 +1,66 @@
+"""
+Escritura masiva de fechas GBIF en coleccion_externa.
+
+En lugar de un UPDATE por registro, las fechas se envían por chunks:
+- modo 'upsert': upsert sobre `id` con solo {id, fecha} (PostgREST solo
+  actualiza las columnas enviadas).
+- modo 'rpc': llama a public.actualizar_fechas_coleccion_externa(p_pares), que
+  aplica cada chunk con un único UPDATE ... FROM y solo rellena fechas vacías
+  (ver supabase/migrations/20261017120000_actualizar_fechas_coleccion_externa.sql).
+
+Varios chunks pueden ir en paralelo (`concurrency`).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+log = logging.getLogger(__name__)
+
+MODOS = ('upsert', 'rpc')
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CONCURRENCY = 4
+
+
+def _aplicar_chunk(supabase, chunk, modo):
+    """Envía un chunk; devuelve cuántas filas se actualizaron."""
+    if modo == 'rpc':
+        resp = supabase.rpc('actualizar_fechas_coleccion_externa', {'p_pares': chunk}).execute()
+        return resp.data or 0
+    supabase.table('coleccion_externa') \
+        .upsert(chunk, on_conflict='id', returning='minimal') \
+        .execute()
+    return len(chunk)
+
+
+def aplicar_fechas_bulk(supabase, actualizaciones, modo='upsert',
+                        chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Aplica [{'id': ..., 'fecha': 'YYYY-MM-DD'}, ...] en chunks.
+
+    Reporta progreso por chunk. Un chunk que falla se registra y no detiene a
+    los demás. Devuelve (actualizados, errores) en número de registros.
+    """
+    if modo not in MODOS:
+        raise ValueError(f'Modo desconocido: {modo} (usar {", ".join(MODOS)})')
+
+    chunks = [actualizaciones[i:i + chunk_size] for i in range(0, len(actualizaciones), chunk_size)]
+    total = len(actualizaciones)
+    actualizados = 0
+    errores = 0
+    enviados = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_aplicar_chunk, supabase, chunk, modo): (n, chunk)
+                   for n, chunk in enumerate(chunks, 1)}
+        for future in as_completed(futures):
+            n, chunk = futures[future]
+            enviados += len(chunk)
+            try:
+                actualizados += future.result()
+            except Exception as e:
+                errores += len(chunk)
+                log.error(f'Chunk {n}/{len(chunks)} ({len(chunk)} registros) falló: {e}')
+                continue
+            log.info(f'  Chunk {n}/{len(chunks)} ✓ — enviados {enviados}/{total}, actualizados {actualizados}')
+
+    return actualizados, errores
@@ -0,0 +1,341 @@
+"""
+Cosecha concurrente y reanudable de ocurrencias GBIF (Amphibia, Ecuador).
+
+La búsqueda de GBIF no pagina más allá de offset 100.000, así que la consulta se
+parte en "slices" por faceta `year` (y, si un año supera el tope, por
+`institutionCode` dentro de ese año). Cada slice se descarga de forma
+asíncrona bajo un limitador token-bucket compartido que respeta 429/503 y la
+cabecera Retry-After.
+
+Cada slice terminado se guarda en disco y se anota en un manifiesto, así que
+si el proceso muere la siguiente ejecución continúa desde donde quedó. Al final
+los slices se vuelcan al índice local SQLite (gbif_index.GbifIndex).
+
+refresh() decide entre cosecha completa (primera vez o full=True) e
+incremental: solo las ocurrencias con lastInterpreted posterior a la última
+cosecha.
+
+Uso:
+    from gbif_harvester import refresh
+    from gbif_index import GbifIndex
+
+    with GbifIndex() as indice:
+        refresh(indice, concurrency=4, rate=5.0)
+        indice.buscar_fecha('QCAZA', '12345')
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+from gbif_index import GbifIndex
+
+log = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = ROOT_DIR / '.cache' / 'gbif'
+HARVEST_DIR = CACHE_DIR / 'cosecha'
+
+GBIF_BASE = 'https://api.gbif.org/v1/occurrence/search'
+USER_AGENT = 'amphibians-wiki-jambatu/1.0 (https://anfibiosecuador.ec)'
+BASE_QUERY = {
+    'country': 'EC',
+    'classKey': '131',  # Amphibia
+    'basisOfRecord': 'PRESERVED_SPECIMEN',
+}
+PAGE_SIZE = 300
+OFFSET_CAP = 100_000  # GBIF no devuelve offset + limit > 100.000
+MAX_RETRIES = 8
+# Solape al pedir cambios desde la última cosecha (lastInterpreted es por día)
+INCREMENTAL_OVERLAP = timedelta(days=1)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 5.0  # peticiones por segundo
+
+
+class GbifError(Exception):
+    pass
+
+
+# ─── Rate limiting ────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """
+    Limitador token-bucket para asyncio: `rate` peticiones/s con ráfagas de
+    hasta `burst`. pause() congela a todos los consumidores (429/Retry-After).
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def retry_after_seconds(resp: httpx.Response) -> float | None:
+    """Lee Retry-After (segundos o fecha HTTP)."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+async def gbif_get(client: httpx.AsyncClient, bucket: TokenBucket, params: dict) -> dict:
+    """GET a la búsqueda de ocurrencias con reintentos y backoff."""
+    for intento in range(MAX_RETRIES):
+        await bucket.acquire()
+        try:
+            resp = await client.get(GBIF_BASE, params=params, timeout=60.0)
+        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+            wait = min(2 ** intento * 5, 120)
+            log.warning(f'Error red: {type(e).__name__} — reintento en {wait}s')
+            await asyncio.sleep(wait)
+            continue
+
+        if resp.status_code in (429, 503):
+            wait = retry_after_seconds(resp)
+            if wait is None:
+                wait = 60 if resp.status_code == 429 else min(2 ** intento * 10, 300)
+            log.warning(f'GBIF {resp.status_code} — pausando todas las peticiones {wait:.0f}s')
+            bucket.pause(wait)
+            continue
+
+        if resp.status_code != 200:
+            raise GbifError(f'GBIF HTTP {resp.status_code}: {resp.text[:200]}')
+        return resp.json()
+
+    raise GbifError(f'GBIF: reintentos agotados para {params}')
+
+
+# ─── Slices ───────────────────────────────────────────────────────────────────
+
+def slice_key(params: dict) -> str:
+    return '_'.join(f'{k}-{v}' for k, v in sorted(params.items())).replace('/', '-').replace(' ', '-')
+
+
+async def facet_counts(client, bucket, query: dict, facet: str) -> tuple[int, dict[str, int]]:
+    data = await gbif_get(client, bucket, {
+        **query, 'limit': '0', 'facet': facet, 'facetLimit': '5000',
+    })
+    counts = {}
+    for f in data.get('facets', []):
+        for c in f.get('counts', []):
+            counts[str(c['name'])] = c['count']
+    return data.get('count', 0), counts
+
+
+async def plan_slices(client, bucket, base_query: dict) -> list[dict]:
+    """Parte la consulta por año (y por institución si un año supera el tope)."""
+    total, por_anio = await facet_counts(client, bucket, base_query, 'year')
+    log.info(f'Total registros en GBIF: {total} en {len(por_anio)} años')
+    sin_anio = total - sum(por_anio.values())
+    if sin_anio > 0:
+        # Sin año tampoco hay eventDate utilizable para el backfill
+        log.info(f'  {sin_anio} registros sin año (se omiten)')
+
+    slices = []
+    for anio, count in sorted(por_anio.items()):
+        params = {'year': anio}
+        if count <= OFFSET_CAP:
+            slices.append({'params': params, 'count': count})
+            continue
+        _, por_inst = await facet_counts(client, bucket, {**base_query, **params}, 'institutionCode')
+        for inst, inst_count in sorted(por_inst.items()):
+            if inst_count > OFFSET_CAP:
+                log.warning(f'  year={anio} institutionCode={inst}: {inst_count} registros, '
+                            f'solo se pueden descargar {OFFSET_CAP}')
+            slices.append({'params': {**params, 'institutionCode': inst}, 'count': inst_count})
+    return slices
+
+
+def compact_record(rec: dict) -> dict | None:
+    """Campos que guardamos por ocurrencia; None si no sirve para cruzar."""
+    inst_code = (rec.get('institutionCode') or '').strip()
+    cat_num = (rec.get('catalogNumber') or '').strip()
+    if not inst_code or not cat_num:
+        return None
+    return {
+        'institutionCode': inst_code.upper(),
+        'catalogNumber': cat_num,
+        'eventDate': rec.get('eventDate') or None,
+        'gbifID': rec.get('gbifID') or rec.get('key'),
+        'lastInterpreted': rec.get('lastInterpreted'),
+    }
+
+
+async def harvest_slice(client, bucket, base_query: dict, slc: dict) -> list[dict]:
+    records = []
+    offset = 0
+    limite = min(slc['count'], OFFSET_CAP)
+    while offset < limite:
+        data = await gbif_get(client, bucket, {
+            **base_query, **slc['params'],
+            'limit': str(min(PAGE_SIZE, OFFSET_CAP - offset)),
+            'offset': str(offset),
+        })
+        results = data.get('results', [])
+        for rec in results:
+            compact = compact_record(rec)
+            if compact:
+                records.append(compact)
+        offset += len(results)
+        if not results or data.get('endOfRecords'):
+            break
+    return records
+
+
+# ─── Checkpoints ──────────────────────────────────────────────────────────────
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    tmp.replace(path)
+
+
+def _load_manifest(base_query: dict) -> dict | None:
+    path = HARVEST_DIR / 'manifest.json'
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text(encoding='utf-8'))
+    if manifest.get('query') != base_query or manifest.get('complete'):
+        return None
+    return manifest
+
+
+def _save_manifest(manifest: dict):
+    _write_atomic(HARVEST_DIR / 'manifest.json', json.dumps(manifest, indent=2))
+
+
+def _iter_slices(manifest: dict):
+    for key in manifest['slices']:
+        with open(HARVEST_DIR / f'{key}.jsonl', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+async def _harvest(base_query, concurrency, rate, fresh, index, replace):
+    HARVEST_DIR.mkdir(parents=True, exist_ok=True)
+    bucket = TokenBucket(rate)
+
+    async with httpx.AsyncClient(
+        headers={'User-Agent': USER_AGENT},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+        manifest = None if fresh else _load_manifest(base_query)
+        if manifest:
+            pendientes = sum(1 for s in manifest['slices'].values() if not s['done'])
+            log.info(f'Reanudando cosecha del {manifest["started_at"]}: {pendientes} slices pendientes')
+        else:
+            slices = await plan_slices(client, bucket, base_query)
+            manifest = {
+                'query': base_query,
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'complete': False,
+                'slices': {slice_key(s['params']): {**s, 'done': False} for s in slices},
+            }
+            _save_manifest(manifest)
+
+        total = len(manifest['slices'])
+        hechos = sum(1 for s in manifest['slices'].values() if s['done'])
+        sem = asyncio.Semaphore(concurrency)
+
+        async def run(key, slc):
+            nonlocal hechos
+            async with sem:
+                records = await harvest_slice(client, bucket, base_query, slc)
+            _write_atomic(HARVEST_DIR / f'{key}.jsonl',
+                          ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+            slc['done'] = True
+            _save_manifest(manifest)
+            hechos += 1
+            log.info(f'  Slice {key}: {len(records)} registros ({hechos}/{total})')
+
+        # Un slice que falla no cancela al resto: los demás terminan y quedan
+        # guardados, y la siguiente ejecución reintenta solo los pendientes
+        resultados = await asyncio.gather(*(
+            run(key, slc) for key, slc in manifest['slices'].items()
+            if not (slc['done'] and (HARVEST_DIR / f'{key}.jsonl').exists())
+        ), return_exceptions=True)
+        fallidos = [r for r in resultados if isinstance(r, Exception)]
+        if fallidos:
+            raise GbifError(f'{len(fallidos)} slices fallaron; vuelve a ejecutar para reanudar') from fallidos[0]
+
+    if replace:
+        index.replace_all(_iter_slices(manifest))
+    else:
+        index.upsert(_iter_slices(manifest))
+    manifest['complete'] = True
+    manifest['finished_at'] = datetime.now().isoformat(timespec='seconds')
+    _save_manifest(manifest)
+    n = sum(s['count'] for s in manifest['slices'].values())
+    log.info(f'=== Cosecha terminada: {n} ocurrencias volcadas a {index.path} ===')
+
+
+def harvest(index: GbifIndex, base_query: dict | None = None, concurrency: int = DEFAULT_CONCURRENCY,
+            rate: float = DEFAULT_RATE, fresh: bool = False, replace: bool = True) -> None:
+    """
+    Descarga (o reanuda) la cosecha de `base_query` y la vuelca en `index`.
+
+    replace=True reemplaza el contenido del índice; False hace upsert.
+    fresh=True ignora cualquier checkpoint pendiente y vuelve a planificar.
+    """
+    asyncio.run(_harvest(base_query or BASE_QUERY, concurrency, rate, fresh, index, replace))
+
+
+def refresh(index: GbifIndex, concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+            full: bool = False, fresh: bool = False) -> None:
+    """
+    Actualiza el índice local: cosecha completa la primera vez (o con full=True),
+    y después solo las ocurrencias reinterpretadas desde la última cosecha.
+
+    Las ocurrencias eliminadas en GBIF solo desaparecen del índice con full=True.
+    """
+    inicio = datetime.now(timezone.utc)
+    ultima = index.get_meta('ultima_cosecha')
+
+    if full or not ultima or not index.count():
+        log.info('=== Cosecha completa de GBIF ===')
+        harvest(index, BASE_QUERY, concurrency, rate, fresh=fresh, replace=True)
+    else:
+        desde = (datetime.fromisoformat(ultima) - INCREMENTAL_OVERLAP).date().isoformat()
+        log.info(f'=== Cosecha incremental de GBIF (lastInterpreted >= {desde}) ===')
+        query = {**BASE_QUERY, 'lastInterpreted': f'{desde},*'}
+        harvest(index, query, concurrency, rate, fresh=fresh, replace=False)
+
+    index.set_meta('ultima_cosecha', inicio.isoformat(timespec='seconds'))
+    log.info(f'Índice GBIF local: {index.count()} ocurrencias')
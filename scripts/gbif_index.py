@@ -0,0 +1,157 @@
+"""
+Índice local persistente de ocurrencias GBIF (SQLite).
+
+Guarda una fila por (institutionCode, catalogNumber) con eventDate, la fecha
+ya normalizada, gbifID y lastInterpreted. Lo llena gbif_harvester (cosecha
+completa o incremental por lastInterpreted) y lo consultan los scripts de
+backfill de fechas sin volver a descargar GBIF.
+
+Uso:
+    from gbif_index import GbifIndex
+
+    with GbifIndex() as indice:
+        indice.buscar_fecha('QCAZA', '12345')   # prueba las variantes de build_lookup_keys
+"""
+
+import sqlite3
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+INDEX_DB = ROOT_DIR / '.cache' / 'gbif' / 'ocurrencias-amphibia-ec.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocurrencia (
+    institution_code TEXT NOT NULL,
+    catalog_number   TEXT NOT NULL,
+    event_date       TEXT,
+    fecha            TEXT,
+    gbif_id          INTEGER,
+    last_interpreted TEXT,
+    PRIMARY KEY (institution_code, catalog_number)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Si GBIF tiene varias ocurrencias con la misma clave, se conserva la que tiene fecha
+UPSERT_SQL = """
+INSERT INTO ocurrencia (institution_code, catalog_number, event_date, fecha, gbif_id, last_interpreted)
+VALUES (:institutionCode, :catalogNumber, :eventDate, :fecha, :gbifID, :lastInterpreted)
+ON CONFLICT (institution_code, catalog_number) DO UPDATE SET
+    event_date = excluded.event_date,
+    fecha = excluded.fecha,
+    gbif_id = excluded.gbif_id,
+    last_interpreted = excluded.last_interpreted
+WHERE excluded.fecha IS NOT NULL OR ocurrencia.fecha IS NULL
+"""
+
+
+def parse_event_date(event_date: str) -> str | None:
+    """Parsea eventDate de GBIF a formato YYYY-MM-DD."""
+    if not event_date:
+        return None
+    # Handle ISO dates like "2015-03-21T00:00:00"
+    if 'T' in event_date:
+        event_date = event_date.split('T')[0]
+    partes = event_date.split('-')
+    if len(partes) >= 3:
+        return f"{partes[0]}-{partes[1]}-{partes[2][:2]}"
+    elif len(partes) == 2:
+        return f"{partes[0]}-{partes[1]}-01"
+    elif len(partes) == 1 and partes[0].isdigit() and len(partes[0]) == 4:
+        return f"{partes[0]}-01-01"
+    return None
+
+
+# Variantes (institutionCode, prefijo de catalogNumber) por catálogo, en orden de
+# prioridad. Misma lógica que GbifLink de la mapoteca. Catálogos no listados se
+# buscan tal cual: (catalogo, numero).
+VARIANT_RULES = {
+    'QCAZA': [('QCAZ', 'QCAZA'), ('QCAZ', ''), ('QCAZA', ''), ('QCAZA', 'QCAZA')],
+    'QCAZ': [('QCAZ', 'QCAZA'), ('QCAZ', ''), ('QCAZA', ''), ('QCAZA', 'QCAZA')],
+    'KU': [('KU', ''), ('KUBI', '')],
+    'AMNH': [('AMNH', 'A-'), ('AMNH', '')],
+    'USNM': [('USNM', 'USNM '), ('USNM', '')],
+    'DHMECN': [('DHMECN', 'DHMECN '), ('DHMECN', ''), ('MECN', '')],
+    'MCZ': [('MCZ', 'MCZ:Herp:A-'), ('MCZ', '')],
+}
+
+
+def build_lookup_keys(catalogo: str, numero: str) -> list[tuple[str, str]]:
+    """
+    Genera las variantes de (institutionCode, catalogNumber) para buscar en el índice GBIF.
+    Ver VARIANT_RULES; gbif_matcher aplica las mismas reglas de forma vectorizada.
+    """
+    num = numero.strip()
+    cat = catalogo.strip().upper()
+    rules = VARIANT_RULES.get(cat, [(cat, '')])
+    return [(inst, f'{prefijo}{num}') for inst, prefijo in rules]
+
+
+class GbifIndex:
+    """Acceso al archivo SQLite del índice."""
+
+    def __init__(self, path: Path = INDEX_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # ─── Escritura ────────────────────────────────────────────────────────────
+
+    def upsert(self, records) -> None:
+        """Inserta/actualiza registros con las claves de gbif_harvester.compact_record."""
+        rows = ({**r, 'fecha': parse_event_date(r.get('eventDate') or '')} for r in records)
+        with self.conn:
+            self.conn.executemany(UPSERT_SQL, rows)
+
+    def replace_all(self, records) -> None:
+        """Reemplaza todo el contenido en una sola transacción (cosecha completa)."""
+        rows = ({**r, 'fecha': parse_event_date(r.get('eventDate') or '')} for r in records)
+        with self.conn:
+            self.conn.execute('DELETE FROM ocurrencia')
+            self.conn.executemany(UPSERT_SQL, rows)
+
+    def get_meta(self, clave: str) -> str | None:
+        row = self.conn.execute('SELECT valor FROM meta WHERE clave = ?', (clave,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, clave: str, valor: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO meta (clave, valor) VALUES (?, ?) '
+                'ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor',
+                (clave, valor),
+            )
+
+    # ─── Lectura ──────────────────────────────────────────────────────────────
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT count(*) FROM ocurrencia').fetchone()[0]
+
+    def fecha(self, institution_code: str, catalog_number: str) -> str | None:
+        row = self.conn.execute(
+            'SELECT fecha FROM ocurrencia WHERE institution_code = ? AND catalog_number = ?',
+            (institution_code, catalog_number),
+        ).fetchone()
+        return row[0] if row else None
+
+    def buscar_fecha(self, catalogo: str, numero: str) -> str | None:
+        """Primera fecha encontrada entre las variantes de build_lookup_keys (en orden)."""
+        for inst, cat in build_lookup_keys(catalogo, numero):
+            fecha = self.fecha(inst, cat)
+            if fecha:
+                return fecha
+        return None
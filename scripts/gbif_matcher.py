@@ -0,0 +1,100 @@
+"""
+Cruce vectorizado de coleccion_externa con el índice GBIF local.
+
+En lugar de generar las variantes de catálogo registro a registro y probar el
+índice hasta cuatro veces por cada uno, se construyen todas las claves
+candidatas (institutionCode, catalogNumber) del lote en una sola pasada con
+operaciones de columna de pandas y se resuelven con un único merge contra las
+ocurrencias del índice. De cada registro se queda la variante de menor
+prioridad (la primera de VARIANT_RULES), igual que GbifIndex.buscar_fecha.
+
+Uso:
+    from gbif_matcher import load_index_frame, match_fechas, match_report
+
+    ocurrencias = load_index_frame(indice)
+    matches = match_fechas(registros, ocurrencias)    # id, fecha, catalogo, prioridad
+    reporte = match_report(registros, matches)        # tasa de match por catálogo
+"""
+
+import pandas as pd
+
+from gbif_index import VARIANT_RULES
+
+RULES_FRAME = pd.DataFrame(
+    [(cat, prioridad, inst, prefijo)
+     for cat, rules in VARIANT_RULES.items()
+     for prioridad, (inst, prefijo) in enumerate(rules, 1)],
+    columns=['catalogo', 'prioridad', 'institution_code', 'prefijo'],
+)
+
+
+def _normalizar(registros) -> pd.DataFrame:
+    """Lista de dicts de coleccion_externa (o DataFrame) → id, catalogo, numero."""
+    df = pd.DataFrame(registros, columns=['id', 'catalogo_museo', 'numero_museo'])
+    return pd.DataFrame({
+        'id': df['id'],
+        'catalogo': df['catalogo_museo'].astype(str).str.strip().str.upper(),
+        'numero': df['numero_museo'].astype(str).str.strip(),
+    })
+
+
+def candidate_keys(registros) -> pd.DataFrame:
+    """
+    Todas las claves candidatas del lote: id, catalogo, prioridad,
+    institution_code, catalog_number.
+    """
+    df = _normalizar(registros)
+    conocidos = df['catalogo'].isin(RULES_FRAME['catalogo'])
+
+    con_reglas = df[conocidos].merge(RULES_FRAME, on='catalogo', how='inner')
+    con_reglas['catalog_number'] = con_reglas['prefijo'] + con_reglas['numero']
+
+    # Catálogos sin reglas: se buscan tal cual
+    genericos = df[~conocidos].assign(
+        prioridad=1,
+        institution_code=df.loc[~conocidos, 'catalogo'],
+        catalog_number=df.loc[~conocidos, 'numero'],
+    )
+
+    columnas = ['id', 'catalogo', 'prioridad', 'institution_code', 'catalog_number']
+    return pd.concat([con_reglas[columnas], genericos[columnas]], ignore_index=True)
+
+
+def load_index_frame(indice) -> pd.DataFrame:
+    """Ocurrencias del índice con fecha: institution_code, catalog_number, fecha."""
+    return pd.read_sql_query(
+        'SELECT institution_code, catalog_number, fecha FROM ocurrencia WHERE fecha IS NOT NULL',
+        indice.conn,
+    )
+
+
+def match_fechas(registros, ocurrencias: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cruza los registros con las ocurrencias en un solo merge.
+    Devuelve un registro por id encontrado: id, fecha, catalogo, prioridad.
+    """
+    candidatos = candidate_keys(registros)
+    cruce = candidatos.merge(ocurrencias, on=['institution_code', 'catalog_number'], how='inner')
+    cruce = cruce.sort_values(['id', 'prioridad'], kind='stable').drop_duplicates('id', keep='first')
+    return cruce[['id', 'fecha', 'catalogo', 'prioridad']].reset_index(drop=True)
+
+
+def match_report(registros, matches: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tasa de match por catálogo, con cuántos registros resolvió cada variante
+    (columnas variante_1, variante_2, ...). Útil para ajustar VARIANT_RULES.
+    """
+    df = _normalizar(registros)
+    reporte = df.groupby('catalogo').size().rename('registros').to_frame()
+    reporte['encontrados'] = matches.groupby('catalogo').size()
+    reporte['encontrados'] = reporte['encontrados'].fillna(0).astype(int)
+    reporte['sin_match'] = reporte['registros'] - reporte['encontrados']
+    reporte['tasa_pct'] = (reporte['encontrados'] / reporte['registros'] * 100).round(1)
+
+    if not matches.empty:
+        por_variante = pd.crosstab(matches['catalogo'], matches['prioridad'])
+        por_variante.columns = [f'variante_{p}' for p in por_variante.columns]
+        reporte = reporte.join(por_variante).fillna(0)
+        reporte[por_variante.columns] = reporte[por_variante.columns].astype(int)
+
+    return reporte.sort_values('registros', ascending=False).reset_index()
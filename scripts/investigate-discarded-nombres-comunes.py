@@ -7,6 +7,7 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
 from collections import defaultdict
 
 # Cargar variables de entorno
@@ -26,25 +27,27 @@ def main():
     print("🔍 Obteniendo todos los registros de vw_nombres_comunes...")
     
     # Obtener TODOS los registros de la vista (no solo los con nombre_comun_especie)
-    response = supabase.table('vw_nombres_comunes').select(
-        'id_taxon, orden, familia, genero, especie, nombre_comun_especie, nombre_cientifico'
-    ).execute()
+    registros = fetch_all(
+        supabase, 'vw_nombres_comunes',
+        'id_taxon, orden, familia, genero, especie, nombre_comun_especie, nombre_cientifico',
+        key='id_taxon',
+    )
     
-    if not response.data:
+    if not registros:
         print("❌ Error: No se pudieron obtener los registros")
         sys.exit(1)
     
-    total_registros_vista = len(response.data)
+    total_registros_vista = len(registros)
     print(f"✅ Total de registros en la vista: {total_registros_vista}")
     
     # Filtrar solo los que tienen nombre_comun_especie (igual que en get-taxon-nombres.ts)
-    registros_con_nombre_comun_especie = [r for r in response.data if r.get('nombre_comun_especie') is not None and r.get('nombre_comun_especie') != '']
+    registros_con_nombre_comun_especie = [r for r in registros if r.get('nombre_comun_especie') is not None and r.get('nombre_comun_especie') != '']
     total_registros = len(registros_con_nombre_comun_especie)
     print(f"✅ Total de registros con nombre_comun_especie: {total_registros}")
     print(f"⚠️  Registros sin nombre_comun_especie: {total_registros_vista - total_registros}")
     
     # Usar solo los registros con nombre_comun_especie para el análisis
-    response.data = registros_con_nombre_comun_especie
+    registros = registros_con_nombre_comun_especie
     
     # Analizar qué registros se descartan
     registros_validos = []
@@ -59,7 +62,7 @@ def main():
     sin_familia_genero = []
     sin_todos = []
     
-    for registro in response.data:
+    for registro in registros:
         tiene_orden = registro.get('orden') is not None and registro.get('orden') != ''
         tiene_familia = registro.get('familia') is not None and registro.get('familia') != ''
         tiene_genero = registro.get('genero') is not None and registro.get('genero') != ''
@@ -203,11 +206,13 @@ def main():
     print(f"\n🔍 Investigando los {total_registros_vista - total_registros} registros sin nombre_comun_especie...")
     
     # Obtener todos los registros de nuevo para analizar los que no tienen nombre_comun_especie
-    response_completo = supabase.table('vw_nombres_comunes').select(
-        'id_taxon, orden, familia, genero, especie, nombre_comun_especie, nombre_comun_familia, nombre_comun_genero, nombre_comun_orden, nombre_cientifico'
-    ).execute()
+    registros_completo = fetch_all(
+        supabase, 'vw_nombres_comunes',
+        'id_taxon, orden, familia, genero, especie, nombre_comun_especie, nombre_comun_familia, nombre_comun_genero, nombre_comun_orden, nombre_cientifico',
+        key='id_taxon',
+    )
     
-    registros_sin_nombre_especie = [r for r in response_completo.data if r.get('nombre_comun_especie') is None or r.get('nombre_comun_especie') == '']
+    registros_sin_nombre_especie = [r for r in registros_completo if r.get('nombre_comun_especie') is None or r.get('nombre_comun_especie') == '']
     
     if registros_sin_nombre_especie:
         print(f"\n📋 Análisis de registros sin nombre_comun_especie:")
@@ -237,7 +242,7 @@ def main():
     # Verificar si hay duplicados por id_taxon
     print(f"\n🔍 Verificando duplicados por id_taxon...")
     id_taxon_counts = defaultdict(int)
-    for registro in response_completo.data:
+    for registro in registros_completo:
         id_taxon_counts[registro.get('id_taxon')] += 1
     
     duplicados = {k: v for k, v in id_taxon_counts.items() if v > 1}
@@ -8,6 +8,8 @@ import os
 import sys
 from datetime import datetime, date, time
 from pathlib import Path
+import argparse
+import threading
 import warnings
 import json
 warnings.filterwarnings('ignore')
@@ -15,16 +17,20 @@ warnings.filterwarnings('ignore')
 ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
-import openpyxl
 from dotenv import load_dotenv
 from supabase import create_client
 
+from excel_reader import iter_excel_rows
+from batch_insert import RejectLog, retry_by_bisection
+from table_scheduler import DEFAULT_WORKERS, build_dependencies, run_dag
+
 load_dotenv(ROOT_DIR / '.env.local')
 load_dotenv(ROOT_DIR / '.env')
 
 SUPABASE_URL = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
 DATOS_DIR = ROOT_DIR / 'Datos'
+REJECTS_PATH = ROOT_DIR / 'reports' / 'rechazos-load-all-data.jsonl'
 
 MAX_BIGINT = 9223372036854775807
 
@@ -40,6 +46,8 @@ ID_MAPPINGS = {
     'prestamo': {},
 }
 NEXT_IDS = {k: 900000000 for k in ID_MAPPINGS}
+# Las tablas se cargan en paralelo: el mapeo se comparte entre hilos
+ID_MAPPINGS_LOCK = threading.Lock()
 
 
 def get_mapped_id(table, original_id):
@@ -55,10 +63,11 @@ def get_mapped_id(table, original_id):
         num = int(float(val_str))
 
         if num > MAX_BIGINT:
-            if val_str not in ID_MAPPINGS.get(table, {}):
-                ID_MAPPINGS[table][val_str] = NEXT_IDS[table]
-                NEXT_IDS[table] += 1
-            return ID_MAPPINGS[table][val_str]
+            with ID_MAPPINGS_LOCK:
+                if val_str not in ID_MAPPINGS.get(table, {}):
+                    ID_MAPPINGS[table][val_str] = NEXT_IDS[table]
+                    NEXT_IDS[table] += 1
+                return ID_MAPPINGS[table][val_str]
 
         return num
     except:
@@ -124,29 +133,15 @@ def convert_value(value, col_name, fk_table=None):
 
 def read_excel(filepath, columns, pk_col, pk_table):
     """Lee datos del Excel con mapeo de IDs."""
-    wb = openpyxl.load_workbook(filepath, data_only=True)
-    sheet = wb.active
-
-    headers = {}
-    for col in range(1, 200):
-        cell = sheet.cell(row=1, column=col)
-        if cell.value:
-            headers[str(cell.value).strip()] = col
-        elif col > len(headers) + 5:
-            break
-
     records = []
-    row = 2
     empty = 0
 
-    while empty < 5 and row < 50000:
+    for row in iter_excel_rows(filepath, columns):
         data = {}
         has_data = False
 
-        for excel_col, (supa_col, fk_table) in columns.items():
-            if excel_col not in headers:
-                continue
-            value = sheet.cell(row=row, column=headers[excel_col]).value
+        for excel_col, value in row.items():
+            supa_col, fk_table = columns[excel_col]
             if value is not None:
                 has_data = True
 
@@ -167,14 +162,14 @@ def read_excel(filepath, columns, pk_col, pk_table):
             empty = 0
         else:
             empty += 1
-        row += 1
+            if empty >= 5:
+                break
 
-    wb.close()
     return records
 
 
-def load_table(supabase, table, records, batch_size=100):
-    """Carga registros a Supabase."""
+def load_table(supabase, table, records, batch_size=100, reject_log=None):
+    """Carga registros a Supabase; las filas que fallan van a reject_log."""
     if not records:
         return 0
 
@@ -184,16 +179,13 @@ def load_table(supabase, table, records, batch_size=100):
         try:
             supabase.table(table).insert(batch).execute()
             inserted += len(batch)
-            print(f"   ✓ {inserted}/{len(records)}")
+            print(f"   ✓ {table}: {inserted}/{len(records)}")
         except Exception as e:
-            print(f"   ❌ Error lote {i//batch_size + 1}: {str(e)[:80]}")
-            # Intentar uno por uno
-            for record in batch:
-                try:
-                    supabase.table(table).insert(record).execute()
-                    inserted += 1
-                except:
-                    pass
+            print(f"   ❌ {table}: error lote {i//batch_size + 1}: {str(e)[:80]}")
+            # Bisecar el lote para aislar las filas que fallan
+            ok = retry_by_bisection(supabase, table, batch, e, reject_log)
+            inserted += ok
+            print(f"   ↳ {table}: {ok}/{len(batch)} recuperados, {len(batch) - ok} rechazados")
 
     return inserted
 
@@ -202,12 +194,17 @@ def clean_table(supabase, table):
     """Limpia una tabla."""
     try:
         supabase.table(table).delete().neq('created_at', '1900-01-01').execute()
-        print(f"   🧹 Limpiada")
+        print(f"   🧹 {table}: limpiada")
     except Exception as e:
-        print(f"   ⚠️  No se pudo limpiar: {str(e)[:50]}")
+        print(f"   ⚠️  {table}: no se pudo limpiar: {str(e)[:50]}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Carga todos los Excel de Datos/ a Supabase")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"tablas cargadas en paralelo (default: {DEFAULT_WORKERS}; 1 = secuencial)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🐸 CARGA DE DATOS - BANCO DE VIDA")
     print("=" * 60)
@@ -427,25 +424,39 @@ def main():
         }),
     ]
 
-    total_inserted = 0
+    # DAG de dependencias a partir de las FKs declaradas en cada tabla
+    config_by_table = {t[0]: t for t in tables}
+    deps = build_dependencies({
+        table: {fk_table for _, fk_table in columns.values() if fk_table}
+        for table, _, _, _, columns in tables
+    })
 
-    for table, filename, pk_col, pk_table, columns in tables:
+    def cargar(table):
+        _, filename, pk_col, pk_table, columns = config_by_table[table]
         filepath = DATOS_DIR / filename
 
         if not filepath.exists():
             print(f"⚠️  {filename} no existe")
-            continue
+            return 0
 
         print(f"📋 {table}")
         clean_table(supabase, table)
 
-        print(f"   📖 Leyendo {filename}...")
+        print(f"   📖 {table}: leyendo {filename}...")
         records = read_excel(filepath, columns, pk_col, pk_table)
-        print(f"   📄 {len(records)} registros")
+        print(f"   📄 {table}: {len(records)} registros")
+
+        inserted = load_table(supabase, table, records, reject_log=rejects)
+        print(f"   ✅ {table}: {inserted} insertados\n")
+        return inserted
+
+    print(f"⚙️  Cargando con {args.workers} worker(s) según dependencias de FKs\n")
+    with RejectLog(REJECTS_PATH) as rejects:
+        results, errors = run_dag(list(config_by_table), deps, cargar, max_workers=args.workers)
+    total_inserted = sum(results.values())
 
-        inserted = load_table(supabase, table, records)
-        total_inserted += inserted
-        print(f"   ✅ {inserted} insertados\n")
+    for table, error in errors.items():
+        print(f"❌ {table}: {error}")
 
     # Guardar mapeo para referencia
     with open(ROOT_DIR / 'id_mappings.json', 'w') as f:
@@ -454,6 +465,8 @@ def main():
     print("=" * 60)
     print(f"✅ TOTAL: {total_inserted} registros insertados")
     print("📁 Mapeo de IDs guardado en id_mappings.json")
+    if rejects.count:
+        print(f"⚠️  {rejects.count} filas rechazadas → {REJECTS_PATH.relative_to(ROOT_DIR)}")
 
 
 if __name__ == '__main__':
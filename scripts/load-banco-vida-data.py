@@ -6,12 +6,14 @@ Orden de carga respetando dependencias de Foreign Keys.
 Uso:
     source venv/bin/activate
     python scripts/load-banco-vida-data.py
+    python scripts/load-banco-vida-data.py --workers 1   # carga secuencial
 
 Requiere variables de entorno:
     NEXT_PUBLIC_SUPABASE_URL
     SUPABASE_SERVICE_ROLE_KEY (o NEXT_PUBLIC_SUPABASE_ANON_KEY para lectura)
 """
 
+import argparse
 import os
 import sys
 from datetime import datetime, date, time
@@ -24,9 +26,11 @@ ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
 try:
-    import openpyxl
     from dotenv import load_dotenv
     from supabase import create_client, Client
+    from excel_reader import iter_excel_rows
+    from batch_insert import RejectLog, retry_by_bisection
+    from table_scheduler import DEFAULT_WORKERS, build_dependencies, run_dag
 except ImportError as e:
     print(f"❌ Error: {e}")
     print("   Instala las dependencias: pip install openpyxl python-dotenv supabase")
@@ -47,9 +51,13 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 # Directorio de datos
 DATOS_DIR = ROOT_DIR / 'Datos'
 
+# Filas rechazadas por la BD (JSONL: tabla, fila, error)
+REJECTS_PATH = ROOT_DIR / 'reports' / 'rechazos-banco-vida.jsonl'
+
 # Mapeo de archivos Excel a tablas de Supabase
 # Formato: (archivo_excel, nombre_tabla_supabase, mapeo_columnas)
 # El mapeo es: columna_excel -> columna_supabase (None = usar mismo nombre en minúsculas)
+# 'foreign_keys': columna_supabase -> tabla padre; define qué tablas pueden cargarse en paralelo
 
 TABLES_CONFIG = [
     # ========== CATÁLOGOS (sin dependencias) ==========
@@ -171,6 +179,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_CAMPOBASE',
+        'foreign_keys': {
+            'salida_id': 'salida',
+        },
     },
     {
         'file': 'DiarioCampoBase.xlsx',
@@ -189,6 +200,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_DIARIOCAMPOBASE',
+        'foreign_keys': {
+            'campobase_id': 'campobase',
+        },
     },
     {
         'file': 'CuerpoAgua.xlsx',
@@ -221,6 +235,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_CUERPOAGUA',
+        'foreign_keys': {
+            'campobase_id': 'campobase',
+        },
     },
     {
         'file': 'CampoBasePersonal.xlsx',
@@ -239,6 +256,10 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_CAMPOBASEPERSONAL',
+        'foreign_keys': {
+            'campobase_id': 'campobase',
+            'personal_id': 'personal',
+        },
     },
     
     # ========== COLECCIÓN (TABLA CENTRAL) ==========
@@ -310,6 +331,12 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_COLECCION',
+        'foreign_keys': {
+            'campobase_id': 'campobase',
+            'personal_id': 'personal',
+            'infocuerpoagua_id': 'cuerpoagua',
+            'permisocontrato_id': 'permisocontrato',
+        },
     },
     
     # ========== DEPENDIENTES DE COLECCIÓN ==========
@@ -334,6 +361,10 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_TEJIDO',
+        'foreign_keys': {
+            'coleccion_id': 'coleccion',
+            'permisocontrato_id': 'permisocontrato',
+        },
     },
     {
         'file': 'Canto.xlsx',
@@ -355,6 +386,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_CANTO',
+        'foreign_keys': {
+            'coleccion_id': 'coleccion',
+        },
     },
     {
         'file': 'Identificacion.xlsx',
@@ -369,6 +403,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_IDENTIFICACION',
+        'foreign_keys': {
+            'coleccion_id': 'coleccion',
+        },
     },
     {
         'file': 'ColeccionPersonal.xlsx',
@@ -381,6 +418,10 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_COLECCIONPERSONAL',
+        'foreign_keys': {
+            'coleccion_id': 'coleccion',
+            'personal_id': 'personal',
+        },
     },
     
     # ========== PRÉSTAMOS ==========
@@ -405,6 +446,9 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_PRESTAMO',
+        'foreign_keys': {
+            'personal_id': 'personal',
+        },
     },
     {
         'file': 'PrestamoColeccion.xlsx',
@@ -419,6 +463,11 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_PRESTAMOCOLECCION',
+        'foreign_keys': {
+            'prestamo_id': 'prestamo',
+            'coleccion_id': 'coleccion',
+            'permisocontrato_id': 'permisocontrato',
+        },
     },
     {
         'file': 'PrestamoTejido.xlsx',
@@ -432,6 +481,11 @@ TABLES_CONFIG = [
         },
         'skip_id': False,
         'id_column': 'ID_PRESTAMOTEJIDO',
+        'foreign_keys': {
+            'prestamo_id': 'prestamo',
+            'tejido_id': 'tejido',
+            'permisocontrato_id': 'permisocontrato',
+        },
     },
 ]
 
@@ -481,47 +535,28 @@ def convert_value(value, column_name):
 
 def read_excel_data(filepath, config):
     """Lee datos de un archivo Excel y los prepara para inserción."""
-    wb = openpyxl.load_workbook(filepath, data_only=True)
-    sheet = wb.active
-    
-    # Obtener encabezados
-    headers = {}
-    for col in range(1, 200):
-        cell = sheet.cell(row=1, column=col)
-        if cell.value:
-            headers[str(cell.value).strip()] = col
-        elif col > len(headers) + 5:
-            break
-    
-    # Leer datos
     records = []
-    row = 2
     empty_rows = 0
-    
-    while empty_rows < 5:
+
+    for row in iter_excel_rows(filepath, config['columns']):
         row_data = {}
         has_data = False
-        
-        for excel_col, supabase_col in config['columns'].items():
-            if excel_col not in headers:
-                continue
-            
-            col_idx = headers[excel_col]
-            value = sheet.cell(row=row, column=col_idx).value
-            
+
+        for excel_col, value in row.items():
             if value is not None:
                 has_data = True
-            
+
             # Si es columna de ID y skip_id es True, saltar
             if config.get('skip_id') and excel_col == config.get('id_column', excel_col.upper()):
                 continue
-            
+
             # Determinar nombre de columna destino
+            supabase_col = config['columns'][excel_col]
             if supabase_col is None:
                 continue
-            
+
             row_data[supabase_col] = convert_value(value, supabase_col)
-        
+
         if has_data:
             # Filtrar valores None para columnas no requeridas
             row_data = {k: v for k, v in row_data.items() if v is not None}
@@ -530,14 +565,9 @@ def read_excel_data(filepath, config):
             empty_rows = 0
         else:
             empty_rows += 1
-        
-        row += 1
-        
-        # Límite de seguridad
-        if row > 50000:
-            break
-    
-    wb.close()
+            if empty_rows >= 5:
+                break
+
     return records
 
 
@@ -554,22 +584,22 @@ def truncate_table(supabase: Client, table_name: str):
             pass
 
 
-def load_table(supabase: Client, config: dict, batch_size: int = 500):
+def load_table(supabase: Client, config: dict, batch_size: int = 500, reject_log=None):
     """Carga datos de un archivo Excel a una tabla de Supabase."""
     filepath = DATOS_DIR / config['file']
     
     if not filepath.exists():
-        print(f"  ⚠️  Archivo no encontrado: {config['file']}")
+        print(f"  ⚠️  {config['table']}: archivo no encontrado: {config['file']}")
         return 0
     
-    print(f"  📖 Leyendo {config['file']}...")
+    print(f"  📖 {config['table']}: leyendo {config['file']}...")
     records = read_excel_data(filepath, config)
     
     if not records:
-        print(f"  ⚠️  No hay datos en {config['file']}")
+        print(f"  ⚠️  {config['table']}: no hay datos en {config['file']}")
         return 0
     
-    print(f"  📤 Insertando {len(records)} registros en {config['table']}...")
+    print(f"  📤 {config['table']}: insertando {len(records)} registros...")
     
     # Insertar en lotes
     inserted = 0
@@ -580,21 +610,19 @@ def load_table(supabase: Client, config: dict, batch_size: int = 500):
         try:
             result = supabase.table(config['table']).insert(batch).execute()
             inserted += len(batch)
-            print(f"      Lote {i//batch_size + 1}: {len(batch)} registros ✓")
+            print(f"      {config['table']} lote {i//batch_size + 1}: {len(batch)} registros ✓")
         except Exception as e:
             errors += len(batch)
             error_msg = str(e)[:100]
-            print(f"      Lote {i//batch_size + 1}: ❌ Error - {error_msg}")
+            print(f"      {config['table']} lote {i//batch_size + 1}: ❌ Error - {error_msg}")
             
-            # Intentar insertar uno por uno para identificar el problema
-            if len(batch) > 1:
-                for record in batch:
-                    try:
-                        supabase.table(config['table']).insert(record).execute()
-                        inserted += 1
-                        errors -= 1
-                    except Exception as e2:
-                        pass  # Mantener el error contado
+            # Bisecar el lote para aislar las filas que fallan (las rechazadas van a reject_log)
+            ok = retry_by_bisection(supabase, config['table'], batch, e, reject_log)
+            inserted += ok
+            errors -= ok
+    
+    if errors:
+        print(f"  ⚠️  {config['table']}: {errors} registros rechazados")
     
     return inserted
 
@@ -622,6 +650,11 @@ def reset_sequences(supabase: Client):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Carga los Excel de Banco de Vida a Supabase")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"tablas cargadas en paralelo (default: {DEFAULT_WORKERS}; 1 = secuencial)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🐸 CARGA DE DATOS - BANCO DE VIDA")
     print("=" * 60)
@@ -635,23 +668,35 @@ def main():
     print("   ✅ Conectado")
     print()
     
-    # Cargar cada tabla en orden
-    total_inserted = 0
-    
-    for config in TABLES_CONFIG:
-        print(f"\n📋 Tabla: {config['table']}")
-        print("-" * 40)
-        
-        inserted = load_table(supabase, config)
-        total_inserted += inserted
-        
-        print(f"   ✅ {inserted} registros insertados")
+    # Cargar las tablas según el DAG de Foreign Keys: las independientes en
+    # paralelo y cada dependiente en cuanto terminan sus tablas padre
+    configs = {config['table']: config for config in TABLES_CONFIG}
+    deps = build_dependencies({
+        table: set(config.get('foreign_keys', {}).values())
+        for table, config in configs.items()
+    })
+
+    def cargar(table):
+        print(f"\n📋 Tabla: {table}")
+        inserted = load_table(supabase, configs[table], reject_log=rejects)
+        print(f"   ✅ {table}: {inserted} registros insertados")
+        return inserted
+
+    print(f"⚙️  {args.workers} worker(s) en paralelo")
+    with RejectLog(REJECTS_PATH) as rejects:
+        results, errors = run_dag(list(configs), deps, cargar, max_workers=args.workers)
+    total_inserted = sum(results.values())
+
+    for table, error in errors.items():
+        print(f"   ❌ {table}: {error}")
     
     # Resumen final
     print("\n" + "=" * 60)
     print("📊 RESUMEN")
     print("=" * 60)
     print(f"   Total de registros insertados: {total_inserted}")
+    if rejects.count:
+        print(f"   Registros rechazados: {rejects.count} (ver {REJECTS_PATH.relative_to(ROOT_DIR)})")
     print()
     print("✅ Carga completada!")
     print()
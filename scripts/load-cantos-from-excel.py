@@ -2,7 +2,8 @@
 """
 Carga cantos desde '2_Catalogo Cantos-marzo2023 (1).xlsx' a la tabla `canto`.
 
-- Resuelve taxon_id por jerarquía (especie → género → familia).
+- Resuelve taxon_id por jerarquía (especie → género → familia); las combinaciones antiguas
+  y los géneros en otra familia se resuelven con el índice de sinónimos (synonym_index.py).
 - Resuelve coleccion_id (interna 'CJ ...') o coleccion_externa_id (e.g. QCAZ44870, BMNH 1987.1888).
 - Si no encuentra el número de museo, deja ambas FKs en NULL y registra el caso en observacion_carga.
 - Convierte "-" → NULL en todas las celdas.
@@ -21,10 +22,13 @@ from pathlib import Path
 from collections import defaultdict, Counter
 from datetime import date, time, datetime
 
-import openpyxl
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from excel_reader import iter_values
+from synonym_index import load_synonyms
+from taxonomy_cache import load_taxonomy
+
 ROOT_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(ROOT_DIR / ".env.local")
 
@@ -160,56 +164,14 @@ def to_num(v):
 
 def build_taxon_lookup(sb: Client):
     """
-    Devuelve:
+    Devuelve (desde el snapshot de taxonomy_cache):
       - by_family[familia_lower] = id_taxon
       - by_genus[(familia_lower, genero_lower)] = id_taxon
       - by_species[(familia_lower, genero_lower, especie_lower)] = id_taxon
+      - sinonimos: índice de combinaciones históricas (ver synonym_index.py)
     """
-    rows = []
-    page = 0
-    while True:
-        chunk = sb.table("taxon").select("id_taxon,taxon,taxon_id,rank_id").range(page * 1000, page * 1000 + 999).execute().data
-        rows.extend(chunk)
-        if len(chunk) < 1000:
-            break
-        page += 1
-
-    by_id = {r["id_taxon"]: r for r in rows}
-    by_family = {}
-    by_genus = {}
-    by_species = {}
-
-    def parent_chain(t):
-        """Sube de un taxon hasta encontrar su familia y genero (si aplica)."""
-        fam = gen = None
-        cur = t
-        for _ in range(10):
-            if cur is None:
-                break
-            if cur["rank_id"] == 5:
-                fam = cur["taxon"]
-            elif cur["rank_id"] == 6:
-                gen = cur["taxon"]
-            cur = by_id.get(cur.get("taxon_id"))
-        return fam, gen
-
-    for r in rows:
-        rank = r["rank_id"]
-        name = (r["taxon"] or "").strip()
-        if not name:
-            continue
-        if rank == 5:
-            by_family[name.lower()] = r["id_taxon"]
-        elif rank == 6:
-            fam, _ = parent_chain(by_id.get(r.get("taxon_id")))
-            if fam:
-                by_genus[(fam.lower(), name.lower())] = r["id_taxon"]
-        elif rank == 7:
-            fam, gen = parent_chain(by_id.get(r.get("taxon_id")))
-            if fam and gen:
-                by_species[(fam.lower(), gen.lower(), name.lower())] = r["id_taxon"]
-
-    return by_family, by_genus, by_species
+    tax = load_taxonomy(sb)
+    return tax.by_family, tax.by_genus, tax.by_species, load_synonyms(tax)
 
 
 def build_coleccion_lookup(sb: Client, numeros_cj):
@@ -271,12 +233,8 @@ def main():
     args = ap.parse_args()
 
     print(f"📂 Leyendo {EXCEL_PATH}")
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
-    ws = wb[SHEET_NAME]
-    rows_iter = ws.iter_rows(min_row=2, values_only=True)
-
     raw_rows = []
-    for r in rows_iter:
+    for r in iter_values(EXCEL_PATH, sheet_name=SHEET_NAME):
         if r is None or all(v is None for v in r):
             continue
         raw_rows.append(r)
@@ -305,8 +263,9 @@ def main():
             externa_pairs.add((acron, numero))
 
     print("\n🔍 Pre-fetch de lookups…")
-    by_family, by_genus, by_species = build_taxon_lookup(sb)
-    print(f"  taxon: {len(by_family)} familias / {len(by_genus)} géneros / {len(by_species)} especies")
+    by_family, by_genus, by_species, sinonimos = build_taxon_lookup(sb)
+    print(f"  taxon: {len(by_family)} familias / {len(by_genus)} géneros / {len(by_species)} especies"
+          f" / {len(sinonimos.aceptado_de)} sinónimos")
 
     cj_lookup = build_coleccion_lookup(sb, cj_numeros)
     print(f"  coleccion (CJ): {len(cj_lookup)}/{len(cj_numeros)} encontrados")
@@ -350,10 +309,20 @@ def main():
             taxon_id = by_species.get((familia.lower(), genero.lower(), especie.lower()))
             if taxon_id:
                 stats["taxon_especie"] += 1
+        if taxon_id is None and genero and especie:
+            taxon_id = sinonimos.species(familia, genero, especie)
+            if taxon_id:
+                stats["taxon_especie_sinonimo"] += 1
         if taxon_id is None and familia and genero:
             taxon_id = by_genus.get((familia.lower(), genero.lower()))
             if taxon_id:
                 stats["taxon_genero"] += 1
+        if taxon_id is None and genero:
+            taxon_id = sinonimos.genus(familia, genero)
+            if taxon_id:
+                stats["taxon_genero_sinonimo"] += 1
+        if taxon_id and sinonimos.familia_reasignada(familia, genero):
+            stats["taxon_familia_reasignada"] += 1
         if taxon_id is None and familia:
             taxon_id = by_family.get(familia.lower())
             if taxon_id:
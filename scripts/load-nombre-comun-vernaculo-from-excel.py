@@ -2,11 +2,21 @@
 """
 Carga la tabla nombre_comun_vernaculo desde el Excel 'vernaculos.xlsx' (o 'Nombres vernáculos.xlsx').
 - Lee Vernacular Name, Language, Taxon, Source.
-- Resuelve taxon en todos los niveles: especie, género, familia y orden.
+- Resuelve taxon en todos los niveles: especie, género, familia y orden (name_resolver.py, tolera errores de tipeo).
 - Si hay varios taxones en una celda (separados por coma), crea un registro por cada uno.
 - Incluye nombres sin taxón: si Taxon está vacío o no se resuelve, se inserta con taxon_id NULL.
 - Mapea Language al catálogo de idiomas (catalogo_awe).
+
+Por defecto la carga es incremental: cada fila (nombre, idioma, taxón) se
+compara por hash con las filas ya guardadas y solo se inserta, actualiza o
+borra la diferencia; la tabla nunca queda vacía para el sitio. La columna
+Source no se guarda en la tabla, así que no entra en el hash.
+
+Uso:
+    python scripts/load-nombre-comun-vernaculo-from-excel.py [--dry-run] [--modo completa]
 """
+import argparse
+import hashlib
 import os
 import re
 import sys
@@ -15,6 +25,10 @@ from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from supabase_fetch import fetch_all
+from name_resolver import NameResolver, print_matches
+from synonym_index import load_synonyms
+from taxonomy_cache import load_taxonomy
 
 # Cargar variables de entorno desde la raíz del proyecto
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -63,126 +77,148 @@ def obtener_idioma_id(language: str) -> int:
     return LANGUAGE_TO_IDIOMA_ID.get(key, 13)
 
 
-def cargar_mapa_taxon_completo(supabase: Client) -> dict[str, int]:
-    """
-    Carga un único mapa nombre_normalizado -> id_taxon para todos los niveles:
-    orden (rank_id=4), familia (5), género (6), especie (7).
-    Para especies se usa nombre completo desde vw_lista_especies; para el resto, el campo taxon.
-    """
-    mapa: dict[str, int] = {}
-
-    # Especies: nombre científico completo (género + especie)
-    r = supabase.table("vw_lista_especies").select("nombre_cientifico, id_taxon").execute()
-    for row in r.data or []:
-        nc = row.get("nombre_cientifico")
-        if nc:
-            key = normalizar_taxon(nc).lower()
-            if key:
-                mapa[key] = row["id_taxon"]
-
-    # Órdenes (rank_id = 4)
-    r = supabase.table("taxon").select("id_taxon, taxon").eq("rank_id", 4).execute()
-    for row in r.data or []:
-        t = normalizar_texto(row.get("taxon") or "").lower()
-        if t:
-            mapa[t] = row["id_taxon"]
-
-    # Familias (rank_id = 5)
-    r = supabase.table("taxon").select("id_taxon, taxon").eq("rank_id", 5).execute()
-    for row in r.data or []:
-        t = normalizar_texto(row.get("taxon") or "").lower()
-        if t:
-            mapa[t] = row["id_taxon"]
-
-    # Géneros (rank_id = 6)
-    r = supabase.table("taxon").select("id_taxon, taxon").eq("rank_id", 6).execute()
-    for row in r.data or []:
-        t = normalizar_texto(row.get("taxon") or "").lower()
-        if t:
-            mapa[t] = row["id_taxon"]
-
-    # Corrección typo común
-    if "pritimantis" not in mapa and "pristimantis" in mapa:
-        mapa["pritimantis"] = mapa["pristimantis"]
-
-    return mapa
-
-
-def resolver_taxon(taxon_str: str, mapa: dict[str, int]) -> int | None:
-    """
-    Resuelve un nombre de taxon a id_taxon (cualquier nivel: orden, familia, género, especie).
-    """
-    taxon_str = normalizar_taxon(taxon_str)
-    if not taxon_str or taxon_str in ("–", "—", "nan"):
-        return None
-    key = taxon_str.lower()
-    return mapa.get(key)
-
-
 # Nombres de órdenes que no son taxones útiles (evitar duplicados con nombres comunes)
 TAXONES_IGNORAR = {"anura", "gymnophiona", "caudata"}
 
 
-def procesar_fila(
-    row: pd.Series,
+COLUMNAS_VERNACULO = ["id", "nombre", "catalogo_awe_idioma_id", "taxon_id"]
+MODOS = ("incremental", "completa")
+
+
+def registros_desde_excel(
+    df: pd.DataFrame,
     name_col: str,
     lang_col: str,
     taxon_col: str,
-    mapa_taxon: dict[str, int],
-) -> list[dict]:
+    resolver: NameResolver,
+) -> pd.DataFrame:
     """
-    Procesa una fila del Excel. Devuelve lista de registros a insertar.
-    - Si no hay taxón o no se resuelve: se incluye un registro con taxon_id None.
-    - Si hay varios taxones (separados por coma): un registro por cada uno resuelto y uno con null si alguno no resuelve.
+    Estado deseado: DataFrame nombre, catalogo_awe_idioma_id, taxon_id.
+    - Si hay varios taxones (separados por coma): un registro por cada uno resuelto.
+    - Si la celda está vacía, algún taxón no se resuelve o solo había ignorados:
+      además un registro con taxon_id None.
+    Las celdas se parten en una pasada y cada nombre distinto se resuelve una sola vez
+    con el NameResolver (orden, familia, género o especie; tolera errores de tipeo).
     """
-    registros: list[dict] = []
+    base = pd.DataFrame({
+        "nombre": df[name_col].map(normalizar_texto),
+        "catalogo_awe_idioma_id": df[lang_col].map(obtener_idioma_id),
+        "celda": df[taxon_col].map(normalizar_texto),
+    })
+    base = base[base["nombre"] != ""]
+
+    partes = base.assign(parte=base["celda"].str.split(",")).explode("parte")
+    partes["parte"] = partes["parte"].map(normalizar_taxon)
+    matches = resolver.resolve_series(partes["parte"])
+    print_matches(matches, partes["parte"])
+    partes["parte"] = partes["parte"].str.lower()
+    partes["taxon_id"] = matches["id_taxon"].to_numpy()
+    ignorada = (partes["parte"] == "") | partes["parte"].isin(TAXONES_IGNORAR)
+
+    resueltas = partes[~ignorada & partes["taxon_id"].notna()]
+    # Una sola fila NULL por celda aunque varios taxones no se resuelvan (explode repite el índice)
+    sin_resolver = partes.index[~ignorada & partes["taxon_id"].isna()].unique()
+    con_null = base.index.difference(resueltas.index).union(sin_resolver)
+
+    registros = pd.concat([
+        resueltas[["nombre", "catalogo_awe_idioma_id", "taxon_id"]],
+        base.loc[con_null, ["nombre", "catalogo_awe_idioma_id"]].assign(taxon_id=None),
+    ])
+    return registros.astype({"taxon_id": "Int64"}).reset_index(drop=True)
+
+
+def hash_fila(df: pd.DataFrame) -> pd.Series:
+    """Hash de (nombre, idioma, taxon) por fila; taxon_id nulo cuenta como vacío."""
+    def entero(valor) -> str:
+        return "" if pd.isna(valor) else str(int(valor))
+
+    clave = pd.Series([
+        f"{nombre}|{entero(idioma)}|{entero(taxon_id)}"
+        for nombre, idioma, taxon_id in zip(df["nombre"], df["catalogo_awe_idioma_id"], df["taxon_id"])
+    ], index=df.index, dtype=object)
+    return clave.map(lambda c: hashlib.sha1(c.encode("utf-8")).hexdigest())
+
+
+def plan_incremental(actual: pd.DataFrame, deseado: pd.DataFrame):
+    """
+    Diff por hash, contando repeticiones (un hash que está 2 veces en el Excel
+    y 3 en la BD deja una fila para borrar).
 
-    nombre = normalizar_texto(row.get(name_col))
-    if not nombre:
-        return []
+    Las filas sobrantes y faltantes con el mismo (nombre, idioma) se emparejan
+    y pasan a ser actualizaciones (cambia el taxón) para conservar su id.
+    Devuelve (inserciones, actualizaciones, eliminaciones, sin_cambios).
+    """
+    actual = actual.assign(_hash=hash_fila(actual)).sort_values("id", kind="stable")
+    deseado = deseado.assign(_hash=hash_fila(deseado))
+    actual["_n"] = actual.groupby("_hash").cumcount()
+    deseado["_n"] = deseado.groupby("_hash").cumcount()
+
+    cruce = actual.merge(deseado[["_hash", "_n"]], on=["_hash", "_n"], how="outer", indicator=True)
+    sin_cambios = int((cruce["_merge"] == "both").sum())
+    sobrantes = actual.merge(cruce.loc[cruce["_merge"] == "left_only", ["_hash", "_n"]], on=["_hash", "_n"])
+    faltantes = deseado.merge(cruce.loc[cruce["_merge"] == "right_only", ["_hash", "_n"]], on=["_hash", "_n"])
+
+    par = ["nombre", "catalogo_awe_idioma_id"]
+    sobrantes["_k"] = sobrantes.groupby(par).cumcount()
+    faltantes["_k"] = faltantes.groupby(par).cumcount()
+    emparejadas = sobrantes[["id"] + par + ["_k"]].merge(faltantes[par + ["taxon_id", "_k"]], on=par + ["_k"])
+
+    eliminaciones = sorted(set(sobrantes["id"].astype(int)) - set(emparejadas["id"].astype(int)))
+    inserciones = faltantes.merge(emparejadas[par + ["_k"]], on=par + ["_k"], how="left", indicator=True)
+    inserciones = inserciones[inserciones["_merge"] == "left_only"]
+    return _records(inserciones), _records(emparejadas, con_id=True), eliminaciones, sin_cambios
+
+
+def _records(df: pd.DataFrame, con_id: bool = False) -> list[dict]:
+    """Filas para PostgREST: enteros de Python y None en lugar de NA."""
+    registros = []
+    for fila in df.itertuples(index=False):
+        registro = {"id": int(fila.id)} if con_id else {}
+        registro.update({
+            "nombre": fila.nombre,
+            "catalogo_awe_idioma_id": int(fila.catalogo_awe_idioma_id),
+            "taxon_id": None if pd.isna(fila.taxon_id) else int(fila.taxon_id),
+        })
+        registros.append(registro)
+    return registros
 
-    language = normalizar_texto(row.get(lang_col))
-    idioma_id = obtener_idioma_id(language)
 
-    taxon_celda = normalizar_texto(row.get(taxon_col))
+def _chunks(filas: list, chunk_size: int) -> list[list]:
+    return [filas[i : i + chunk_size] for i in range(0, len(filas), chunk_size)]
 
-    # Sin taxón en la celda: un registro con taxon_id NULL
-    if not taxon_celda or taxon_celda in ("–", "—", "nan"):
-        registros.append({
-            "nombre": nombre,
-            "catalogo_awe_idioma_id": idioma_id,
-            "taxon_id": None,
-        })
-        return registros
-
-    partes = [normalizar_taxon(p) for p in taxon_celda.split(",")]
-    alguno_sin_resolver = False
-
-    for parte in partes:
-        if not parte or parte.lower() in TAXONES_IGNORAR:
-            continue
-        taxon_id = resolver_taxon(parte, mapa_taxon)
-        if taxon_id is not None:
-            registros.append({
-                "nombre": nombre,
-                "catalogo_awe_idioma_id": idioma_id,
-                "taxon_id": taxon_id,
-            })
-        else:
-            alguno_sin_resolver = True
-
-    # Si hubo algún taxón no resuelto (o solo había ignorados), subir igual el nombre con taxon_id NULL
-    if alguno_sin_resolver or not registros:
-        registros.append({
-            "nombre": nombre,
-            "catalogo_awe_idioma_id": idioma_id,
-            "taxon_id": None,
-        })
 
-    return registros
+def recarga_completa(supabase: Client, registros: list[dict], batch: int) -> None:
+    """Modo anterior: vacía la tabla y vuelve a insertar todo."""
+    print("🗑️ Vaciando tabla nombre_comun_vernaculo...")
+    try:
+        # Supabase/PostgREST: eliminar en lotes o todo (según políticas RLS)
+        supabase.table("nombre_comun_vernaculo").delete().neq("id", 0).execute()
+        print("   Tabla vaciada.")
+    except Exception as e:
+        print(f"⚠️ No se pudo vaciar la tabla (¿RLS?): {e}")
+        print("   Continuando con la inserción (pueden quedar duplicados si ya había datos).")
+
+    insertados = 0
+    for i, lote in enumerate(_chunks(registros, batch)):
+        try:
+            supabase.table("nombre_comun_vernaculo").insert(lote, returning="minimal").execute()
+            insertados += len(lote)
+            print(f"   Insertados {insertados}/{len(registros)}")
+        except Exception as e:
+            print(f"❌ Error insertando lote {i + 1}: {e}")
+            raise
+
+    print(f"✅ Listo. Insertados {insertados} registros en nombre_comun_vernaculo.")
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Carga nombre_comun_vernaculo desde el Excel de vernáculos")
+    parser.add_argument("--modo", choices=MODOS, default="incremental",
+                        help="incremental: solo el diff (default); completa: vaciar y reinsertar")
+    parser.add_argument("--dry-run", action="store_true", help="Calcula el diff sin escribir en la BD")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Filas por petición (default: 500)")
+    args = parser.parse_args()
+
     # Probar primero vernaculos.xlsx, luego Nombres vernáculos.xlsx
     for nombre_archivo in ("vernaculos.xlsx", "Nombres vernáculos.xlsx"):
         excel_path = ROOT_DIR / nombre_archivo
@@ -208,47 +244,51 @@ def main() -> None:
     taxon_col = cols.get("Taxon") or "Taxon"
 
     print("🔍 Cargando mapa de taxones (orden, familia, género, especie)...")
-    mapa_taxon = cargar_mapa_taxon_completo(supabase)
-    print(f"   Total de taxones cargados: {len(mapa_taxon)}")
-
-    registros: list[dict] = []
-    for idx, row in df.iterrows():
-        registros.extend(
-            procesar_fila(row, name_col, lang_col, taxon_col, mapa_taxon)
-        )
+    tax = load_taxonomy(supabase)
+    resolver = NameResolver(tax, sinonimos=load_synonyms(tax))
+    print(f"   Total de taxones cargados: {len(resolver.exactos)}")
 
-    con_taxon = sum(1 for r in registros if r.get("taxon_id") is not None)
-    sin_taxon = len(registros) - con_taxon
-    print(f"📋 Registros a insertar: {len(registros)} (con taxón: {con_taxon}, sin taxón: {sin_taxon})")
+    deseado = registros_desde_excel(df, name_col, lang_col, taxon_col, resolver)
+    con_taxon = int(deseado["taxon_id"].notna().sum())
+    sin_taxon = len(deseado) - con_taxon
+    print(f"📋 Registros en el Excel: {len(deseado)} (con taxón: {con_taxon}, sin taxón: {sin_taxon})")
 
-    if not registros:
-        print("⚠️ No hay registros para insertar.")
+    if deseado.empty:
+        print("⚠️ No hay registros para cargar.")
         return
 
-    # Vaciar tabla antes de volver a cargar (recarga completa)
-    print("🗑️ Vaciendo tabla nombre_comun_vernaculo...")
-    try:
-        # Supabase/PostgREST: eliminar en lotes o todo (según políticas RLS)
-        del_res = supabase.table("nombre_comun_vernaculo").delete().neq("id", 0).execute()
-        print("   Tabla vaciada.")
-    except Exception as e:
-        print(f"⚠️ No se pudo vaciar la tabla (¿RLS?): {e}")
-        print("   Continuando con la inserción (pueden quedar duplicados si ya había datos).")
+    if args.modo == "completa":
+        if args.dry_run:
+            print(f"🧪 Dry-run: se vaciaría la tabla y se insertarían {len(deseado)} registros.")
+            return
+        recarga_completa(supabase, _records(deseado), args.chunk_size)
+        return
 
-    BATCH = 100
-    insertados = 0
-    for i in range(0, len(registros), BATCH):
-        lote = registros[i : i + BATCH]
-        try:
-            supabase.table("nombre_comun_vernaculo").insert(lote).execute()
-            insertados += len(lote)
-            print(f"   Insertados {insertados}/{len(registros)}")
-        except Exception as e:
-            print(f"❌ Error insertando lote {i // BATCH + 1}: {e}")
-            raise
+    print("🔍 Leyendo nombre_comun_vernaculo actual...")
+    actual = pd.DataFrame(
+        fetch_all(supabase, "nombre_comun_vernaculo", ", ".join(COLUMNAS_VERNACULO), key="id"),
+        columns=COLUMNAS_VERNACULO,
+    )
+    inserciones, actualizaciones, eliminaciones, sin_cambios = plan_incremental(actual, deseado)
+    print(f"🔎 {len(inserciones)} por insertar, {len(actualizaciones)} por actualizar, "
+          f"{len(eliminaciones)} por eliminar, {sin_cambios} sin cambios")
+
+    if args.dry_run:
+        for registro in (inserciones + actualizaciones)[:20]:
+            print(f"   {registro}")
+        print("🧪 Dry-run: no se escribió nada.")
+        return
 
-    print(f"✅ Listo. Insertados {insertados} registros en nombre_comun_vernaculo.")
+    tabla = "nombre_comun_vernaculo"
+    for lote in _chunks(actualizaciones, args.chunk_size):
+        supabase.table(tabla).upsert(lote, on_conflict="id", returning="minimal").execute()
+    for lote in _chunks(inserciones, args.chunk_size):
+        supabase.table(tabla).insert(lote, returning="minimal").execute()
+    for lote in _chunks(eliminaciones, args.chunk_size):
+        supabase.table(tabla).delete().in_("id", lote).execute()
 
+    print(f"✅ Listo. Insertados {len(inserciones)}, actualizados {len(actualizaciones)}, "
+          f"eliminados {len(eliminaciones)}, sin cambios {sin_cambios}.")
 
 if __name__ == "__main__":
     main()
@@ -9,6 +9,7 @@ import sys
 import traceback
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
@@ -77,11 +78,11 @@ def main():
         
         # Obtener todas las especies de la vista vw_lista_especies
         print("\n🔍 Obteniendo especies de la vista vw_lista_especies...")
-        vista_response = supabase.table('vw_lista_especies').select('nombre_cientifico, id_taxon').execute()
+        vista = fetch_all(supabase, 'vw_lista_especies', 'nombre_cientifico, id_taxon', key='id_taxon')
         
         # Crear mapa: nombre_cientifico (lowercase) -> id_taxon
         especies_vista = {}
-        for especie in vista_response.data:
+        for especie in vista:
             nombre_cientifico = especie['nombre_cientifico']
             if nombre_cientifico:
                 nombre_cientifico_lower = str(nombre_cientifico).strip().lower()
@@ -175,13 +176,15 @@ def main():
         
         # Verificación final
         print("\n🔍 Verificando resultado final...")
-        nombres_finales = supabase.table('nombre_comun').select(
-            'taxon_id, catalogo_awe_idioma_id'
-        ).in_('taxon_id', list(especies_vista.values())).in_('catalogo_awe_idioma_id', [1, 8]).execute()
+        nombres_finales = fetch_all(
+            supabase, 'nombre_comun', 'taxon_id, catalogo_awe_idioma_id',
+            key='id_nombre_comun',
+            where=lambda q: q.in_('taxon_id', list(especies_vista.values())).in_('catalogo_awe_idioma_id', [1, 8]),
+        )
         
         especies_final_es = set()
         especies_final_en = set()
-        for nc in nombres_finales.data:
+        for nc in nombres_finales:
             if nc['catalogo_awe_idioma_id'] == 1:
                 especies_final_es.add(nc['taxon_id'])
             elif nc['catalogo_awe_idioma_id'] == 8:
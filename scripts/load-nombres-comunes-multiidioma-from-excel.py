@@ -2,9 +2,18 @@
 """
 Carga nombres comunes en múltiples idiomas desde 'nombres_anfibios_idiomas.xlsx' a la tabla nombre_comun.
 - El ID del Excel corresponde a id_nombre_comun del nombre en inglés (ya existente).
-- Para cada idioma, crea un nuevo registro en nombre_comun con el mismo taxon_id.
+- Para cada idioma, crea el registro en nombre_comun con el mismo taxon_id si
+  no existe ya (clave natural taxon_id, idioma, nombre), así que se puede
+  volver a correr sin duplicar. Ver common_names_sync.plan_natural_key.
 - Idiomas: Alemán, Francés, Portugués, Chino Mandarín, Italiano, Hindú, Árabe, Ruso, Japonés, Holandés.
+
+Uso:
+    python scripts/load-nombres-comunes-multiidioma-from-excel.py [--dry-run] [--podar]
+
+--podar elimina los nombres de esos idiomas que ya no están en el Excel para
+las especies del Excel (corrige un nombre sin borrar y recargar todo).
 """
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -12,6 +21,8 @@ from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from common_names_sync import CLAVE_NATURAL, sync_natural_key
+from supabase_fetch import fetch_all
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(ROOT_DIR / ".env.local")
@@ -42,6 +53,13 @@ def normalizar_texto(valor) -> str | None:
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Carga nombres comunes multiidioma sin duplicar")
+    parser.add_argument("--dry-run", action="store_true", help="Calcula el diff sin escribir en la BD")
+    parser.add_argument("--podar", action="store_true",
+                        help="Elimina nombres de estos idiomas que ya no están en el Excel")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Filas por petición (default: 1000)")
+    args = parser.parse_args()
+
     excel_path = ROOT_DIR / "nombres_anfibios_idiomas.xlsx"
     if not excel_path.exists():
         print(f"❌ No se encontró el archivo: {excel_path}")
@@ -69,80 +87,55 @@ def main() -> None:
     print(f"🔍 Obteniendo taxon_id para {len(ids_excel)} nombres en inglés...")
 
     # Obtener taxon_id desde nombre_comun (inglés, idioma_id=8)
-    response = (
-        supabase.table("nombre_comun")
-        .select("id_nombre_comun, taxon_id")
-        .eq("catalogo_awe_idioma_id", 8)
-        .in_("id_nombre_comun", ids_excel)
-        .execute()
+    nombres_en = fetch_all(
+        supabase, "nombre_comun", "id_nombre_comun, taxon_id", key="id_nombre_comun",
+        where=lambda q: q.eq("catalogo_awe_idioma_id", 8).in_("id_nombre_comun", ids_excel),
     )
 
     # Mapa: id_nombre_comun -> taxon_id
     id_to_taxon: dict[int, int] = {}
-    for row in response.data:
+    for row in nombres_en:
         taxon_id = row.get("taxon_id")
         if taxon_id:
             id_to_taxon[row["id_nombre_comun"]] = taxon_id
 
     print(f"✅ Encontrados {len(id_to_taxon)} taxon_id válidos")
 
-    # Preparar registros a insertar
-    registros: list[dict] = []
-    omitidos_sin_taxon = 0
-    omitidos_sin_nombre = 0
-
-    for idx, row in df.iterrows():
-        id_nombre_comun = row.get(id_col)
-        if pd.isna(id_nombre_comun):
-            continue
-
-        id_nombre_comun = int(id_nombre_comun)
-        taxon_id = id_to_taxon.get(id_nombre_comun)
-
-        if not taxon_id:
-            omitidos_sin_taxon += 1
-            continue
-
-        # Procesar cada idioma
-        for col_excel, idioma_id in COLUMNA_TO_IDIOMA_ID.items():
-            if col_excel not in df.columns:
-                continue
-
-            nombre = normalizar_texto(row.get(col_excel))
-            if not nombre:
-                omitidos_sin_nombre += 1
-                continue
-
-            registros.append({
-                "nombre": nombre,
-                "catalogo_awe_idioma_id": idioma_id,
-                "taxon_id": taxon_id,
-                "principal": True,  # Los nombres en cada idioma son principales
-            })
-
-    print(f"📋 Registros a insertar: {len(registros)}")
+    # Estado deseado: una fila por (ID, idioma) con nombre
+    columnas = [c for c in COLUMNA_TO_IDIOMA_ID if c in df.columns]
+    base = df[df[id_col].notna()]
+    taxon_ids = base[id_col].astype(int).map(id_to_taxon)
+    omitidos_sin_taxon = int(taxon_ids.isna().sum())
+
+    largo = base[columnas].assign(taxon_id=taxon_ids)[taxon_ids.notna()] \
+        .melt(id_vars="taxon_id", var_name="columna", value_name="nombre")
+    largo["nombre"] = largo["nombre"].map(normalizar_texto)
+    omitidos_sin_nombre = int(largo["nombre"].isna().sum())
+
+    deseado = largo.dropna(subset=["nombre"]).assign(
+        taxon_id=lambda d: d["taxon_id"].astype(int),
+        catalogo_awe_idioma_id=lambda d: d["columna"].map(COLUMNA_TO_IDIOMA_ID),
+    )[CLAVE_NATURAL].drop_duplicates()
+
+    print(f"📋 Nombres en el Excel: {len(deseado)}")
     print(f"   Omitidos (sin taxon_id): {omitidos_sin_taxon}")
     print(f"   Omitidos (sin nombre): {omitidos_sin_nombre}")
 
-    if not registros:
-        print("⚠️ No hay registros para insertar.")
+    if deseado.empty:
+        print("⚠️ No hay registros para cargar.")
         return
 
-    # Insertar en lotes
-    BATCH = 100
-    insertados = 0
-    for i in range(0, len(registros), BATCH):
-        lote = registros[i : i + BATCH]
-        try:
-            supabase.table("nombre_comun").insert(lote).execute()
-            insertados += len(lote)
-            print(f"   Insertados {insertados}/{len(registros)}")
-        except Exception as e:
-            print(f"❌ Error insertando lote {i // BATCH + 1}: {e}")
-            raise
-
-    print(f"✅ Listo. Insertados {insertados} registros en nombre_comun.")
+    # Los nombres en cada idioma son principales
+    plan, resultado = sync_natural_key(supabase, deseado, principal=True, podar=args.podar,
+                                       dry_run=args.dry_run, chunk_size=args.chunk_size)
+
+    if args.dry_run:
+        print(f"🧪 Dry-run: {len(plan.inserciones)} por crear, {len(plan.actualizaciones)} por actualizar, "
+              f"{len(plan.eliminaciones)} por eliminar. No se escribió nada.")
+        return
 
+    print(f"✅ Listo. Creados {resultado['creados']}, actualizados {resultado['actualizados']}, "
+          f"eliminados {resultado['eliminados']}, sin cambios {plan.sin_cambios}.")
 
 if __name__ == "__main__":
     main()
@@ -5,8 +5,27 @@ Carga publicaciones desde 'Publicaciones_Combinadas_Final.xlsx'.
 - Llena tabla: publicacion_autor  (crea/actualiza autores en tabla autor si no existen)
 - Llena tabla: publicacion_ano
 - Llena tabla: publicacion_catalogo_awe  (tipo de publicación)
+
+La carga va en dos fases:
+1. Plan en memoria: se deduplica contra la BD (IdPublicacion forzado o título)
+   y se arman todas las filas de cada tabla. Las publicaciones sin
+   IdPublicacion reciben ids de un bloque reservado con
+   public.reservar_ids_publicacion, así las filas hijas ya saben a qué
+   publicación apuntan y la secuencia queda por encima de los ids forzados.
+2. Inserción por lotes (--chunk-size) en orden de FK: autor, publicacion,
+   publicacion_ano, publicacion_catalogo_awe, publicacion_autor.
+
+El plan y el avance se guardan en .cache/carga-publicaciones.json después de
+cada lote. Si la conexión se cae, la siguiente corrida retoma desde ese punto
+sin volver a leer la BD; --reiniciar lo descarta.
+
+Uso:
+    python scripts/load-publicaciones-from-excel.py --dry-run
+    python scripts/load-publicaciones-from-excel.py [--chunk-size 500] [--reiniciar]
 """
 
+import argparse
+import json
 import os
 import re
 import sys
@@ -15,10 +34,25 @@ from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from author_index import claves_de, clave_autor, insertar_autores, load_autores
+from batch_insert import RejectLog, retry_by_bisection
+from publication_dedup import load_index
+from supabase_fetch import fetch_all, iter_rows
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(ROOT_DIR / ".env.local")
 
+CHECKPOINT_PATH = ROOT_DIR / ".cache" / "carga-publicaciones.json"
+# Cambia si cambia el formato del plan (avance por filas, claves de autor_index)
+CHECKPOINT_VERSION = 2
+REJECTS_PATH = ROOT_DIR / "reports" / "rechazos-publicaciones.jsonl"
+SIMILARES_PATH = ROOT_DIR / "reports" / "publicaciones-similares-excel.csv"
+CHUNK_SIZE = 500
+UMBRAL_SIMILAR = 0.8
+
+# Orden de inserción: las tablas referenciadas antes que las que las referencian
+ORDEN_TABLAS = ("autor", "publicacion", "publicacion_ano", "publicacion_catalogo_awe", "publicacion_autor")
+
 # Mapeo "Tipo Publicación Catálogo" (Excel) -> id_catalogo_awe (tipo 9)
 TIPO_CATALOGO_MAP = {
     "anals": 141,
@@ -132,134 +166,104 @@ def con_reintento(fn, supabase_url: str, supabase_key: str, supabase_ref: list,
     raise RuntimeError("No se pudo reconectar a Supabase después de varios intentos")
 
 
-def get_or_create_autor(supabase: Client, apellidos: str, nombres: str | None, autor_cache: dict) -> int | None:
+def fila_a_publicacion(row: pd.Series, titulo: str) -> dict:
+    """Columnas de publicacion para una fila del Excel (sin id_publicacion)."""
+    año_val = row.get("Año")
+    tiene_año = bool(año_val) and not pd.isna(año_val)
+    fecha = f"{int(año_val)}-01-01" if tiene_año else "1900-01-01"
+    fecha_raw = row.get("Fecha")
+    if fecha_raw and not (isinstance(fecha_raw, float) and pd.isna(fecha_raw)):
+        try:
+            fecha = pd.to_datetime(fecha_raw).strftime("%Y-%m-%d")
+        except Exception:
+            pass
+
+    cientifica_div = limpiar_str(row.get("Científica / Divulgación"))
+    es_cientifica = None
+    if cientifica_div:
+        es_cientifica = cientifica_div.lower() in ("científica", "cientifica", "sí", "si", "yes")
+
+    return {
+        "titulo": titulo,
+        "titulo_secundario": limpiar_str(row.get("Título Secundario")),
+        "editor": False,
+        "numero_publicacion_ano": int(año_val) if tiene_año else None,
+        "editorial": limpiar_str(row.get("Editorial / Revista")),
+        "volumen": limpiar_str(row.get("Volumen")),
+        "numero": limpiar_str(row.get("Número")),
+        "pagina": limpiar_str(row.get("Páginas")),
+        "palabras_clave": limpiar_str(row.get("Palabras Clave")),
+        "resumen": limpiar_str(row.get("Resumen")),
+        "fecha": fecha,
+        "publicacion_cj": True,
+        "publica_en_web": True,
+        "cita": limpiar_str(row.get("Cita")),
+        "cita_corta": limpiar_str(row.get("Cita Corta")),
+        "cita_larga": limpiar_str(row.get("Cita Larga")),
+        "categoria": False,
+        "noticia": False,
+        "cientifica": es_cientifica,
+        "indexada": normalizar_bool(row.get("Indexada")),
+        "anfibios_ecuador": normalizar_bool(row.get("Anfibios Ecuador")),
+        "justificacion": limpiar_str(row.get("Justificación")),
+        "observaciones": limpiar_str(row.get("Fuente")),
+    }
+
+
+# ─── Fase 1: plan en memoria ──────────────────────────────────────────────────
+
+def armar_plan(df: pd.DataFrame, supabase_url: str, supabase_key: str, sb: list, reservar: bool = True,
+               umbral_similar: float | None = UMBRAL_SIMILAR) -> dict:
     """
-    Busca el autor por apellidos (case-insensitive). Si no existe lo crea.
-    Usa caché para evitar consultas repetidas.
+    Lee lo que ya existe en la BD y arma todas las filas a insertar, con los
+    id_publicacion nuevos tomados de un bloque reservado de la secuencia.
+    Las filas de publicacion_autor llevan la clave del autor (author_index);
+    el id se completa en la fase 2, cuando ya existen los autores nuevos.
+    Con umbral_similar, las filas sin IdPublicacion casi iguales a una
+    publicación existente (publication_dedup) se dejan fuera y se reportan.
     """
-    apellidos = apellidos[:100]
-    key = apellidos.lower().strip()
-    if key in autor_cache:
-        return autor_cache[key]
-
-    # Buscar en BD
-    resp = supabase.table("autor").select("id_autor").ilike("apellidos", apellidos).execute()
-    if resp.data:
-        id_autor = resp.data[0]["id_autor"]
-        autor_cache[key] = id_autor
-        return id_autor
-
-    # Crear (truncar a 100 chars por límite de la columna)
-    insert_data = {"apellidos": apellidos[:100]}
-    if nombres:
-        insert_data["nombres"] = nombres[:100]
-    resp = supabase.table("autor").insert(insert_data).execute()
-    if resp.data:
-        id_autor = resp.data[0]["id_autor"]
-        autor_cache[key] = id_autor
-        return id_autor
-
-    print(f"  ⚠️  No se pudo crear autor: {apellidos}, {nombres}")
-    return None
-
-
-def main():
-    excel_path = Path("/Users/xavieraguas/Downloads/Publicaciones_Combinadas_Final.xlsx")
-    if not excel_path.exists():
-        print(f"❌ No se encontró: {excel_path}")
-        sys.exit(1)
-
-    supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not supabase_url or not supabase_key:
-        print("❌ Faltan variables de entorno NEXT_PUBLIC_SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY")
-        sys.exit(1)
-
-    supabase: Client = create_client(supabase_url, supabase_key)
-    # Referencia mutable para permitir reconexión
-    sb = [supabase]
-
-    print(f"📖 Leyendo Excel: {excel_path.name}...")
-    df = pd.read_excel(excel_path, sheet_name=0, engine="openpyxl")
-    print(f"   Filas: {len(df)}")
-
     # Cargar autores existentes en caché
     print("🔍 Cargando caché de autores existentes...")
-    resp_autores = sb[0].table("autor").select("id_autor, apellidos").execute()
-    autor_cache: dict[str, int] = {}
-    for row in resp_autores.data or []:
-        k = (row.get("apellidos") or "").lower().strip()
-        if k:
-            autor_cache[k] = row["id_autor"]
-    print(f"   Autores en BD: {len(autor_cache)}")
+    autores = load_autores(sb[0])
+    print(f"   Autores en BD: {len(autores)}")
 
     # Cargar IDs de publicaciones ya existentes para saltar duplicados
     print("🔍 Cargando IDs de publicaciones existentes...")
-    existing_ids: set[int] = set()
-    page = 0
-    page_size = 1000
-    while True:
-        resp_ids = (
-            sb[0].table("publicacion")
-            .select("id_publicacion")
-            .range(page * page_size, (page + 1) * page_size - 1)
-            .execute()
-        )
-        batch = resp_ids.data or []
-        for r in batch:
-            existing_ids.add(r["id_publicacion"])
-        if len(batch) < page_size:
-            break
-        page += 1
+    existing_ids: set[int] = {
+        r["id_publicacion"] for r in fetch_all(sb[0], "publicacion", "id_publicacion", key="id_publicacion")
+    }
     print(f"   Publicaciones ya en BD: {len(existing_ids)}")
 
-    # Cargar IDs de publicacion_ano ya existentes para no duplicar
-    existing_anos: set[int] = set()
-    resp_anos = sb[0].table("publicacion_ano").select("publicacion_id").execute()
-    for r in resp_anos.data or []:
-        existing_anos.add(r["publicacion_id"])
-
-    # Cargar IDs de publicacion_catalogo_awe ya existentes
-    existing_cat: set[int] = set()
-    resp_cat = sb[0].table("publicacion_catalogo_awe").select("publicacion_id").execute()
-    for r in resp_cat.data or []:
-        existing_cat.add(r["publicacion_id"])
-
-    # Cargar IDs de publicacion_autor ya existentes
-    existing_aut: set[int] = set()
-    resp_aut = sb[0].table("publicacion_autor").select("publicacion_id").execute()
-    for r in resp_aut.data or []:
-        existing_aut.add(r["publicacion_id"])
+    # Publicaciones que ya tienen año, catálogo o autores
+    existing_anos: set[int] = {
+        r["publicacion_id"] for r in fetch_all(sb[0], "publicacion_ano", "publicacion_id", key="id_publicacion_ano")
+    }
+    existing_cat: set[int] = {
+        r["publicacion_id"] for r in fetch_all(sb[0], "publicacion_catalogo_awe", "publicacion_id", key="id_publicacion_catalogo_awe")
+    }
+    existing_aut: set[int] = {
+        r["publicacion_id"] for r in fetch_all(sb[0], "publicacion_autor", "publicacion_id", key="id_publicacion_autor")
+    }
 
     # Cargar títulos existentes para deduplicar filas sin IdPublicacion
     print("🔍 Cargando títulos existentes para deduplicación...")
+    publicaciones = list(iter_rows(sb[0], "publicacion", "id_publicacion, titulo, cita_corta",
+                                   key="id_publicacion", prefetch=True))
     existing_titulos: set[str] = set()
-    page = 0
-    while True:
-        resp_tit = (
-            sb[0].table("publicacion")
-            .select("titulo")
-            .range(page * page_size, (page + 1) * page_size - 1)
-            .execute()
-        )
-        batch = resp_tit.data or []
-        for r in batch:
-            t = (r.get("titulo") or "").strip().lower()
-            if t:
-                existing_titulos.add(t)
-        if len(batch) < page_size:
-            break
-        page += 1
+    for r in publicaciones:
+        t = (r.get("titulo") or "").strip().lower()
+        if t:
+            existing_titulos.add(t)
     print(f"   Títulos en BD: {len(existing_titulos)}")
 
-    insertadas_pub = 0
-    omitidas_pub = 0
-    errores_pub = 0
-    autores_creados = 0
-    autores_autores_rel = 0
-    anos_insertados = 0
-    catalogo_insertados = 0
+    # Índice de casi duplicados (se sincroniza y guarda en .cache con la misma lectura)
+    indice = load_index(sb[0], filas=publicaciones) if umbral_similar is not None else None
+    titulo_de = {r["id_publicacion"]: r.get("titulo") for r in publicaciones}
 
+    # Filas nuevas: (fila del Excel, datos de publicacion, id forzado o None)
+    nuevas = []
+    similares = []
+    omitidas_pub = 0
     for idx, row in df.iterrows():
         id_pub_excel_raw = row.get("IdPublicacion")
         tiene_id = not (id_pub_excel_raw is None or (isinstance(id_pub_excel_raw, float) and pd.isna(id_pub_excel_raw)))
@@ -269,7 +273,7 @@ def main():
         if not titulo:
             continue  # sin título no se puede insertar
 
-        # Si tiene ID y ya está en BD, saltar (ya fue procesado)
+        # Si tiene ID y ya está en BD (o más arriba en el Excel), saltar
         if tiene_id and id_pub_excel in existing_ids:
             omitidas_pub += 1
             continue
@@ -280,159 +284,295 @@ def main():
             omitidas_pub += 1
             continue
 
-        # --- 1. Preparar datos de publicacion ---
-        fecha = None
-        fecha_raw = row.get("Fecha")
-        if fecha_raw and not (isinstance(fecha_raw, float) and pd.isna(fecha_raw)):
-            try:
-                fecha = pd.to_datetime(fecha_raw).strftime("%Y-%m-%d")
-            except Exception:
-                año_val = row.get("Año")
-                if año_val and not pd.isna(año_val):
-                    fecha = f"{int(año_val)}-01-01"
-                else:
-                    fecha = "1900-01-01"
+        # Sin ID y con título casi igual a uno de la BD o de una fila anterior del Excel
+        cita_corta = limpiar_str(row.get("Cita Corta"))
+        if indice is not None and not tiene_id:
+            parecidas = indice.similares(titulo, cita_corta, umbral_similar)
+            if parecidas:
+                id_similar, similitud = parecidas[0]
+                similares.append({
+                    "fila_excel": int(idx) + 2,
+                    "titulo": titulo,
+                    "similar_a": id_similar,
+                    "titulo_similar": titulo_de.get(id_similar),
+                    "similitud": similitud,
+                })
+                continue
+
+        if tiene_id:
+            existing_ids.add(id_pub_excel)
         else:
-            año_val = row.get("Año")
-            if año_val and not pd.isna(año_val):
-                fecha = f"{int(año_val)}-01-01"
+            existing_titulos.add(titulo_key)
+        if indice is not None:
+            # Solo en memoria: el índice guardado se sincroniza con la tabla en la próxima corrida
+            clave = id_pub_excel if tiene_id else f"fila {int(idx) + 2} del Excel"
+            indice.add(clave, titulo, cita_corta)
+            titulo_de[clave] = titulo
+        nuevas.append((row, fila_a_publicacion(row, titulo), id_pub_excel))
+
+    # Bloque de ids para las publicaciones sin IdPublicacion, por encima de los forzados
+    sin_id = sum(1 for _, _, id_forzado in nuevas if id_forzado is None)
+    if sin_id and reservar:
+        maximo = max((id_forzado for _, _, id_forzado in nuevas if id_forzado is not None), default=0)
+        print(f"🔢 Reservando {sin_id} ids de publicacion...")
+        resp = con_reintento(lambda s: s.rpc("reservar_ids_publicacion", {
+            "p_cantidad": sin_id, "p_minimo": maximo,
+        }).execute(), supabase_url, supabase_key, sb)
+        reservados = [int(v["reservar_ids_publicacion"]) if isinstance(v, dict) else int(v) for v in resp.data]
+        if len(reservados) != sin_id:
+            raise RuntimeError(f"reservar_ids_publicacion devolvió {len(reservados)} ids de {sin_id}")
+    else:
+        # dry-run: ids provisionales negativos, no se reserva nada
+        reservados = [-i for i in range(1, sin_id + 1)]
+    siguiente_id = iter(reservados)
+
+    tablas = {tabla: [] for tabla in ORDEN_TABLAS}
+    autor_ids: dict[str, int] = {}
+    tipos_no_encontrados = set()
+    for row, pub_data, id_forzado in nuevas:
+        nuevo_id = id_forzado if id_forzado is not None else next(siguiente_id)
+        tablas["publicacion"].append({"id_publicacion": nuevo_id, **pub_data})
+
+        # --- publicacion_ano ---
+        año_val = row.get("Año")
+        if nuevo_id not in existing_anos and año_val and not pd.isna(año_val):
+            tablas["publicacion_ano"].append({"ano": int(año_val), "publicacion_id": nuevo_id})
+
+        # --- publicacion_catalogo_awe (tipo de publicación) ---
+        tipo_cat_str = limpiar_str(row.get("Tipo Publicación Catálogo"))
+        if nuevo_id not in existing_cat and tipo_cat_str:
+            cat_id = TIPO_CATALOGO_MAP.get(tipo_cat_str.lower().strip())
+            if cat_id:
+                tablas["publicacion_catalogo_awe"].append({"publicacion_id": nuevo_id, "catalogo_awe_id": cat_id})
             else:
-                fecha = "1900-01-01"
-
-        cientifica_div = limpiar_str(row.get("Científica / Divulgación"))
-        es_cientifica = None
-        if cientifica_div:
-            es_cientifica = cientifica_div.lower() in ("científica", "cientifica", "sí", "si", "yes")
-
-        pub_data = {
-            "titulo": titulo,
-            "titulo_secundario": limpiar_str(row.get("Título Secundario")),
-            "editor": False,
-            "numero_publicacion_ano": int(row["Año"]) if row.get("Año") and not pd.isna(row.get("Año")) else None,
-            "editorial": limpiar_str(row.get("Editorial / Revista")),
-            "volumen": limpiar_str(row.get("Volumen")),
-            "numero": limpiar_str(row.get("Número")),
-            "pagina": limpiar_str(row.get("Páginas")),
-            "palabras_clave": limpiar_str(row.get("Palabras Clave")),
-            "resumen": limpiar_str(row.get("Resumen")),
-            "fecha": fecha,
-            "publicacion_cj": True,
-            "publica_en_web": True,
-            "cita": limpiar_str(row.get("Cita")),
-            "cita_corta": limpiar_str(row.get("Cita Corta")),
-            "cita_larga": limpiar_str(row.get("Cita Larga")),
-            "categoria": False,
-            "noticia": False,
-            "cientifica": es_cientifica,
-            "indexada": normalizar_bool(row.get("Indexada")),
-            "anfibios_ecuador": normalizar_bool(row.get("Anfibios Ecuador")),
-            "justificacion": limpiar_str(row.get("Justificación")),
-            "observaciones": limpiar_str(row.get("Fuente")),
-        }
-
-        # Solo forzar el ID si viene del Excel
-        if tiene_id:
-            pub_data["id_publicacion"] = id_pub_excel
+                tipos_no_encontrados.add(tipo_cat_str)
+
+        # --- Autores ---
+        autor_str = limpiar_str(row.get("Autor(es)"))
+        if nuevo_id not in existing_aut and autor_str:
+            for orden, autor_info in enumerate(parsear_autores(autor_str), start=1):
+                # Truncar a 100 chars por límite de la columna
+                apellidos = autor_info["apellidos"][:100]
+                nombres = autor_info["nombres"][:100] if autor_info["nombres"] else None
+                id_autor = autores.resolve(apellidos, nombres)
+                if id_autor is not None:
+                    clave = clave_autor(apellidos, nombres)
+                    autor_ids[clave] = id_autor
+                else:
+                    # Se crean todos juntos en la fase 2
+                    clave = autores.pendiente(apellidos, nombres)
+                tablas["publicacion_autor"].append({
+                    "publicacion_id": nuevo_id,
+                    "autor_clave": clave,
+                    "orden_autor": orden,
+                })
+    tablas["autor"] = autores.filas_pendientes()
+
+    for tipo in sorted(tipos_no_encontrados):
+        print(f"  ⚠️  Tipo catálogo no encontrado: '{tipo}'")
+
+    return {
+        "tablas": tablas,
+        "autor_ids": autor_ids,
+        "filas_hechas": {tabla: 0 for tabla in ORDEN_TABLAS},
+        "omitidas": omitidas_pub,
+        "similares": similares,
+    }
+
+
+# ─── Checkpoint ───────────────────────────────────────────────────────────────
+
+def firma_excel(path: Path) -> list:
+    stat = path.stat()
+    return [str(path), stat.st_size, int(stat.st_mtime)]
+
+
+def leer_checkpoint(path: Path, firma: list) -> dict | None:
+    """Plan guardado de una corrida anterior, si es del mismo Excel."""
+    if not path.exists():
+        return None
+    try:
+        plan = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        print(f"⚠️  Checkpoint ilegible, se descarta: {path}")
+        return None
+    if plan.get("firma") != firma:
+        print("⚠️  El checkpoint es de otra versión del Excel, se descarta")
+        return None
+    if plan.get("version") != CHECKPOINT_VERSION:
+        print("⚠️  El checkpoint es de un formato anterior, se descarta")
+        return None
+    return plan
+
+
+def guardar_checkpoint(path: Path, plan: dict) -> None:
+    # Escribir y renombrar: un corte a mitad de escritura no deja el archivo a medias
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(plan, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# ─── Fase 2: inserción por tabla ──────────────────────────────────────────────
+
+def sin_insertados(tabla: str, filas: list[dict], plan: dict, sb: list) -> list[dict]:
+    """
+    Quita del lote las filas que ya están en la BD. Solo hace falta en el
+    primer lote pendiente al reanudar: pudo insertarse justo antes del corte
+    sin que alcanzara a guardarse el checkpoint.
+    """
+    if tabla == "autor":
+        claves = {clave_autor(f["apellidos"], f["nombres"]) for f in filas}
+        resp = sb[0].table("autor").select("id_autor, apellidos, nombres").in_(
+            "apellidos", [f["apellidos"] for f in filas]).execute()
+        plan["autor_ids"].update({k: v for k, v in claves_de(resp.data or []).items() if k in claves})
+        return [f for f in filas if clave_autor(f["apellidos"], f["nombres"]) not in plan["autor_ids"]]
+
+    campo = "id_publicacion" if tabla == "publicacion" else "publicacion_id"
+    columnas = f"{campo}, orden_autor" if tabla == "publicacion_autor" else campo
+    ids = sorted({f[campo] for f in filas})
+    resp = sb[0].table(tabla).select(columnas).in_(campo, ids).execute()
+    if tabla == "publicacion_autor":
+        existentes = {(r[campo], r["orden_autor"]) for r in resp.data or []}
+        return [f for f in filas if (f[campo], f["orden_autor"]) not in existentes]
+    existentes = {r[campo] for r in resp.data or []}
+    return [f for f in filas if f[campo] not in existentes]
+
+
+def insertar_lote(tabla: str, filas: list[dict], plan: dict, supabase_url: str, supabase_key: str,
+                  sb: list, rejects: RejectLog) -> int:
+    """Inserta un lote; si falla, lo biseca y las filas rechazadas van a rejects."""
+    if tabla == "autor":
+        # Se necesitan los ids devueltos para las relaciones publicacion_autor
+        creados = con_reintento(lambda s: insertar_autores(s, filas), supabase_url, supabase_key, sb)
+        plan["autor_ids"].update(creados)
+        return len(creados)
+
+    if tabla == "publicacion_autor":
+        sin_autor = [f for f in filas if f["autor_clave"] not in plan["autor_ids"]]
+        for f in sin_autor:
+            print(f"  ⚠️  Autor sin id '{f['autor_clave']}' (pub id={f['publicacion_id']})")
+        filas = [{"publicacion_id": f["publicacion_id"], "autor_id": plan["autor_ids"][f["autor_clave"]],
+                  "orden_autor": f["orden_autor"]} for f in filas if f["autor_clave"] in plan["autor_ids"]]
+        if not filas:
+            return 0
 
-        try:
-            resp_pub = con_reintento(lambda s: s.table("publicacion").insert(pub_data).execute(),
-                                     supabase_url, supabase_key, sb)
-            if not resp_pub.data:
-                print(f"  ❌ Error insertando publicación (excel_idx={idx}): sin datos en respuesta")
-                errores_pub += 1
+    try:
+        con_reintento(lambda s: s.table(tabla).insert(filas, returning="minimal").execute(),
+                      supabase_url, supabase_key, sb)
+        return len(filas)
+    except RuntimeError:
+        raise  # sin conexión: el checkpoint permite retomar desde aquí
+    except Exception as e:
+        print(f"  ❌ {tabla}: error en lote: {str(e)[:80]}")
+        ok = retry_by_bisection(sb[0], tabla, filas, e, rejects)
+        print(f"   ↳ {tabla}: {ok}/{len(filas)} recuperados, {len(filas) - ok} rechazados")
+        return ok
+
+
+def ejecutar_plan(plan: dict, supabase_url: str, supabase_key: str, sb: list, chunk_size: int,
+                  checkpoint_path: Path, reanudando: bool) -> dict:
+    """Inserta cada tabla por lotes en orden de FK, guardando el avance tras cada lote."""
+    insertadas = {}
+    with RejectLog(REJECTS_PATH) as rejects:
+        for tabla in ORDEN_TABLAS:
+            filas = plan["tablas"][tabla]
+            # Avance en filas, no en lotes: se puede retomar con otro --chunk-size
+            hechas = plan["filas_hechas"][tabla]
+            insertadas[tabla] = 0
+            if hechas >= len(filas):
                 continue
-            insertadas_pub += 1
-            if tiene_id:
-                existing_ids.add(id_pub_excel)
-            else:
-                existing_titulos.add(titulo_key)
-        except Exception as e:
-            print(f"  ❌ Error insertando publicación (excel_idx={idx}): {e}")
-            errores_pub += 1
-            continue
+            print(f"📤 {tabla}: {len(filas)} filas en lotes de {chunk_size}"
+                  + (f" (retomando desde la fila {hechas + 1})" if hechas else ""))
+            for inicio in range(hechas, len(filas), chunk_size):
+                lote = filas[inicio:inicio + chunk_size]
+                fin = inicio + len(lote)
+                if reanudando and inicio == hechas:
+                    lote = sin_insertados(tabla, lote, plan, sb)
+                if lote:
+                    insertadas[tabla] += insertar_lote(tabla, lote, plan, supabase_url, supabase_key, sb, rejects)
+                plan["filas_hechas"][tabla] = fin
+                guardar_checkpoint(checkpoint_path, plan)
+                print(f"   ✓ {tabla}: {fin}/{len(filas)}")
+        if rejects.count:
+            print(f"⚠️  {rejects.count} filas rechazadas → {REJECTS_PATH}")
+    return insertadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga publicaciones desde el Excel combinado")
+    parser.add_argument("--dry-run", action="store_true", help="Arma el plan y muestra conteos sin escribir")
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta el checkpoint y vuelve a leer la BD")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Filas por insert")
+    parser.add_argument("--umbral-similar", type=float, default=UMBRAL_SIMILAR,
+                        help="Similitud desde la que una fila sin IdPublicacion se considera ya cargada")
+    parser.add_argument("--incluir-similares", action="store_true",
+                        help="Inserta también las filas casi duplicadas (solo deduplica por título exacto)")
+    args = parser.parse_args()
+
+    excel_path = Path("/Users/xavieraguas/Downloads/Publicaciones_Combinadas_Final.xlsx")
+    if not excel_path.exists():
+        print(f"❌ No se encontró: {excel_path}")
+        sys.exit(1)
+
+    supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not supabase_url or not supabase_key:
+        print("❌ Faltan variables de entorno NEXT_PUBLIC_SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY")
+        sys.exit(1)
+
+    supabase: Client = create_client(supabase_url, supabase_key)
+    # Referencia mutable para permitir reconexión
+    sb = [supabase]
+
+    firma = firma_excel(excel_path)
+    if args.reiniciar and CHECKPOINT_PATH.exists():
+        CHECKPOINT_PATH.unlink()
+    plan = None if args.dry_run else leer_checkpoint(CHECKPOINT_PATH, firma)
+
+    reanudando = plan is not None
+    if reanudando:
+        print(f"♻️  Retomando carga desde {CHECKPOINT_PATH.name}")
+    else:
+        print(f"📖 Leyendo Excel: {excel_path.name}...")
+        df = pd.read_excel(excel_path, sheet_name=0, engine="openpyxl")
+        print(f"   Filas: {len(df)}")
+        plan = armar_plan(df, supabase_url, supabase_key, sb, reservar=not args.dry_run,
+                          umbral_similar=None if args.incluir_similares else args.umbral_similar)
+        plan["firma"] = firma
+        plan["version"] = CHECKPOINT_VERSION
 
-        nuevo_id = resp_pub.data[0]["id_publicacion"]
-
-        # --- 2. publicacion_ano ---
-        if nuevo_id not in existing_anos:
-            año_val = row.get("Año")
-            if año_val and not pd.isna(año_val):
-                try:
-                    con_reintento(lambda s: s.table("publicacion_ano").insert({
-                        "ano": int(año_val),
-                        "publicacion_id": nuevo_id,
-                    }).execute(), supabase_url, supabase_key, sb)
-                    anos_insertados += 1
-                    existing_anos.add(nuevo_id)
-                except Exception as e:
-                    print(f"  ⚠️  Error en publicacion_ano para id {nuevo_id}: {e}")
-
-        # --- 3. publicacion_catalogo_awe (tipo de publicación) ---
-        if nuevo_id not in existing_cat:
-            tipo_cat_str = limpiar_str(row.get("Tipo Publicación Catálogo"))
-            if tipo_cat_str:
-                cat_id = TIPO_CATALOGO_MAP.get(tipo_cat_str.lower().strip())
-                if cat_id:
-                    try:
-                        con_reintento(lambda s: s.table("publicacion_catalogo_awe").insert({
-                            "publicacion_id": nuevo_id,
-                            "catalogo_awe_id": cat_id,
-                        }).execute(), supabase_url, supabase_key, sb)
-                        catalogo_insertados += 1
-                        existing_cat.add(nuevo_id)
-                    except Exception as e:
-                        print(f"  ⚠️  Error en publicacion_catalogo_awe para id {nuevo_id}: {e}")
-                else:
-                    print(f"  ⚠️  Tipo catálogo no encontrado: '{tipo_cat_str}' (pub id={nuevo_id})")
-
-        # --- 4. Autores ---
-        if nuevo_id not in existing_aut:
-            autor_str = limpiar_str(row.get("Autor(es)"))
-            if autor_str:
-                autores = parsear_autores(autor_str)
-                for orden, autor_info in enumerate(autores, start=1):
-                    apellidos = autor_info["apellidos"]
-                    nombres = autor_info["nombres"]
-                    prev_cache_size = len(autor_cache)
-                    autor_id = get_or_create_autor(sb[0], apellidos, nombres, autor_cache)
-                    if len(autor_cache) > prev_cache_size:
-                        autores_creados += 1
-                    if autor_id:
-                        try:
-                            con_reintento(lambda s: s.table("publicacion_autor").insert({
-                                "publicacion_id": nuevo_id,
-                                "autor_id": autor_id,
-                                "orden_autor": orden,
-                            }).execute(), supabase_url, supabase_key, sb)
-                            autores_autores_rel += 1
-                        except Exception as e:
-                            print(f"  ⚠️  Error en publicacion_autor pub {nuevo_id}, autor {autor_id}: {e}")
-
-        if insertadas_pub % 100 == 0 and insertadas_pub > 0:
-            print(f"   ... {insertadas_pub} publicaciones insertadas")
-
-    # Ajustar la secuencia al valor máximo insertado para que los próximos inserts no colisionen
     print()
-    print("🔧 Ajustando secuencia publicacion_idpublicacion_seq...")
-    try:
-        max_id_resp = sb[0].table("publicacion").select("id_publicacion").order("id_publicacion", desc=True).limit(1).execute()
-        if max_id_resp.data:
-            max_id = max_id_resp.data[0]["id_publicacion"]
-            print(f"   ID máximo insertado: {max_id}. La secuencia se debe actualizar manualmente si es necesario.")
-            print(f"   SQL: SELECT setval('publicacion_idpublicacion_seq', {max_id});")
-    except Exception as e:
-        print(f"  ⚠️  No se pudo leer el ID máximo: {e}")
-        max_id = None
+    print("📋 Plan de carga:")
+    for tabla in ORDEN_TABLAS:
+        print(f"   {tabla:26} {len(plan['tablas'][tabla])}")
+    print(f"   Publicaciones omitidas (ya existían): {plan['omitidas']}")
+    if plan["similares"]:
+        print(f"   Omitidas por casi duplicadas:        {len(plan['similares'])}")
+        SIMILARES_PATH.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(plan["similares"]).to_csv(SIMILARES_PATH, index=False)
+        for s in plan["similares"][:10]:
+            print(f"  ⚠️  {s['titulo']!r} ≈ [{s['similar_a']}] {s['titulo_similar']!r} ({s['similitud']:.2f})")
+        print(f"   Detalle: {SIMILARES_PATH} (usar --incluir-similares para cargarlas igual)")
+
+    if args.dry_run:
+        print("\n🔍 Dry-run: no se escribió nada")
+        return
+
+    if not reanudando:
+        guardar_checkpoint(CHECKPOINT_PATH, plan)
+    print()
+    insertadas = ejecutar_plan(plan, supabase_url, supabase_key, sb, args.chunk_size, CHECKPOINT_PATH, reanudando)
+    CHECKPOINT_PATH.unlink(missing_ok=True)
 
     print()
     print("✅ Carga completada:")
-    print(f"   Publicaciones insertadas: {insertadas_pub}")
-    print(f"   Publicaciones omitidas (ya existían): {omitidas_pub}")
-    print(f"   Publicaciones con error:  {errores_pub}")
-    print(f"   Autores nuevos creados:   {autores_creados}")
-    print(f"   Relaciones autor-pub:     {autores_autores_rel}")
-    print(f"   Años insertados:          {anos_insertados}")
-    print(f"   Catálogos insertados:     {catalogo_insertados}")
+    print(f"   Publicaciones insertadas: {insertadas['publicacion']}")
+    print(f"   Publicaciones omitidas (ya existían): {plan['omitidas']}")
+    print(f"   Autores nuevos creados:   {insertadas['autor']}")
+    print(f"   Relaciones autor-pub:     {insertadas['publicacion_autor']}")
+    print(f"   Años insertados:          {insertadas['publicacion_ano']}")
+    print(f"   Catálogos insertados:     {insertadas['publicacion_catalogo_awe']}")
 
 
 if __name__ == "__main__":
@@ -13,16 +13,19 @@ warnings.filterwarnings('ignore')
 ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
-import openpyxl
 from dotenv import load_dotenv
 from supabase import create_client
 
+from batch_insert import RejectLog, retry_by_bisection
+from excel_reader import iter_excel_rows
+
 load_dotenv(ROOT_DIR / '.env.local')
 load_dotenv(ROOT_DIR / '.env')
 
 SUPABASE_URL = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
 DATOS_DIR = ROOT_DIR / 'Datos'
+REJECTS_PATH = ROOT_DIR / 'reports' / 'rechazos-load-single-table.jsonl'
 
 # Mapeo de tablas
 TABLES = {
@@ -305,30 +308,15 @@ def convert_value(value, col_name):
 
 
 def read_excel(filepath, columns):
-    wb = openpyxl.load_workbook(filepath, data_only=True)
-    sheet = wb.active
-
-    # Headers
-    headers = {}
-    for col in range(1, 200):
-        cell = sheet.cell(row=1, column=col)
-        if cell.value:
-            headers[str(cell.value).strip()] = col
-        elif col > len(headers) + 5:
-            break
-
     records = []
-    row = 2
     empty = 0
 
-    while empty < 5 and row < 50000:
+    for row in iter_excel_rows(filepath, columns):
         data = {}
         has_data = False
 
-        for excel_col, supa_col in columns.items():
-            if excel_col not in headers:
-                continue
-            value = sheet.cell(row=row, column=headers[excel_col]).value
+        for excel_col, value in row.items():
+            supa_col = columns[excel_col]
             if value is not None:
                 has_data = True
             converted = convert_value(value, supa_col)
@@ -340,9 +328,9 @@ def read_excel(filepath, columns):
             empty = 0
         else:
             empty += 1
-        row += 1
+            if empty >= 5:
+                break
 
-    wb.close()
     return records
 
 
@@ -371,6 +359,8 @@ def main():
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     print(f"✅ Conectado a Supabase")
 
+    rejects = RejectLog(REJECTS_PATH)
+
     for tbl in tables_to_load:
         config = TABLES[tbl]
         filepath = DATOS_DIR / config['file']
@@ -411,18 +401,18 @@ def main():
                 print(f"   ❌ Error en lote {i//batch_size + 1}: {error_msg}")
                 errors += len(batch)
 
-                # Intentar uno por uno para encontrar el problema
-                for record in batch:
-                    try:
-                        supabase.table(tbl).insert(record).execute()
-                        inserted += 1
-                    except Exception as e2:
-                        pass
+                # Bisecar el lote para aislar las filas que fallan
+                ok = retry_by_bisection(supabase, tbl, batch, e, rejects)
+                inserted += ok
+                errors -= ok
 
         print(f"   ✅ {inserted} insertados en {tbl}")
         if errors > 0:
             print(f"   ⚠️  {errors} errores")
 
+    rejects.close()
+    if rejects.count:
+        print(f"\n⚠️  {rejects.count} registros rechazados → {REJECTS_PATH.relative_to(ROOT_DIR)}")
     print("\n✅ Completado!")
 
 
@@ -2,12 +2,25 @@
 """
 Script para cargar datos de ubicación de especies desde Excel a Supabase.
 Lee el archivo location_species.xlsx y carga los datos a la tabla ubicacion_especie.
+
+Los registros se arman con operaciones de columna de pandas; los existentes se
+actualizan con upserts por chunk sobre id_ubicacion_especie y los nuevos se
+insertan por chunk, con varios chunks en paralelo (--concurrency).
+
+Uso:
+    python scripts/load-ubicacion-especie.py [--chunk-size 500] [--concurrency 4] [--tolerancia-m 50]
 """
 
+import argparse
 import pandas as pd
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from ubicacion_dedup import UbicacionIndex, load_index
+from name_resolver import NameResolver, print_matches
+from synonym_index import load_synonyms
+from taxonomy_cache import RANK_ESPECIE, TaxonomySnapshot, load_taxonomy
 
 # Cargar variables de entorno
 load_dotenv()
@@ -22,41 +35,6 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 # Crear cliente de Supabase
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def get_taxon_map():
-    """Obtiene un mapa de nombre completo de especie -> taxon_id para especies (rank_id = 7)"""
-    print("Obteniendo taxones de nivel especie con su género...")
-
-    taxon_map = {}
-
-    # Obtener todos los géneros (rank_id = 6)
-    generos_response = supabase.table("taxon").select("id_taxon, taxon").eq("rank_id", 6).execute()
-    generos_map = {row["id_taxon"]: row["taxon"] for row in generos_response.data}
-    print(f"  - Géneros encontrados: {len(generos_response.data)}")
-
-    # Obtener todas las especies (rank_id = 7)
-    especies_response = supabase.table("taxon").select("id_taxon, taxon, taxon_id").eq("rank_id", 7).execute()
-    print(f"  - Especies encontradas: {len(especies_response.data)}")
-
-    for row in especies_response.data:
-        genero_id = row.get("taxon_id")
-        epiteto = row["taxon"].strip()
-        taxon_id = row["id_taxon"]
-
-        if genero_id and genero_id in generos_map:
-            genero = generos_map[genero_id]
-            nombre_completo = f"{genero} {epiteto}"
-
-            # Guardar con diferentes variantes para facilitar búsqueda
-            taxon_map[nombre_completo] = taxon_id
-            taxon_map[nombre_completo.lower()] = taxon_id
-
-        # También guardar solo el epíteto por si acaso
-        taxon_map[epiteto.lower()] = taxon_id
-
-    print(f"Mapa de nombres contiene {len(taxon_map)} entradas")
-    return taxon_map
-
-
 # Mapeo de correcciones para nombres con problemas de codificación
 SPECIES_NAME_CORRECTIONS = {
     # Correcciones de codificación "Río" -> "rio", "Peña" -> "e", etc.
@@ -97,30 +75,10 @@ SPECIES_NAME_CORRECTIONS = {
 }
 
 
-def normalize_species_name(name: str) -> str:
-    """Normaliza el nombre de especie corrigiendo problemas de codificación"""
-    if not name:
-        return name
-
-    name = name.strip()
-
-    # Primero verificar si hay una corrección exacta
-    if name in SPECIES_NAME_CORRECTIONS:
-        return SPECIES_NAME_CORRECTIONS[name]
-
-    return name
-
-def get_ficha_especie_map():
+def get_ficha_especie_map(tax: TaxonomySnapshot):
     """Obtiene un mapa de taxon_id -> id_ficha_especie"""
-    print("Obteniendo fichas de especie...")
-
-    response = supabase.table("ficha_especie").select("id_ficha_especie, taxon_id").execute()
-
-    ficha_map = {}
-    for row in response.data:
-        ficha_map[row["taxon_id"]] = row["id_ficha_especie"]
-
-    print(f"Se encontraron {len(response.data)} fichas de especie")
+    ficha_map = dict(tax.ficha_by_taxon)
+    print(f"Se encontraron {len(ficha_map)} fichas de especie")
     return ficha_map
 
 def load_excel_data(file_path: str):
@@ -135,145 +93,148 @@ def load_excel_data(file_path: str):
 
     return df
 
-def get_existing_ubicaciones():
-    """Obtiene los registros existentes para verificar duplicados"""
+def get_existing_ubicaciones(tolerancia_m: float | None = None) -> UbicacionIndex:
+    """Índice de los registros existentes para verificar duplicados (ver ubicacion_dedup.py)"""
     print("Obteniendo registros existentes...")
+    indice = load_index(supabase, tolerancia_m=tolerancia_m)
+    print(f"Registros existentes: {len(indice)}")
+    if tolerancia_m:
+        print(f"  - Tolerancia espacial: {tolerancia_m} m con el mismo voucher")
+    return indice
+
+def get_name_resolver(tax: TaxonomySnapshot) -> NameResolver:
+    """Resolver de nombres de especie (ver name_resolver.py) con las correcciones de codificación"""
+    print("Preparando índice de nombres de especie...")
+    resolver = NameResolver(tax, correcciones=SPECIES_NAME_CORRECTIONS, ranks=(RANK_ESPECIE,),
+                              sinonimos=load_synonyms(tax))
+    print(f"  - Géneros encontrados: {len(resolver.por_genero)}")
+    print(f"  - Especies encontradas: {len(resolver.exactos)}")
+    return resolver
+
+# Mapeo de columnas del Excel a campos de la tabla
+# Basado en la estructura real del archivo:
+# ['Order', 'Family', 'Species', 'Province', 'Locality', 'Voucher', 'Latitud', 'Longitud', 'Elev. (m)']
+COLUMN_MAPPING = {
+    'species': ['Species', 'species'],
+    'provincia': ['Province', 'Provincia', 'province'],
+    'localidad': ['Locality', 'Localidad', 'locality'],
+    'voucher': ['Voucher', 'voucher'],
+    'latitud': ['Latitud', 'latitud', 'Latitude', 'lat'],
+    'longitud': ['Longitud', 'longitud', 'Longitude', 'lon', 'long'],
+    'elevacion': ['Elev. (m)', 'Elevation', 'elevacion', 'Elevacion', 'Elev']
+}
+NUMERIC_FIELDS = ['latitud', 'longitud', 'elevacion']
+TEXT_FIELDS = ['provincia', 'localidad', 'voucher']
+RECORD_FIELDS = ['id_ficha_especie', 'id_taxon', 'provincia', 'localidad', 'voucher', 'latitud', 'longitud', 'elevacion']
+
+CHUNK_SIZE = 500
+DEFAULT_CONCURRENCY = 4
 
-    response = supabase.table("ubicacion_especie").select("id_ubicacion_especie, id_ficha_especie, id_taxon, latitud, longitud, voucher, localidad").execute()
-
-    # Crear un set de tuplas para identificar registros únicos
-    existing = {}
-    for row in response.data:
-        # Usar una combinación de campos como clave única
-        key = (
-            row.get("id_ficha_especie"),
-            row.get("id_taxon"),
-            round(row.get("latitud"), 6) if row.get("latitud") else None,
-            round(row.get("longitud"), 6) if row.get("longitud") else None,
-            str(row.get("voucher", "")).strip() if row.get("voucher") else None,
-            str(row.get("localidad", "")).strip() if row.get("localidad") else None,
-        )
-        existing[key] = row.get("id_ubicacion_especie")
-
-    print(f"Registros existentes: {len(existing)}")
-    return existing
-
-def process_and_insert_data(df: pd.DataFrame, taxon_map: dict, ficha_map: dict):
+
+def detect_columns(df: pd.DataFrame) -> dict:
+    """Campo de la tabla -> columna real del Excel (la primera que coincida, sin importar mayúsculas)"""
+    alias = {name.lower(): field for field, names in COLUMN_MAPPING.items() for name in names}
+    actual_columns = {}
+    for col in df.columns:
+        field = alias.get(str(col).lower())
+        if field:
+            actual_columns.setdefault(field, col)
+    return actual_columns
+
+def build_records_frame(df: pd.DataFrame, actual_columns: dict, resolver: NameResolver, ficha_map: dict):
+    """
+    Arma con operaciones de columna un DataFrame con los campos de ubicacion_especie.
+    Devuelve (frame, especies no encontradas, especies sin ficha).
+    """
+    species_col = actual_columns['species']
+    base = df[df[species_col].notna()]
+    especies = base[species_col].astype(str).str.strip()
+
+    # Resolver cada nombre distinto una sola vez (exacto, sinónimo, corrección, género cambiado o difuso)
+    matches = resolver.resolve_series(especies)
+    print_matches(matches, especies)
+
+    taxon_ids = matches['id_taxon']
+    ficha_ids = taxon_ids.map(ficha_map)
+    species_not_found = set(especies[taxon_ids.isna()])
+    ficha_not_found = set(especies[taxon_ids.notna() & ficha_ids.isna()])
+
+    frame = pd.DataFrame({'id_ficha_especie': ficha_ids, 'id_taxon': taxon_ids}, index=base.index)
+    for field in NUMERIC_FIELDS + TEXT_FIELDS:
+        col = actual_columns.get(field)
+        if col is None:
+            frame[field] = None
+        elif field in NUMERIC_FIELDS:
+            frame[field] = pd.to_numeric(base[col], errors='coerce')
+        else:
+            valores = base[col]
+            # Igual que antes: valores falsos (0, '') quedan en None
+            texto = valores.astype(str).str.strip()
+            frame[field] = texto.where(valores.notna() & valores.astype(bool), None)
+
+    frame = frame[frame['id_ficha_especie'].notna()]
+    frame = frame.astype({'id_ficha_especie': int, 'id_taxon': int})
+    return frame, species_not_found, ficha_not_found
+
+def to_records(frame: pd.DataFrame) -> list[dict]:
+    """Filas para PostgREST: tipos de Python y None en lugar de NaN"""
+    limpio = frame.astype(object).where(frame.notna(), None)
+    return [{k: (v.item() if hasattr(v, 'item') else v) for k, v in fila.items()}
+            for fila in limpio.to_dict(orient='records')]
+
+def send_chunks(records: list[dict], accion: str, chunk_size: int = CHUNK_SIZE,
+                concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    Envía los registros por chunks, varios en paralelo. accion 'upsert' (sobre
+    id_ubicacion_especie) o 'insert'. Un chunk que falla se reporta y no detiene
+    a los demás. Devuelve el número de registros enviados con éxito.
+    """
+    def enviar(chunk):
+        tabla = supabase.table("ubicacion_especie")
+        if accion == 'upsert':
+            tabla.upsert(chunk, on_conflict="id_ubicacion_especie", returning="minimal").execute()
+        else:
+            tabla.insert(chunk, returning="minimal").execute()
+        return len(chunk)
+
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    total = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(enviar, chunk): n for n, chunk in enumerate(chunks, 1)}
+        for future in as_completed(futures):
+            try:
+                total += future.result()
+                print(f"  Chunk {futures[future]}/{len(chunks)} ✓ ({total}/{len(records)} registros)")
+            except Exception as e:
+                print(f"  Error en chunk {futures[future]}/{len(chunks)}: {e}")
+    return total
+
+def process_and_insert_data(df: pd.DataFrame, resolver: NameResolver, ficha_map: dict,
+                            chunk_size: int = CHUNK_SIZE, concurrency: int = DEFAULT_CONCURRENCY,
+                            tolerancia_m: float | None = None):
     """Procesa los datos del DataFrame y los inserta o actualiza en la tabla ubicacion_especie"""
 
     # Obtener registros existentes
-    existing_ubicaciones = get_existing_ubicaciones()
-
-    records_to_insert = []
-    records_to_update = []
-    species_not_found = set()
-    ficha_not_found = set()
-
-    # Mapeo de columnas del Excel a campos de la tabla
-    # Basado en la estructura real del archivo:
-    # ['Order', 'Family', 'Species', 'Province', 'Locality', 'Voucher', 'Latitud', 'Longitud', 'Elev. (m)']
-    column_mapping = {
-        'species': ['Species', 'species'],
-        'provincia': ['Province', 'Provincia', 'province'],
-        'localidad': ['Locality', 'Localidad', 'locality'],
-        'voucher': ['Voucher', 'voucher'],
-        'latitud': ['Latitud', 'latitud', 'Latitude', 'lat'],
-        'longitud': ['Longitud', 'longitud', 'Longitude', 'lon', 'long'],
-        'elevacion': ['Elev. (m)', 'Elevation', 'elevacion', 'Elevacion', 'Elev']
-    }
+    existing_ubicaciones = get_existing_ubicaciones(tolerancia_m)
 
     # Detectar nombres de columnas reales
-    actual_columns = {}
-    for field, possible_names in column_mapping.items():
-        for col in df.columns:
-            if col in possible_names or col.lower() in [n.lower() for n in possible_names]:
-                actual_columns[field] = col
-                break
-
+    actual_columns = detect_columns(df)
     print(f"Columnas mapeadas: {actual_columns}")
+    if 'species' not in actual_columns:
+        print("No se encontró la columna de especie")
+        return []
 
-    for idx, row in df.iterrows():
-        # Obtener nombre de especie
-        species_col = actual_columns.get('species')
-        if not species_col or pd.isna(row.get(species_col)):
-            continue
-
-        species_name_original = str(row[species_col]).strip()
-
-        # Normalizar el nombre (corregir problemas de codificación)
-        species_name = normalize_species_name(species_name_original)
-
-        # Buscar taxon_id
-        taxon_id = taxon_map.get(species_name) or taxon_map.get(species_name.lower())
-
-        if not taxon_id:
-            # Mostrar tanto el nombre original como el normalizado si son diferentes
-            if species_name != species_name_original:
-                species_not_found.add(f"{species_name_original} -> {species_name}")
-            else:
-                species_not_found.add(species_name)
-            continue
-
-        # Buscar ficha_especie
-        ficha_id = ficha_map.get(taxon_id)
-
-        if not ficha_id:
-            ficha_not_found.add(species_name)
-            continue
-
-        # Construir registro
-        record = {
-            "id_ficha_especie": ficha_id,
-            "id_taxon": taxon_id,
-        }
-
-        # Agregar campos opcionales
-        latitud = None
-        longitud = None
-        voucher = None
-        localidad = None
-
-        for field in ['provincia', 'localidad', 'voucher', 'latitud', 'longitud', 'elevacion']:
-            col = actual_columns.get(field)
-            if col and not pd.isna(row.get(col)):
-                value = row[col]
-                # Convertir a tipos apropiados
-                if field in ['latitud', 'longitud', 'elevacion']:
-                    try:
-                        record[field] = float(value)
-                        if field == 'latitud':
-                            latitud = float(value)
-                        elif field == 'longitud':
-                            longitud = float(value)
-                    except (ValueError, TypeError):
-                        record[field] = None
-                else:
-                    record[field] = str(value).strip() if value else None
-                    if field == 'voucher':
-                        voucher = str(value).strip() if value else None
-                    elif field == 'localidad':
-                        localidad = str(value).strip() if value else None
-            else:
-                record[field] = None
-
-        # Verificar si el registro ya existe
-        key = (
-            ficha_id,
-            taxon_id,
-            round(latitud, 6) if latitud else None,
-            round(longitud, 6) if longitud else None,
-            voucher,
-            localidad,
-        )
-
-        existing_id = existing_ubicaciones.get(key)
-        if existing_id:
-            # Actualizar registro existente
-            record["id_ubicacion_especie"] = existing_id
-            records_to_update.append(record)
-        else:
-            # Insertar nuevo registro
-            records_to_insert.append(record)
+    frame, species_not_found, ficha_not_found = build_records_frame(df, actual_columns, resolver, ficha_map)
+
+    # Verificar si el registro ya existe
+    frame['id_ubicacion_especie'] = existing_ubicaciones.lookup(frame)
+    existe = frame['id_ubicacion_especie'].notna()
+
+    # Si varias filas caen en el mismo registro existente, gana la última (como los UPDATE en orden)
+    a_actualizar = frame[existe].drop_duplicates('id_ubicacion_especie', keep='last')
+    records_to_update = to_records(a_actualizar.astype({'id_ubicacion_especie': int})[
+        ['id_ubicacion_especie'] + RECORD_FIELDS])
+    records_to_insert = to_records(frame.loc[~existe, RECORD_FIELDS])
 
     # Mostrar estadísticas
     print(f"\n=== Estadísticas ===")
@@ -292,40 +253,16 @@ def process_and_insert_data(df: pd.DataFrame, taxon_map: dict, ficha_map: dict):
         for sp in list(ficha_not_found)[:20]:
             print(f"  - {sp}")
 
-    # Actualizar registros existentes
+    # Actualizar registros existentes: upsert por chunks sobre id_ubicacion_especie
     if records_to_update:
         print(f"\nActualizando {len(records_to_update)} registros...")
-        batch_size = 500
-        total_updated = 0
-
-        for i in range(0, len(records_to_update), batch_size):
-            batch = records_to_update[i:i + batch_size]
-            try:
-                for record in batch:
-                    record_id = record.pop("id_ubicacion_especie")
-                    supabase.table("ubicacion_especie").update(record).eq("id_ubicacion_especie", record_id).execute()
-                total_updated += len(batch)
-                print(f"  Actualizados {total_updated}/{len(records_to_update)} registros")
-            except Exception as e:
-                print(f"  Error actualizando lote {i//batch_size + 1}: {e}")
-
+        total_updated = send_chunks(records_to_update, 'upsert', chunk_size, concurrency)
         print(f"\n✓ Actualización completada: {total_updated} registros")
 
     # Insertar nuevos registros en lotes
     if records_to_insert:
         print(f"\nInsertando {len(records_to_insert)} registros nuevos...")
-        batch_size = 500
-        total_inserted = 0
-
-        for i in range(0, len(records_to_insert), batch_size):
-            batch = records_to_insert[i:i + batch_size]
-            try:
-                response = supabase.table("ubicacion_especie").insert(batch).execute()
-                total_inserted += len(batch)
-                print(f"  Insertados {total_inserted}/{len(records_to_insert)} registros")
-            except Exception as e:
-                print(f"  Error insertando lote {i//batch_size + 1}: {e}")
-
+        total_inserted = send_chunks(records_to_insert, 'insert', chunk_size, concurrency)
         print(f"\n✓ Inserción completada: {total_inserted} registros")
     else:
         print("\nNo hay registros nuevos para insertar")
@@ -333,6 +270,14 @@ def process_and_insert_data(df: pd.DataFrame, taxon_map: dict, ficha_map: dict):
     return records_to_insert
 
 def main():
+    parser = argparse.ArgumentParser(description="Carga ubicacion_especie desde el Excel de localidades")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Registros por petición (default: {CHUNK_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Chunks en paralelo (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--tolerancia-m", type=float, default=None,
+                        help="Puntos a menos de N metros con el mismo voucher cuentan como el mismo registro")
+    args = parser.parse_args()
+
     # Ruta al archivo Excel (primero intentar el corregido, luego el original)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_dir = os.path.dirname(script_dir)
@@ -353,14 +298,15 @@ def main():
         return
 
     # Cargar mapas de referencia
-    taxon_map = get_taxon_map()
-    ficha_map = get_ficha_especie_map()
+    tax = load_taxonomy(supabase)
+    resolver = get_name_resolver(tax)
+    ficha_map = get_ficha_especie_map(tax)
 
     # Cargar datos del Excel
     df = load_excel_data(excel_path)
 
     # Procesar e insertar datos
-    process_and_insert_data(df, taxon_map, ficha_map)
+    process_and_insert_data(df, resolver, ficha_map, args.chunk_size, args.concurrency, args.tolerancia_m)
 
 if __name__ == "__main__":
     main()
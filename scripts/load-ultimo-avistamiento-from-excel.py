@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Carga ultimo_avistamiento en ficha_especie desde Excel "Posiblemente extintas.xlsx".
-Empareja por nombre científico (columna Species del Excel = nombre_cientifico en vw_ficha_especie_completa).
+Empareja por nombre científico (columna Species del Excel) con name_resolver.py, que tolera
+tildes, autoría, "(E)", combinaciones antiguas y errores de tipeo.
 """
 import os
 import re
@@ -11,6 +12,9 @@ from datetime import datetime
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from name_resolver import NameResolver, print_matches
+from synonym_index import load_synonyms
+from taxonomy_cache import RANK_ESPECIE, load_taxonomy
 
 load_dotenv(".env.local")
 
@@ -98,18 +102,20 @@ def main():
         print("❌ Se esperan columnas 'Species' y 'Last Sighting in Ecuador'")
         sys.exit(1)
 
-    print("🔍 Obteniendo id_ficha_especie por nombre_cientifico...")
-    r = supabase.table("vw_ficha_especie_completa").select("id_ficha_especie, nombre_cientifico").execute()
-    if not r.data:
-        print("❌ No se pudo leer vw_ficha_especie_completa")
+    print("🔍 Obteniendo id_ficha_especie por nombre científico...")
+    tax = load_taxonomy(supabase)
+    if not tax.ficha_by_taxon:
+        print("❌ No se pudo leer ficha_especie")
         sys.exit(1)
-    nombre_to_id = {row["nombre_cientifico"].strip(): row["id_ficha_especie"] for row in r.data}
+    resolver = NameResolver(tax, ranks=(RANK_ESPECIE,), sinonimos=load_synonyms(tax))
+    matches = resolver.resolve_series(df["Species"])
+    print_matches(matches, df["Species"])
 
     actualizados = 0
     sin_match = []
     sin_fecha = []
 
-    for _, row in df.iterrows():
+    for idx, row in df.iterrows():
         species_raw = row["Species"]
         nombre_norm = normalizar_nombre_excel(species_raw)
         if not nombre_norm:
@@ -118,7 +124,8 @@ def main():
         if not fecha:
             sin_fecha.append((nombre_norm, str(row["Last Sighting in Ecuador"])))
             continue
-        id_ficha = nombre_to_id.get(nombre_norm)
+        taxon_id = matches.at[idx, "id_taxon"]
+        id_ficha = None if pd.isna(taxon_id) else tax.ficha_by_taxon.get(int(taxon_id))
         if id_ficha is None:
             sin_match.append(nombre_norm)
             continue
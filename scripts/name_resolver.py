@@ -0,0 +1,242 @@
+"""
+Resolución tolerante de nombres científicos contra el snapshot de taxonomía.
+
+Los loaders comparaban el nombre del Excel en minúsculas con by_binomial y
+todo lo que no coincidía exacto terminaba en la lista de "especies no
+encontradas" para corregir a mano. NameResolver prueba, en orden:
+1. exacto: el nombre normalizado (sin tildes, autoría, "(E)", "cf.", "aff.",
+   "sp.", números ni espacios extra; solo género + epíteto) en el índice.
+2. sinonimo / correccion: el índice de sinónimos (synonym_index.py) y el
+   diccionario de correcciones que pase el script.
+3. genero_cambiado: el epíteto existe en una sola especie con otro género
+   (combinaciones antiguas: Eleutherodactylus unistrigatus → Pristimantis).
+   epiteto: igual para un nombre de una palabra que es el epíteto de una sola
+   especie (celdas de Species con solo 'unistrigatus').
+4. difuso: SequenceMatcher contra un conjunto de candidatos bloqueado por
+   géneros parecidos y por trigramas del epíteto, así cada búsqueda compara
+   decenas de nombres y no los ~700 del catálogo.
+
+Cada resultado trae una confianza entre 0 y 1 (1 exacto, 0.9 género cambiado,
+el ratio en difuso). Por debajo del umbral no se devuelve nada. Los resultados
+se memorizan por nombre normalizado, así que 10K filas con unos cientos de
+nombres distintos se resuelven en milisegundos.
+
+Uso:
+    from name_resolver import NameResolver
+    from taxonomy_cache import load_taxonomy
+
+    resolver = NameResolver(load_taxonomy(supabase))
+    match = resolver.resolve('Eleutherodactylus unistrigatus (Günther, 1859)')
+    match.id_taxon, match.confianza, match.metodo
+    matches = resolver.resolve_series(df['Species'])   # id_taxon, nombre, confianza, metodo
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from difflib import SequenceMatcher, get_close_matches
+
+import pandas as pd
+
+from taxonomy_cache import RANK_ESPECIE, RANK_FAMILIA, RANK_GENERO, RANK_ORDEN, TaxonomySnapshot
+
+UMBRAL_DEFAULT = 0.85
+CONFIANZA_GENERO_CAMBIADO = 0.9
+MAX_CANDIDATOS = 40
+
+# Calificadores que no forman parte del nombre
+CALIFICADORES = {'cf', 'aff', 'sp', 'spp', 'nov', 'gr', 'complex', 'group', 'ssp', 'subsp', 'var'}
+
+
+@dataclass(frozen=True)
+class Match:
+    id_taxon: int
+    nombre: str        # nombre científico en la BD
+    confianza: float
+    metodo: str        # exacto | sinonimo | correccion | genero_cambiado | epiteto | difuso
+
+
+def quitar_tildes(texto: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def normalizar_nombre(texto) -> str:
+    """
+    'Pristimantis cf. unistrigatus (Günther, 1859) (E)' → 'pristimantis unistrigatus'.
+    Quita tildes, paréntesis, autoría, calificadores y números; conserva a lo
+    sumo dos palabras (género + epíteto).
+    """
+    if texto is None or (isinstance(texto, float) and pd.isna(texto)):
+        return ''
+    s = quitar_tildes(str(texto)).lower()
+    s = re.sub(r'\([^)]*\)?', ' ', s)
+    s = re.sub(r'[^a-z\s-]', ' ', s)
+    palabras = [p.strip('-') for p in s.split()]
+    palabras = [p for p in palabras if len(p) > 1 and p not in CALIFICADORES]
+    return ' '.join(palabras[:2])
+
+
+def trigramas(texto: str) -> set:
+    texto = f' {texto} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class NameResolver:
+    """Índices de nombres construidos una vez a partir del snapshot."""
+
+    def __init__(self, tax: TaxonomySnapshot, correcciones: dict | None = None,
+                 umbral: float = UMBRAL_DEFAULT,
+                 ranks=(RANK_ORDEN, RANK_FAMILIA, RANK_GENERO, RANK_ESPECIE), sinonimos=None):
+        self.tax = tax
+        self.sinonimos = sinonimos
+        self.ranks = ranks
+        self.umbral = umbral
+        self._cache = {}
+        self._generos_cercanos = {}
+
+        # nombre normalizado → id, más los índices de bloqueo
+        self.exactos = {}
+        self.por_genero = {}        # género → [(epíteto, id)]
+        self.por_epiteto = {}       # epíteto → [id]
+        self.por_trigrama = {}      # trigrama del epíteto → {id}
+        self.epiteto_de = {}        # id → epíteto
+        self.nombre_genero = {}     # id → género
+        self.simples = []           # nombres de una palabra (orden, familia, género)
+        for t in tax.taxa:
+            if t['rank_id'] not in ranks:
+                continue
+            # Con índice de sinónimos, los nombres históricos se resuelven allí
+            if sinonimos is not None and t['id_taxon'] in sinonimos.aceptado_de:
+                continue
+            clave = normalizar_nombre(tax.scientific_name(t['id_taxon']))
+            if not clave:
+                continue
+            self.exactos.setdefault(clave, t['id_taxon'])
+            if t['rank_id'] != RANK_ESPECIE:
+                self.simples.append(clave)
+                continue
+            genero, _, epiteto = clave.partition(' ')
+            if not epiteto:
+                continue
+            self.por_genero.setdefault(genero, []).append((epiteto, t['id_taxon']))
+            self.por_epiteto.setdefault(epiteto, []).append(t['id_taxon'])
+            self.epiteto_de[t['id_taxon']] = epiteto
+            self.nombre_genero[t['id_taxon']] = genero
+            for tri in trigramas(epiteto):
+                self.por_trigrama.setdefault(tri, set()).add(t['id_taxon'])
+        self.generos = list(self.por_genero)
+
+        self.correcciones = {}
+        for original, corregido in (correcciones or {}).items():
+            tid = self.exactos.get(normalizar_nombre(corregido))
+            if tid is not None:
+                self.correcciones[normalizar_nombre(original)] = tid
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def resolve(self, nombre) -> Match | None:
+        clave = normalizar_nombre(nombre)
+        if clave not in self._cache:
+            self._cache[clave] = self._resolver(clave)
+        return self._cache[clave]
+
+    def resolve_series(self, nombres: pd.Series) -> pd.DataFrame:
+        """Resuelve una columna: DataFrame id_taxon, nombre, confianza, metodo con el mismo índice."""
+        unicos = {n: self.resolve(n) for n in nombres.dropna().unique()}
+        filas = [unicos.get(n) if not pd.isna(n) else None for n in nombres]
+        return pd.DataFrame({
+            'id_taxon': pd.array([m.id_taxon if m else None for m in filas], dtype='Int64'),
+            'nombre': [m.nombre if m else None for m in filas],
+            'confianza': [m.confianza if m else 0.0 for m in filas],
+            'metodo': [m.metodo if m else None for m in filas],
+        }, index=nombres.index)
+
+    def taxon_id(self, nombre) -> int | None:
+        match = self.resolve(nombre)
+        return match.id_taxon if match else None
+
+    # ─── Internos ─────────────────────────────────────────────────────────────
+
+    def _match(self, tid: int, confianza: float, metodo: str) -> Match:
+        return Match(tid, self.tax.scientific_name(tid), round(confianza, 3), metodo)
+
+    def _resolver(self, clave: str) -> Match | None:
+        if not clave:
+            return None
+        if clave in self.exactos:
+            return self._match(self.exactos[clave], 1.0, 'exacto')
+        if self.sinonimos is not None:
+            tid = self.sinonimos.binomios.get(clave) or self.sinonimos.generos.get(clave)
+            if tid is not None and self.tax.by_id.get(tid, {}).get('rank_id') in self.ranks:
+                return self._match(tid, 1.0, 'sinonimo')
+        if clave in self.correcciones:
+            return self._match(self.correcciones[clave], 1.0, 'correccion')
+
+        genero, _, epiteto = clave.partition(' ')
+        if not epiteto:
+            # Solo el epíteto: vale si es de una sola especie
+            ids = self.por_epiteto.get(clave, [])
+            if len(ids) == 1:
+                return self._match(ids[0], CONFIANZA_GENERO_CAMBIADO, 'epiteto')
+            return self._difuso_simple(clave)
+
+        ids = self.por_epiteto.get(epiteto, [])
+        if len(ids) == 1:
+            return self._match(ids[0], CONFIANZA_GENERO_CAMBIADO, 'genero_cambiado')
+        return self._difuso_especie(clave, genero, epiteto)
+
+    def _candidatos(self, genero: str, epiteto: str) -> set:
+        """Especies de géneros parecidos más las que comparten más trigramas del epíteto."""
+        if genero not in self._generos_cercanos:
+            cercanos = set(get_close_matches(genero, self.generos, n=3, cutoff=0.75))
+            cercanos.update(g for g in self.generos if g[:3] == genero[:3])
+            self._generos_cercanos[genero] = cercanos
+        candidatos = {tid for g in self._generos_cercanos[genero] for _, tid in self.por_genero[g]}
+
+        votos = Counter()
+        for tri in trigramas(epiteto):
+            votos.update(self.por_trigrama.get(tri, ()))
+        candidatos.update(tid for tid, _ in votos.most_common(MAX_CANDIDATOS))
+        return candidatos
+
+    def _difuso_especie(self, clave: str, genero: str, epiteto: str) -> Match | None:
+        mejor, mejor_score, metodo = None, 0.0, 'difuso'
+        for tid in self._candidatos(genero, epiteto):
+            candidato = self.epiteto_de[tid]
+            nombre = f'{self.nombre_genero[tid]} {candidato}'
+            matcher = SequenceMatcher(None, clave, nombre)
+            # quick_ratio es una cota superior barata del ratio
+            score, como = (matcher.ratio() if matcher.quick_ratio() > mejor_score else 0.0), 'difuso'
+            # Epíteto con errores de tipeo y otro género: combinación antigua
+            if len(self.por_epiteto[candidato]) == 1:
+                matcher = SequenceMatcher(None, epiteto, candidato)
+                if CONFIANZA_GENERO_CAMBIADO * matcher.quick_ratio() > max(score, mejor_score):
+                    score_epiteto = CONFIANZA_GENERO_CAMBIADO * matcher.ratio()
+                    if score_epiteto > score:
+                        score, como = score_epiteto, 'genero_cambiado'
+            if score > mejor_score:
+                mejor, mejor_score, metodo = tid, score, como
+        if mejor is None or mejor_score < self.umbral:
+            return None
+        return self._match(mejor, mejor_score, metodo)
+
+    def _difuso_simple(self, clave: str) -> Match | None:
+        candidatos = [s for s in self.simples if s[:2] == clave[:2]]
+        cercanos = get_close_matches(clave, candidatos, n=1, cutoff=self.umbral)
+        if not cercanos:
+            return None
+        score = SequenceMatcher(None, clave, cercanos[0]).ratio()
+        return self._match(self.exactos[cercanos[0]], score, 'difuso')
+
+
+def print_matches(matches: pd.DataFrame, originales: pd.Series, limite: int = 20) -> None:
+    """Lista los nombres que no se resolvieron exacto, para revisar a ojo."""
+    revisar = pd.DataFrame({'original': originales, 'nombre': matches['nombre'],
+                            'confianza': matches['confianza'], 'metodo': matches['metodo']})
+    revisar = revisar[revisar['metodo'].isin(['genero_cambiado', 'epiteto', 'difuso'])].drop_duplicates('original')
+    if revisar.empty:
+        return
+    print(f"🔤 Nombres resueltos por aproximación ({len(revisar)}):")
+    for fila in revisar.sort_values('confianza').head(limite).itertuples(index=False):
+        print(f"   {fila.original} → {fila.nombre} ({fila.metodo}, {fila.confianza:.2f})")
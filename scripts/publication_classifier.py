@@ -0,0 +1,187 @@
+"""
+Clasificador de publicaciones por tipo concreto de catalogo_publicaciones
+(Tesis, Informe, Journal, Artículo, Guía de campo, ...).
+
+Las reglas van en REGLAS, de la más específica a la más general; gana la
+primera que aparece en el texto (título + resumen + editorial, en minúsculas).
+Antes cada regla era un re.search aparte sobre el texto completo: hasta ~30
+recorridos carácter por carácter por publicación, y casi todas las
+publicaciones científicas llegan hasta las últimas reglas.
+
+Cada regla declara además sus claves: subcadenas literales que toda
+coincidencia de su patrón contiene ('maestr' para maestr[ií]a, 'cnica' para
+t[eé]cnica). La búsqueda de subcadenas (`in`) es mucho más rápida que la
+regex, así que por texto se revisa primero qué claves aparecen y la regex
+solo se evalúa en las reglas que tienen alguna; el orden de prioridad no
+cambia y el resultado es el mismo que evaluar todas las regex en orden.
+Una clave mal elegida haría que una regla no se evalúe nunca: el fixture
+etiquetado y el benchmark (benchmark-clasificador-publicaciones.py) comparan
+contra clasificar_secuencial, que evalúa las regex una por una como antes.
+
+Uso:
+    from publication_classifier import CATALOGO_IDS, clasificar, clasificar_lote
+
+    clasificar('Guía de campo de anfibios', resumen, editorial)   # 'Guía de campo'
+    clasificar_lote(filas)                                         # [tipo, ...]
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+# id en catalogo_publicaciones para cada ítem concreto (nombre → id)
+CATALOGO_IDS = {
+    "Anals": 1,
+    "Artículo": 2,
+    "Catálogo": 3,
+    "Directorio": 4,
+    "Guía de campo": 5,
+    "Informe": 6,
+    "Journal": 7,
+    "Lámina": 8,
+    "Libro divulgación": 9,
+    "Libro científico": 10,
+    "Memorias": 11,
+    "Monografía": 12,
+    "Otro": 13,
+    "Publicación en congreso": 14,
+    "Publicación técnica": 15,
+    "Reportaje": 16,
+    "Reporte": 17,
+    "Reporte anual": 18,
+    "Reporte mensual": 19,
+    "Resumen": 20,
+    "Revista": 21,
+    "Sección de libro": 22,
+    "Serie": 23,
+    "Sitio WEB": 24,
+    "Suplemento": 25,
+    "Tesis": 26,
+}
+
+EDITORIALES_JOURNAL = ("springer", "elsevier", "wiley", "taylor", "oxford university press",
+                       "cambridge university press", "plos", "biomed central", "frontiers", "mdpi",
+                       "society", "academic press")
+
+SERIE_CIENTIFICA = re.compile(r"\b(zoological|scientific|bulletin)\b")
+REVISTA_CIENTIFICA = re.compile(r"\bcient[ií]fica\b|indexada\b")
+
+
+@dataclass(frozen=True)
+class Texto:
+    titulo: str
+    editorial: str
+    completo: str      # título + resumen + editorial
+
+
+
+
+@dataclass(frozen=True)
+class Regla:
+    tipo: str                                   # nombre en CATALOGO_IDS
+    patron: str
+    claves: tuple[str, ...]                     # subcadenas que toda coincidencia contiene
+    condicion: Callable[[Texto], bool] | None = None
+    campo: str = "completo"                     # completo | editorial
+    regex: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "regex", re.compile(self.patron))
+
+    def aplica(self, texto: Texto) -> bool:
+        return (self.regex.search(getattr(texto, self.campo)) is not None
+                and (self.condicion is None or self.condicion(texto)))
+
+
+# Orden de las reglas: más específico primero.
+REGLAS = (
+    # --- TESIS ---
+    Regla("Tesis", r"\b(tesis|thesis|dissertation|maestr[ií]a|doctorado|phd\b|msc\b|magister)\b",
+          ("tesis", "thesis", "dissertation", "maestr", "doctorado", "phd", "msc", "magister")),
+    # --- Tipos OTRO (específicos) ---
+    Regla("Reporte anual", r"\breporte\s+anual\b|\banual\s+report\b", ("anual",)),
+    Regla("Reporte mensual", r"\breporte\s+mensual\b|\bmonthly\s+report\b", ("mensual", "monthly")),
+    Regla("Informe", r"\binforme\b", ("informe",)),
+    Regla("Reporte", r"\breporte\b|\breport\b", ("report",)),
+    Regla("Memorias", r"\bmemorias\b|proceeding|actas\s+de\s+congreso", ("memorias", "proceeding", "actas")),
+    Regla("Publicación en congreso", r"\bcongreso\b|conference\b|symposium|simposio\b",
+          ("congreso", "conference", "symposium", "simposio")),
+    Regla("Catálogo", r"\bcat[aá]logo\b|catalog\b", ("logo", "catalog")),
+    Regla("Directorio", r"\bdirectorio\b|directory\b", ("directorio", "directory")),
+    Regla("Publicación técnica", r"\bpublicaci[oó]n\s+t[eé]cnica\b|technical\s+publication\b",
+          ("cnica", "technical")),
+    Regla("Suplemento", r"\bsuplemento\b|supplement\b", ("suplemento", "supplement")),
+    Regla("Resumen", r"\bresumen\b|abstract\s+only\b", ("resumen", "abstract"),
+          lambda t: len(t.titulo) < 80),
+    # --- Divulgación (específicos) ---
+    Regla("Guía de campo", r"\bgu[ií]a\s+de\s+campo\b|field\s+guide\b|gu[ií]a\s+did[aá]ctica\b",
+          ("campo", "field", "ctica")),
+    Regla("Reportaje", r"\breportaje\b|news\s+article\b|noticia\b", ("reportaje", "news", "noticia")),
+    Regla("Sitio WEB", r"\bsitio\s+web\b|website\b|web\s+page\b|\.org\b|\.com\b",
+          ("sitio", "website", "web", ".org", ".com")),
+    Regla("Lámina", r"\bl[aá]mina\b|poster\s+session\b", ("mina", "poster")),
+    Regla("Libro divulgación", r"\blibro\s+divulgaci[oó]n\b|popular\s+science\s+book\b",
+          ("divulgaci", "popular")),
+    # --- Científica (específicos): Journal vs Artículo vs Monografía vs Libro vs Sección ---
+    Regla("Journal", r"\bjournal\b|vol\.\s*\d|issue\s*\d|doi\.org\b", ("journal", "vol.", "issue", "doi.org")),
+    Regla("Journal", "|".join(re.escape(e) for e in EDITORIALES_JOURNAL), EDITORIALES_JOURNAL,
+          campo="editorial"),
+    Regla("Monografía", r"\bmonograf[ií]a\b|monograph\b", ("monograf", "monograph")),
+    Regla("Sección de libro", r"\bsecci[oó]n\s+de\s+libro\b|book\s+chapter\b|chapter\s+in\b|en\s+libro\b",
+          ("libro", "chapter")),
+    Regla("Serie", r"\bserie\b|series\b", ("serie",),
+          lambda t: SERIE_CIENTIFICA.search(t.completo) is not None),
+    Regla("Libro científico", r"\blibro\s+cient[ií]fico\b|edited\s+volume\b", ("fico", "edited")),
+    Regla("Revista", r"\brevista\b", ("revista",),
+          lambda t: REVISTA_CIENTIFICA.search(t.completo) is None),
+    Regla("Artículo", r"\bart[ií]culo\b|article\b|peer\s*review\b|indexada\b|scopus\b|wos\b|jcr\b",
+          ("culo", "article", "peer", "indexada", "scopus", "wos", "jcr")),
+    Regla("Artículo", r"\b(study|estudio|research|investigaci[oó]n|species|new\s+species|description|describ"
+          r"|amphibia|anura)\b",
+          ("study", "estudio", "research", "investigaci", "species", "description", "describ", "amphibia", "anura")),
+)
+
+TIPO_DEFAULT = "Otro"
+
+
+def normalizar(s) -> str:
+    if s is None or (isinstance(s, float) and math.isnan(s)):
+        return ""
+    return str(s).strip().lower()
+
+
+def preparar(titulo, resumen, editorial) -> Texto:
+    titulo_n, editorial_n = normalizar(titulo), normalizar(editorial)
+    return Texto(titulo_n, editorial_n, f"{titulo_n} {normalizar(resumen)} {editorial_n}")
+
+
+def clasificar_texto(texto: Texto, reglas=REGLAS) -> str:
+    presentes = {}   # clave → está en el texto (varias reglas comparten claves)
+    for regla in reglas:
+        fuente = getattr(texto, regla.campo)
+        for clave in regla.claves:
+            if (regla.campo, clave) not in presentes:
+                presentes[regla.campo, clave] = clave in fuente
+            if presentes[regla.campo, clave]:
+                break
+        else:
+            continue
+        if regla.aplica(texto):
+            return regla.tipo
+    return TIPO_DEFAULT
+
+
+def clasificar(titulo, resumen, editorial, reglas=REGLAS) -> str:
+    return clasificar_texto(preparar(titulo, resumen, editorial), reglas)
+
+
+def clasificar_lote(filas, reglas=REGLAS) -> list[str]:
+    """filas: dicts con titulo, resumen, editorial → tipo de cada una, en el mismo orden."""
+    return [clasificar(f.get("titulo"), f.get("resumen"), f.get("editorial"), reglas) for f in filas]
+
+
+def clasificar_secuencial(titulo, resumen, editorial, reglas=REGLAS) -> str:
+    """Referencia: la regex de cada regla, en orden, sin filtrar por claves."""
+    texto = preparar(titulo, resumen, editorial)
+    return next((regla.tipo for regla in reglas if regla.aplica(texto)), TIPO_DEFAULT)
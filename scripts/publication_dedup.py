@@ -0,0 +1,282 @@
+"""
+Detección de publicaciones casi duplicadas (MinHash + LSH).
+
+La carga de publicaciones solo descartaba títulos idénticos en minúsculas;
+'Anfibios del Ecuador: guía de campo (2010)' y 'Anfibios del Ecuador - Guía
+de campo' entraban dos veces. Aquí cada publicación se reduce a un conjunto de
+shingles:
+- título normalizado (sin tildes, puntuación ni separadores de subtítulo, y sin
+  años al final) en n-gramas de caracteres;
+- palabras de cita_corta, con prefijo para no mezclarlas con el título.
+De ese conjunto se saca una firma MinHash de NUM_PERM valores: la fracción de
+valores iguales entre dos firmas estima la similitud de Jaccard. La firma se
+parte en BANDAS; dos publicaciones que coinciden en una banda completa son
+candidatas, así que buscar los parecidos a un título revisa unos pocos
+buckets en lugar de toda la tabla.
+
+Las firmas se guardan en .cache/publicaciones-minhash.npz con un digest del
+texto de cada fila; al sincronizar con la tabla solo se recalculan las filas
+nuevas o con título/cita cambiados, y se quitan las borradas.
+
+Uso:
+    from publication_dedup import load_index
+
+    indice = load_index(supabase)
+    indice.similares('Anfibios del Ecuador - guía de campo', 'Ron et al. 2010')   # [(id, similitud)]
+    indice.pares(umbral=0.8)                                                       # auditoría de la tabla
+"""
+
+import hashlib
+import os
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from name_resolver import quitar_tildes
+from supabase_fetch import iter_rows
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = ROOT_DIR / '.cache' / 'publicaciones-minhash.npz'
+
+NUM_PERM = 128
+BANDAS = 32            # 32 bandas de 4 valores: candidatas desde Jaccard ~0.4
+SHINGLE = 4
+UMBRAL_DEFAULT = 0.8
+SEMILLA = 20261017     # fija: firmas guardadas y nuevas deben ser comparables
+LOTE_FIRMAS = 500      # publicaciones por bloque al calcular firmas en lote
+
+
+def normalizar_titulo(texto) -> str:
+    if not texto:
+        return ''
+    s = quitar_tildes(str(texto)).lower()
+    s = re.sub(r'[^a-z0-9]+', ' ', s).strip()
+    # Años (y sufijos 2010a) al final del título
+    return re.sub(r'(\s+(1[5-9]|20)\d{2}[a-z]?)+$', '', f' {s}').strip()
+
+
+def shingles(titulo, cita_corta=None) -> set[str]:
+    return _shingles(normalizar_titulo(titulo), normalizar_titulo(cita_corta))
+
+
+def digest_texto(titulo, cita_corta=None) -> int:
+    """Digest de 63 bits del texto normalizado, para saber si una fila cambió."""
+    return _digest(normalizar_titulo(titulo), normalizar_titulo(cita_corta))
+
+
+def _shingles(titulo: str, cita: str) -> set[str]:
+    if not titulo:
+        return set()
+    resultado = {titulo[i:i + SHINGLE] for i in range(max(len(titulo) - SHINGLE + 1, 1))}
+    resultado.update(f'cita:{p}' for p in cita.split() if len(p) > 2)
+    return resultado
+
+
+def _digest(titulo: str, cita: str) -> int:
+    clave = f'{titulo}\x1f{cita}'
+    return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'little') >> 1
+
+
+class MinHasher:
+    """Familia de NUM_PERM funciones multiply-shift sobre el crc32 de cada shingle."""
+
+    def __init__(self, num_perm: int = NUM_PERM, semilla: int = SEMILLA):
+        rng = np.random.default_rng(semilla)
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.mezcla = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+
+    def firma(self, conjunto: set[str]) -> np.ndarray:
+        return self.firmas([conjunto])[0]
+
+    def firmas(self, conjuntos: list[set[str]]) -> np.ndarray:
+        """Firmas (n × num_perm) de conjuntos no vacíos, por bloques de LOTE_FIRMAS."""
+        resultado = np.empty((len(conjuntos), len(self.a)), dtype=np.uint32)
+        for inicio in range(0, len(conjuntos), LOTE_FIRMAS):
+            bloque = conjuntos[inicio:inicio + LOTE_FIRMAS]
+            largos = np.fromiter((len(c) for c in bloque), dtype=np.int64, count=len(bloque))
+            x = np.fromiter((zlib.crc32(s.encode('utf-8')) for c in bloque for s in c),
+                            dtype=np.uint64, count=int(largos.sum()))
+            # uint64 se desborda módulo 2**64, que es justo lo que pide multiply-shift
+            valores = (self.a[:, None] * x[None, :] + self.b[:, None]) >> np.uint64(32)
+            inicios = np.concatenate(([0], np.cumsum(largos)[:-1]))
+            resultado[inicio:inicio + len(bloque)] = np.minimum.reduceat(valores, inicios, axis=1).T
+        return resultado
+
+
+class PublicacionIndex:
+    def __init__(self, num_perm: int = NUM_PERM, bandas: int = BANDAS):
+        if num_perm % bandas:
+            raise ValueError('num_perm debe ser múltiplo de bandas')
+        self.num_perm = num_perm
+        self.bandas = bandas
+        self.filas_banda = num_perm // bandas
+        self.hasher = MinHasher(num_perm)
+        self.firmas = {}       # id_publicacion → firma
+        self.digests = {}      # id_publicacion → digest del texto
+        self.buckets = [{} for _ in range(bandas)]   # banda → {valores de la banda: {ids}}
+
+    def __len__(self):
+        return len(self.firmas)
+
+    def _claves_banda(self, firma: np.ndarray) -> list[int]:
+        # Cada banda se resume en un entero; una colisión solo agrega un candidato que luego se descarta
+        mezcla = self.hasher.mezcla[:self.filas_banda]
+        return (firma.reshape(self.bandas, self.filas_banda).astype(np.uint64) * mezcla).sum(axis=1).tolist()
+
+    # ─── Construcción ─────────────────────────────────────────────────────────
+
+    def add(self, id_publicacion, titulo, cita_corta=None, digest: int | None = None) -> bool:
+        """Indexa (o reindexa) una publicación; False si no tiene título."""
+        digest = digest_texto(titulo, cita_corta) if digest is None else digest
+        if self.digests.get(id_publicacion) == digest:
+            return True
+        self.remove(id_publicacion)
+        conjunto = shingles(titulo, cita_corta)
+        if not conjunto:
+            return False
+        self._insertar(id_publicacion, self.hasher.firma(conjunto), digest)
+        return True
+
+    def _insertar(self, id_publicacion, firma: np.ndarray, digest: int) -> None:
+        self.firmas[id_publicacion] = firma
+        self.digests[id_publicacion] = digest
+        for bucket, clave in zip(self.buckets, self._claves_banda(firma)):
+            bucket.setdefault(clave, set()).add(id_publicacion)
+
+    def remove(self, id_publicacion) -> None:
+        firma = self.firmas.pop(id_publicacion, None)
+        self.digests.pop(id_publicacion, None)
+        if firma is None:
+            return
+        for bucket, clave in zip(self.buckets, self._claves_banda(firma)):
+            ids = bucket.get(clave)
+            if ids is not None:
+                ids.discard(id_publicacion)
+                if not ids:
+                    del bucket[clave]
+
+    def sincronizar(self, filas) -> dict:
+        """
+        Deja el índice igual a `filas` (dicts id_publicacion, titulo,
+        cita_corta): recalcula solo lo nuevo o cambiado y quita lo que ya no está.
+        """
+        vistos = set()
+        conteo = {'nuevas': 0, 'cambiadas': 0, 'eliminadas': 0}
+        pendientes = []
+        for fila in filas:
+            pid = fila['id_publicacion']
+            vistos.add(pid)
+            titulo, cita = normalizar_titulo(fila.get('titulo')), normalizar_titulo(fila.get('cita_corta'))
+            digest = _digest(titulo, cita)
+            anterior = self.digests.get(pid)
+            if anterior == digest:
+                continue
+            self.remove(pid)
+            conjunto = _shingles(titulo, cita)
+            if conjunto:
+                pendientes.append((pid, digest, conjunto))
+                conteo['cambiadas' if anterior is not None else 'nuevas'] += 1
+        for pid in set(self.firmas) - vistos:
+            self.remove(pid)
+            conteo['eliminadas'] += 1
+
+        # Firmas de todo lo nuevo en lote
+        firmas = self.hasher.firmas([conjunto for _, _, conjunto in pendientes])
+        for (pid, digest, _), firma in zip(pendientes, firmas):
+            self._insertar(pid, firma, digest)
+        return conteo
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def similitud(self, a, b) -> float:
+        return float(np.mean(self.firmas[a] == self.firmas[b]))
+
+    def _candidatos(self, firma: np.ndarray) -> set:
+        candidatos = set()
+        for bucket, clave in zip(self.buckets, self._claves_banda(firma)):
+            candidatos.update(bucket.get(clave, ()))
+        return candidatos
+
+    def similares(self, titulo, cita_corta=None, umbral: float = UMBRAL_DEFAULT) -> list[tuple]:
+        """[(id_publicacion, similitud)] de mayor a menor, con similitud >= umbral."""
+        conjunto = shingles(titulo, cita_corta)
+        if not conjunto:
+            return []
+        firma = self.hasher.firma(conjunto)
+        resultado = []
+        for pid in self._candidatos(firma):
+            sim = float(np.mean(self.firmas[pid] == firma))
+            if sim >= umbral:
+                resultado.append((pid, round(sim, 3)))
+        return sorted(resultado, key=lambda x: (-x[1], x[0]))
+
+    def pares(self, umbral: float = UMBRAL_DEFAULT) -> list[tuple]:
+        """[(id_a, id_b, similitud)] de toda la tabla, revisando solo pares que comparten banda."""
+        candidatos = set()
+        for bucket in self.buckets:
+            for ids in bucket.values():
+                if len(ids) < 2:
+                    continue
+                ids = sorted(ids)
+                candidatos.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+
+        resultado = []
+        candidatos = sorted(candidatos)
+        for inicio in range(0, len(candidatos), LOTE_FIRMAS * 20):
+            bloque = candidatos[inicio:inicio + LOTE_FIRMAS * 20]
+            firmas_a = np.stack([self.firmas[a] for a, _ in bloque])
+            firmas_b = np.stack([self.firmas[b] for _, b in bloque])
+            sims = (firmas_a == firmas_b).mean(axis=1)
+            resultado.extend((a, b, round(float(sim), 3)) for (a, b), sim in zip(bloque, sims) if sim >= umbral)
+        return sorted(resultado, key=lambda x: (-x[2], x[0], x[1]))
+
+    # ─── Persistencia ─────────────────────────────────────────────────────────
+
+    def guardar(self, path: Path = CACHE_PATH) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ids = np.fromiter(self.firmas, dtype=np.int64, count=len(self.firmas))
+        firmas = np.stack([self.firmas[i] for i in ids]) if len(ids) else np.empty((0, self.num_perm), np.uint32)
+        digests = np.fromiter((self.digests[i] for i in ids), dtype=np.int64, count=len(ids))
+        tmp = path.with_name(path.stem + '.tmp.npz')
+        np.savez(tmp, ids=ids, firmas=firmas, digests=digests,
+                 parametros=np.array([self.num_perm, self.bandas, SHINGLE, SEMILLA], dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path: Path = CACHE_PATH, num_perm: int = NUM_PERM, bandas: int = BANDAS) -> 'PublicacionIndex':
+        """Índice guardado; vacío si no existe o se armó con otros parámetros."""
+        indice = cls(num_perm, bandas)
+        path = Path(path)
+        if not path.exists():
+            return indice
+        try:
+            datos = np.load(path)
+            parametros = datos['parametros'].tolist()
+        except (OSError, ValueError, KeyError):
+            return indice
+        if parametros != [num_perm, bandas, SHINGLE, SEMILLA]:
+            return indice
+        for pid, firma, digest in zip(datos['ids'].tolist(), datos['firmas'], datos['digests'].tolist()):
+            indice._insertar(pid, firma, digest)
+        return indice
+
+
+def load_index(supabase, path: Path = CACHE_PATH, reconstruir: bool = False, filas=None,
+               prefetch: bool = True) -> PublicacionIndex:
+    """
+    Carga el índice guardado, lo sincroniza con la tabla publicacion y lo
+    vuelve a guardar. Si el llamador ya leyó la tabla puede pasar `filas`
+    (id_publicacion, titulo, cita_corta) para no recorrerla otra vez.
+    """
+    indice = PublicacionIndex() if reconstruir else PublicacionIndex.cargar(path)
+    if filas is None:
+        filas = iter_rows(supabase, 'publicacion', 'id_publicacion, titulo, cita_corta',
+                          key='id_publicacion', prefetch=prefetch)
+    conteo = indice.sincronizar(filas)
+    if any(conteo.values()):
+        indice.guardar(path)
+    return indice
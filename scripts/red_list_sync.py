@@ -0,0 +1,178 @@
+"""
+Reconciliación de la Lista Roja UICN (taxon_catalogo_awe con catálogos de tipo 10).
+
+En lugar de consultar por especie si ya tiene categoría y después insertar o
+borrar y reinsertar, se leen todas las filas de Lista Roja actuales en una
+lectura paginada y se calcula en memoria el plan completo:
+- eliminaciones: filas sobrantes de especies con más de una categoría (se
+  conserva la que ya tiene la categoría deseada o, si no, la de id más bajo),
+- reasignaciones: la fila conservada cambia de catálogo,
+- inserciones: especies deseadas sin ninguna fila.
+
+El plan se aplica con un número fijo de peticiones (modo 'bulk': un delete con
+in_, un upsert y un insert por chunk) o con una sola llamada a
+public.sincronizar_lista_roja (modo 'rpc'), que repite el cálculo dentro de una
+transacción con advisory lock (ver
+supabase/migrations/20261017130000_sincronizar_lista_roja.sql). Como cada
+especie termina con una sola fila, no hace falta correr
+clean-duplicate-red-list.py después.
+
+Uso:
+    from red_list_sync import catalogo_resolver, load_catalogos, sync_red_list
+
+    obtener_id_catalogo = catalogo_resolver(load_catalogos(supabase))
+    deseado = {taxon_id: obtener_id_catalogo('EN'), ...}
+    plan = sync_red_list(supabase, deseado, dry_run=True)
+"""
+
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from supabase_fetch import fetch_all
+
+TIPO_LISTA_ROJA = 10
+MODOS = ('bulk', 'rpc')
+DEFAULT_CHUNK_SIZE = 500
+
+
+def load_catalogos(supabase) -> list[dict]:
+    return fetch_all(supabase, 'catalogo_awe', 'id_catalogo_awe, nombre, sigla', key='id_catalogo_awe',
+                     where=lambda q: q.eq('tipo_catalogo_awe_id', TIPO_LISTA_ROJA))
+
+
+def _normalizar(valor) -> str:
+    return str(valor).strip().upper().replace(' ', '').replace('(', '').replace(')', '')
+
+
+def catalogo_resolver(catalogos: list[dict]):
+    """
+    Devuelve obtener_id_catalogo(valor): valor del Excel ('EN', 'CR (PE)',
+    'Casi amenazada', ...) → id_catalogo_awe, o None. Compara sigla y nombre
+    sin mayúsculas, espacios ni paréntesis.
+    """
+    catalogo_map = {}
+    for cat in catalogos:
+        if cat['sigla']:
+            catalogo_map[_normalizar(cat['sigla'])] = cat['id_catalogo_awe']
+        catalogo_map.setdefault(_normalizar(cat['nombre']), cat['id_catalogo_awe'])
+    posiblemente_extinta = catalogo_map.get('CRPE') or next(
+        (id_cat for clave, id_cat in catalogo_map.items() if 'POSIBLEMENTEEXTINTA' in clave), None)
+
+    def obtener_id_catalogo(valor):
+        if valor is None or pd.isna(valor) or str(valor).strip() == '' or str(valor).lower() == 'nan':
+            return None
+        valor_normalizado = _normalizar(valor)
+        # "CR (PE)", "CR(PE)", "CR PE" -> Posiblemente extinta
+        if valor_normalizado.startswith('CR') and 'PE' in valor_normalizado:
+            return posiblemente_extinta
+        return catalogo_map.get(valor_normalizado)
+
+    return obtener_id_catalogo
+
+
+def load_current(supabase) -> list[dict]:
+    """Filas actuales de Lista Roja: id_taxon_catalogo_awe, taxon_id, catalogo_awe_id."""
+    filas = fetch_all(
+        supabase, 'taxon_catalogo_awe',
+        'id_taxon_catalogo_awe, taxon_id, catalogo_awe_id, catalogo_awe!inner(tipo_catalogo_awe_id)',
+        key='id_taxon_catalogo_awe',
+        where=lambda q: q.eq('catalogo_awe.tipo_catalogo_awe_id', TIPO_LISTA_ROJA),
+    )
+    return [{k: f[k] for k in ('id_taxon_catalogo_awe', 'taxon_id', 'catalogo_awe_id')} for f in filas]
+
+
+@dataclass
+class RedListPlan:
+    inserciones: list = field(default_factory=list)     # [{taxon_id, catalogo_awe_id}]
+    reasignaciones: list = field(default_factory=list)  # [{id_taxon_catalogo_awe, taxon_id, catalogo_awe_id}]
+    eliminaciones: list = field(default_factory=list)   # [fila actual sobrante]
+    sin_cambios: int = 0
+
+    @property
+    def vacio(self) -> bool:
+        return not (self.inserciones or self.reasignaciones or self.eliminaciones)
+
+
+def plan_sync(actual: list[dict], deseado: dict, solo_faltantes: bool = False) -> RedListPlan:
+    """
+    Plan para llevar `actual` a `deseado` ({taxon_id: catalogo_awe_id}).
+    Mismas reglas que public.sincronizar_lista_roja.
+    """
+    por_taxon = {}
+    for fila in sorted(actual, key=lambda f: f['id_taxon_catalogo_awe']):
+        por_taxon.setdefault(fila['taxon_id'], []).append(fila)
+
+    plan = RedListPlan()
+    for taxon_id, filas in por_taxon.items():
+        objetivo = deseado.get(taxon_id)
+        conservar = next((f for f in filas if f['catalogo_awe_id'] == objetivo), filas[0])
+        plan.eliminaciones.extend(f for f in filas if f is not conservar)
+        if objetivo is None:
+            continue
+        if conservar['catalogo_awe_id'] == objetivo or solo_faltantes:
+            plan.sin_cambios += 1
+        else:
+            plan.reasignaciones.append({
+                'id_taxon_catalogo_awe': conservar['id_taxon_catalogo_awe'],
+                'taxon_id': taxon_id,
+                'catalogo_awe_id': objetivo,
+            })
+
+    plan.inserciones = [{'taxon_id': t, 'catalogo_awe_id': c}
+                        for t, c in deseado.items() if c is not None and t not in por_taxon]
+    return plan
+
+
+def _chunks(filas, chunk_size):
+    return [filas[i:i + chunk_size] for i in range(0, len(filas), chunk_size)]
+
+
+def apply_plan(supabase, plan: RedListPlan, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Aplica el plan: primero borra, luego reasigna (upsert sobre la clave) y al
+    final inserta. No es transaccional; para eso está el modo 'rpc'.
+    """
+    ids = [f['id_taxon_catalogo_awe'] for f in plan.eliminaciones]
+    for chunk in _chunks(ids, chunk_size):
+        supabase.table('taxon_catalogo_awe').delete().in_('id_taxon_catalogo_awe', chunk).execute()
+    for chunk in _chunks(plan.reasignaciones, chunk_size):
+        supabase.table('taxon_catalogo_awe') \
+            .upsert(chunk, on_conflict='id_taxon_catalogo_awe', returning='minimal') \
+            .execute()
+    for chunk in _chunks(plan.inserciones, chunk_size):
+        supabase.table('taxon_catalogo_awe').insert(chunk, returning='minimal').execute()
+    return {
+        'eliminados': len(plan.eliminaciones),
+        'reasignados': len(plan.reasignaciones),
+        'insertados': len(plan.inserciones),
+    }
+
+
+def apply_rpc(supabase, deseado: dict, solo_faltantes: bool = False) -> dict:
+    pares = [{'taxon_id': t, 'catalogo_awe_id': c} for t, c in deseado.items() if c is not None]
+    resp = supabase.rpc('sincronizar_lista_roja', {
+        'p_asignaciones': pares,
+        'p_solo_faltantes': solo_faltantes,
+    }).execute()
+    return resp.data or {}
+
+
+def sync_red_list(supabase, deseado: dict, solo_faltantes: bool = False, modo: str = 'bulk',
+                  dry_run: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple[RedListPlan, dict]:
+    """
+    Calcula el plan contra el estado actual y, salvo dry_run, lo aplica.
+    Devuelve (plan, resultado) con resultado = {eliminados, reasignados, insertados}.
+    """
+    if modo not in MODOS:
+        raise ValueError(f'Modo desconocido: {modo} (usar {", ".join(MODOS)})')
+
+    plan = plan_sync(load_current(supabase), deseado, solo_faltantes)
+    print(f"🔎 Lista Roja: {len(plan.inserciones)} por insertar, {len(plan.reasignaciones)} por reasignar, "
+          f"{len(plan.eliminaciones)} duplicados por eliminar, {plan.sin_cambios} sin cambios")
+
+    if dry_run or plan.vacio:
+        return plan, {'eliminados': 0, 'reasignados': 0, 'insertados': 0}
+    if modo == 'rpc':
+        return plan, apply_rpc(supabase, deseado, solo_faltantes)
+    return plan, apply_plan(supabase, plan, chunk_size)
@@ -0,0 +1,174 @@
+"""
+Sincronización de columnas de una tabla a partir de un DataFrame (Excel).
+
+En lugar de un SELECT + UPDATE por fila del Excel:
+1. Se leen las columnas objetivo de la tabla en una sola lectura paginada
+   (supabase_fetch.fetch_all).
+2. Se calcula el diff contra el DataFrame deseado con operaciones de columna.
+   Un NaN/None en el DataFrame deseado significa "no tocar": no borra el valor
+   actual.
+3. Solo las filas con cambios se envían como upsert sobre la clave primaria,
+   por chunks. Un chunk que falla se reintenta por bisección para aislar las
+   filas problemáticas.
+
+Si el Excel ya está aplicado, una nueva ejecución hace una lectura y cero
+escrituras. Con dry_run=True solo se calcula (y opcionalmente se guarda) el
+reporte de diferencias.
+
+Las columnas `carry` se copian del valor actual a cada fila enviada: Postgres
+valida los NOT NULL de la fila propuesta antes de resolver el ON CONFLICT, así
+que el upsert debe incluirlas (p. ej. taxon_id en ficha_especie).
+
+Uso:
+    from sheet_sync import sync_from_frame
+
+    deseado = pd.DataFrame({'id_ficha_especie': [...], 'rango_altitudinal_min': [...]})
+    resultado = sync_from_frame(supabase, 'ficha_especie', 'id_ficha_especie',
+                                ['rango_altitudinal_min'], deseado,
+                                carry=['taxon_id'], dry_run=True)
+"""
+
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from supabase_fetch import fetch_all
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+@dataclass
+class SyncResult:
+    leidos: int = 0
+    sin_cambios: int = 0
+    actualizados: int = 0
+    errores: list = field(default_factory=list)
+    sin_fila: list = field(default_factory=list)   # claves del Excel que no existen en la tabla
+    cambios: pd.DataFrame | None = None            # clave, columna, antes, despues
+
+
+def _valores(serie: pd.Series) -> pd.Series:
+    """Normaliza para comparar: numéricos como float, el resto como objeto."""
+    numerica = pd.to_numeric(serie, errors='coerce')
+    if numerica.notna().sum() == serie.notna().sum():
+        return numerica.astype(float)
+    return serie.astype(object).where(serie.notna(), None)
+
+
+def _json_value(valor):
+    """Valor serializable para PostgREST (numpy → nativo, float entero → int)."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def diff_frame(actual: pd.DataFrame, deseado: pd.DataFrame, key: str, columns: list[str]) -> pd.DataFrame:
+    """
+    Diferencias entre `actual` y `deseado` (ambos con `key` + `columns`).
+    Devuelve formato largo: key, columna, antes, despues. Las claves de
+    `deseado` ausentes en `actual` se ignoran (ver missing_keys).
+    """
+    cruce = deseado.merge(actual, on=key, how='inner', suffixes=('_nuevo', '_actual'))
+    partes = []
+    for col in columns:
+        nuevo = _valores(cruce[f'{col}_nuevo'])
+        antes = _valores(cruce[f'{col}_actual'])
+        cambia = nuevo.notna() & (antes.isna() | (nuevo != antes))
+        if cambia.any():
+            partes.append(pd.DataFrame({
+                key: cruce.loc[cambia, key].values,
+                'columna': col,
+                'antes': cruce.loc[cambia, f'{col}_actual'].values,
+                'despues': cruce.loc[cambia, f'{col}_nuevo'].values,
+            }))
+    if not partes:
+        return pd.DataFrame(columns=[key, 'columna', 'antes', 'despues'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def missing_keys(actual: pd.DataFrame, deseado: pd.DataFrame, key: str) -> list:
+    return deseado.loc[~deseado[key].isin(actual[key]), key].tolist()
+
+
+def build_payload(actual: pd.DataFrame, cambios: pd.DataFrame, key: str,
+                  columns: list[str], carry: list[str] = ()) -> list[dict]:
+    """
+    Una fila por clave con cambios. Todas las filas llevan las mismas columnas
+    (key + carry + columns): las que no cambian conservan su valor actual, para
+    que PostgREST no rellene con NULL las ausentes en un upsert masivo.
+    """
+    if cambios.empty:
+        return []
+    filas = actual[actual[key].isin(cambios[key].unique())].set_index(key)[list(carry) + list(columns)].copy()
+    filas = filas.astype(object)
+    for fila in cambios.itertuples(index=False):
+        filas.at[getattr(fila, key), fila.columna] = fila.despues
+    return [
+        {key: _json_value(k), **{c: _json_value(v) for c, v in valores.items()}}
+        for k, valores in filas.to_dict(orient='index').items()
+    ]
+
+
+def _upsert_chunk(supabase, table, key, chunk, result):
+    try:
+        supabase.table(table).upsert(chunk, on_conflict=key, returning='minimal').execute()
+        result.actualizados += len(chunk)
+    except Exception as e:
+        if len(chunk) == 1:
+            result.errores.append((chunk[0][key], str(e)))
+            return
+        mid = len(chunk) // 2
+        _upsert_chunk(supabase, table, key, chunk[:mid], result)
+        _upsert_chunk(supabase, table, key, chunk[mid:], result)
+
+
+def sync_from_frame(supabase, table: str, key: str, columns: list[str], deseado: pd.DataFrame,
+                    carry: list[str] = (), where=None, dry_run: bool = False,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, report_path=None) -> SyncResult:
+    """
+    Lleva `columns` de `table` a los valores de `deseado` (DataFrame con `key`
+    + `columns`). Solo se escriben las filas que cambian.
+    """
+    deseado = deseado.drop_duplicates(subset=[key], keep='last')
+    seleccion = ', '.join(dict.fromkeys([key, *carry, *columns]))
+    actual = pd.DataFrame(fetch_all(supabase, table, seleccion, key=key, where=where),
+                          columns=[key, *dict.fromkeys([*carry, *columns])])
+
+    result = SyncResult(leidos=len(actual))
+    result.cambios = diff_frame(actual, deseado[[key, *columns]], key, columns)
+    result.sin_fila = missing_keys(actual, deseado, key)
+    con_cambios = result.cambios[key].nunique()
+    result.sin_cambios = len(deseado) - len(result.sin_fila) - con_cambios
+
+    if report_path is not None and not result.cambios.empty:
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        result.cambios.to_csv(report_path, index=False)
+
+    print(f"🔎 {table}: {result.leidos} filas leídas, {con_cambios} con cambios, "
+          f"{result.sin_cambios} sin cambios, {len(result.sin_fila)} sin fila en la tabla")
+    if dry_run or not con_cambios:
+        return result
+
+    payload = build_payload(actual, result.cambios, key, columns, carry)
+    for i in range(0, len(payload), chunk_size):
+        _upsert_chunk(supabase, table, key, payload[i:i + chunk_size], result)
+        print(f"  📤 Enviadas {min(i + chunk_size, len(payload))}/{len(payload)} filas")
+    return result
+
+
+def print_changes(cambios: pd.DataFrame, etiquetas: dict | None = None, limite: int = 20) -> None:
+    """Muestra las primeras diferencias; `etiquetas` traduce la clave a un nombre legible."""
+    if cambios is None or cambios.empty:
+        print("  (sin diferencias)")
+        return
+    key = cambios.columns[0]
+    for fila in cambios.head(limite).itertuples(index=False):
+        k = getattr(fila, key)
+        nombre = (etiquetas or {}).get(k, k)
+        print(f"    {nombre}: {fila.columna} {fila.antes!r} → {fila.despues!r}")
+    if len(cambios) > limite:
+        print(f"    ... y {len(cambios) - limite} cambios más")
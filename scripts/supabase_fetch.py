@@ -0,0 +1,123 @@
+"""
+Lectura paginada de tablas y vistas de Supabase.
+
+PostgREST corta cada respuesta en el max-rows del proyecto (1000 por defecto),
+así que un `.select(...).execute()` sin paginar devuelve datos incompletos sin
+avisar. Aquí se pagina por keyset sobre la clave primaria
+(`WHERE key > último ORDER BY key LIMIT n`) en lugar de OFFSET, que obliga a
+Postgres a recorrer y descartar todas las filas anteriores en cada página.
+
+- iter_pages/iter_rows son generadores; con prefetch=True piden la página
+  siguiente en segundo plano mientras se procesa la actual.
+- fetch_all devuelve una lista; con workers > 1 (clave entera) parte el rango
+  [min, max] de la clave en tramos que se recorren en paralelo.
+
+`where` recibe el query builder y agrega los filtros (eq, in_, is_, ...); no
+debe ordenar ni limitar. page_size no puede superar el max-rows del proyecto:
+una página más corta que page_size se toma como la última.
+
+Uso:
+    from supabase_fetch import fetch_all, iter_rows
+
+    especies = fetch_all(supabase, 'taxon', 'id_taxon, taxon, taxon_id', key='id_taxon',
+                         where=lambda q: q.eq('rank_id', 7))
+    for fila in iter_rows(supabase, 'coleccion_externa', 'id, fecha', key='id', prefetch=True):
+        ...
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_SIZE = 1000
+
+
+def _with_key(columns: str, key: str) -> str:
+    """Agrega la clave a la selección si no está: hace falta para pedir la página siguiente."""
+    if columns.strip() == '*' or re.search(rf'(^|,)\s*{re.escape(key)}\s*(,|$)', columns):
+        return columns
+    return f'{columns}, {key}'
+
+
+def _fetch_page(supabase, table, columns, key, where, after, upto, page_size):
+    q = supabase.table(table).select(columns)
+    if where is not None:
+        q = where(q)
+    if after is not None:
+        q = q.gt(key, after)
+    if upto is not None:
+        q = q.lt(key, upto)
+    return q.order(key).limit(page_size).execute().data or []
+
+
+def _scan(fetch, key, page_size, after=None, prefetch=False):
+    """Recorre páginas con fetch(after) hasta una página incompleta."""
+    if not prefetch:
+        while True:
+            page = fetch(after)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = page[-1][key]
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(fetch, after)
+        while pending is not None:
+            page = pending.result()
+            pending = pool.submit(fetch, page[-1][key]) if len(page) == page_size else None
+            if page:
+                yield page
+
+
+def iter_pages(supabase, table: str, columns: str, key: str, where=None,
+               page_size: int = PAGE_SIZE, prefetch: bool = False):
+    """Genera listas de filas ordenadas por `key`, página a página."""
+    columns = _with_key(columns, key)
+
+    def fetch(after):
+        return _fetch_page(supabase, table, columns, key, where, after, None, page_size)
+
+    yield from _scan(fetch, key, page_size, prefetch=prefetch)
+
+
+def iter_rows(supabase, table: str, columns: str, key: str, where=None,
+              page_size: int = PAGE_SIZE, prefetch: bool = False):
+    """Genera las filas una a una (ver iter_pages)."""
+    for page in iter_pages(supabase, table, columns, key, where, page_size, prefetch):
+        yield from page
+
+
+def _key_edge(supabase, table, key, where, desc):
+    q = supabase.table(table).select(key)
+    if where is not None:
+        q = where(q)
+    data = q.order(key, desc=desc).limit(1).execute().data
+    return data[0][key] if data else None
+
+
+def fetch_all(supabase, table: str, columns: str, key: str, where=None,
+              page_size: int = PAGE_SIZE, workers: int = 1) -> list[dict]:
+    """
+    Todas las filas de `table` que cumplen `where`, ordenadas por `key`.
+
+    Con workers > 1 la clave debe ser entera: se leen su mínimo y máximo y cada
+    tramo se recorre por keyset en un hilo distinto.
+    """
+    if workers <= 1:
+        return [row for page in iter_pages(supabase, table, columns, key, where, page_size) for row in page]
+
+    lo = _key_edge(supabase, table, key, where, desc=False)
+    if lo is None:
+        return []
+    hi = _key_edge(supabase, table, key, where, desc=True)
+    step = (hi - lo) // workers + 1
+    bounds = [lo + i * step for i in range(workers)] + [None]
+    columns = _with_key(columns, key)
+
+    def scan_range(i):
+        def fetch(after):
+            return _fetch_page(supabase, table, columns, key, where, after, bounds[i + 1], page_size)
+        return [row for page in _scan(fetch, key, page_size, after=bounds[i] - 1) for row in page]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [row for part in pool.map(scan_range, range(workers)) for row in part]
@@ -0,0 +1,197 @@
+"""
+Índice de sinónimos y combinaciones históricas → id_taxon vigente.
+
+Muchas planillas (location_species_corrected.xlsx, el catálogo de cantos...)
+usan combinaciones antiguas: otro género para la misma especie u otra familia
+para el mismo género. El lookup exacto falla y los loaders caen a género o
+familia, o dejan la fila para corregir a mano. Este índice junta:
+- de taxon: las filas marcadas como sinónimo (sinonimo = true o
+  nombre_aceptado = false) con id_taxon_correcto, siguiendo la cadena hasta el
+  nombre aceptado. Un género sinónimo agrega además '<género viejo> <epíteto>'
+  para todas las especies del género vigente.
+- del Excel de Coloma–Duellman: la familia vigente de cada género, para
+  reconocer (familia anterior, género, especie).
+
+Todo queda en diccionarios (consulta O(1)) y se guarda en .cache/sinonimos.json
+junto a la firma del snapshot de taxonomía y del Excel; mientras ninguna
+cambie, los loaders lo leen del archivo en lugar de reconstruirlo.
+
+Uso:
+    from synonym_index import load_synonyms
+    from taxonomy_cache import load_taxonomy
+
+    tax = load_taxonomy(supabase)
+    sinonimos = load_synonyms(tax)
+    sinonimos.species('Leptodactylidae', 'Eleutherodactylus', 'unistrigatus')
+    NameResolver(tax, sinonimos=sinonimos)
+"""
+
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from name_resolver import normalizar_nombre
+from taxonomy_cache import RANK_ESPECIE, RANK_FAMILIA, RANK_GENERO, TaxonomySnapshot, _norm
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = ROOT_DIR / '.cache' / 'sinonimos.json'
+EXCEL_PATH = ROOT_DIR / 'AnfibiosEcuador a 26 Noviembre 2025. Actualizado de Coloma Duellman 2025.xlsx'
+
+
+def es_sinonimo(t: dict) -> bool:
+    return bool(t.get('id_taxon_correcto')) and (t.get('sinonimo') or t.get('nombre_aceptado') is False)
+
+
+class SynonymIndex:
+    """
+    binomios['genero especie']  id de la especie vigente (nombres históricos, minúsculas)
+    generos['genero']           id del género vigente (incluye géneros sinónimos)
+    familia_de_genero['genero'] familia vigente según el Excel
+    aceptado_de[id_taxon]       id aceptado de cada taxon sinónimo
+    """
+
+    def __init__(self, binomios: dict, generos: dict, familia_de_genero: dict, aceptado_de: dict,
+                 signature: dict | None = None):
+        self.binomios = binomios
+        self.generos = generos
+        self.familia_de_genero = familia_de_genero
+        self.aceptado_de = aceptado_de
+        self.signature = signature or {}
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def aceptado(self, tid: int | None) -> int | None:
+        """Id vigente: el propio tid si no es sinónimo."""
+        return self.aceptado_de.get(tid, tid)
+
+    def binomial(self, nombre: str) -> int | None:
+        return self.binomios.get(normalizar_nombre(nombre))
+
+    def species(self, familia, genero, especie) -> int | None:
+        """(familia, género, especie) de una planilla → especie vigente; la familia no se exige."""
+        if not (genero and especie):
+            return None
+        return self.binomios.get(normalizar_nombre(f'{genero} {especie}'))
+
+    def genus(self, familia, genero) -> int | None:
+        """Género vigente aunque la planilla lo ponga en otra familia."""
+        return self.generos.get(_norm(genero))
+
+    def familia_reasignada(self, familia, genero) -> bool:
+        """True si la planilla pone el género en una familia distinta de la vigente."""
+        vigente = self.familia_de_genero.get(_norm(genero))
+        return bool(familia and vigente and _norm(familia) != vigente)
+
+    # ─── Persistencia ─────────────────────────────────────────────────────────
+
+    def to_json(self) -> dict:
+        return {
+            'signature': self.signature,
+            'binomios': self.binomios,
+            'generos': self.generos,
+            'familia_de_genero': self.familia_de_genero,
+            # JSON no tiene claves enteras
+            'aceptado_de': [[k, v] for k, v in self.aceptado_de.items()],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'SynonymIndex':
+        return cls(data['binomios'], data['generos'], data['familia_de_genero'],
+                   {k: v for k, v in data['aceptado_de']}, signature=data.get('signature'))
+
+
+def _cadena_aceptada(tax: TaxonomySnapshot) -> dict:
+    """id sinónimo → id aceptado, siguiendo id_taxon_correcto; se corta si hay ciclo."""
+    aceptado_de = {}
+    for t in tax.taxa:
+        if not es_sinonimo(t):
+            continue
+        actual, vistos = t['id_taxon'], set()
+        while actual in tax.by_id and es_sinonimo(tax.by_id[actual]) and actual not in vistos:
+            vistos.add(actual)
+            actual = tax.by_id[actual]['id_taxon_correcto']
+        if actual in tax.by_id and actual != t['id_taxon']:
+            aceptado_de[t['id_taxon']] = actual
+    return aceptado_de
+
+
+def build_synonyms(tax: TaxonomySnapshot, excel: pd.DataFrame | None = None) -> SynonymIndex:
+    aceptado_de = _cadena_aceptada(tax)
+
+    # Nombres vigentes primero; los históricos no los pisan
+    binomios = {}
+    generos = {}
+    for t in tax.taxa:
+        if t['id_taxon'] in aceptado_de:
+            continue
+        if t['rank_id'] == RANK_ESPECIE:
+            binomios.setdefault(normalizar_nombre(tax.scientific_name(t['id_taxon'])), t['id_taxon'])
+        elif t['rank_id'] == RANK_GENERO:
+            generos.setdefault(_norm(t['taxon']), t['id_taxon'])
+
+    especies_de_genero = {}
+    for t in tax.of_rank(RANK_ESPECIE):
+        if t['id_taxon'] not in aceptado_de:
+            gen = tax.ancestor(t['id_taxon'], RANK_GENERO)
+            especies_de_genero.setdefault(gen, []).append(t['id_taxon'])
+
+    for sinonimo, vigente in aceptado_de.items():
+        t = tax.by_id[sinonimo]
+        if t['rank_id'] == RANK_ESPECIE:
+            binomios.setdefault(normalizar_nombre(tax.scientific_name(sinonimo)), vigente)
+        elif t['rank_id'] == RANK_GENERO:
+            viejo = _norm(t['taxon'])
+            generos.setdefault(viejo, vigente)
+            for tid in especies_de_genero.get(vigente, ()):
+                epiteto = _norm(tax.by_id[tid]['taxon'])
+                binomios.setdefault(f'{viejo} {epiteto}', tid)
+
+    familia_de_genero = {}
+    for tid in generos.values():
+        fam = tax.ancestor(tid, RANK_FAMILIA)
+        if fam is not None:
+            familia_de_genero[_norm(tax.by_id[tid]['taxon'])] = _norm(tax.by_id[fam]['taxon'])
+    if excel is not None:
+        species_col = next((c for c in excel.columns if 'species' in str(c).lower()), None)
+        family_col = next((c for c in excel.columns if str(c).strip().lower() in ('family', 'familly', 'familia')),
+                          None)
+        if species_col is not None and family_col is not None:
+            filas = excel[[species_col, family_col]].dropna()
+            for especie, familia in filas.itertuples(index=False):
+                genero = normalizar_nombre(especie).partition(' ')[0]
+                if genero:
+                    familia_de_genero[genero] = _norm(familia)
+
+    return SynonymIndex(binomios, generos, familia_de_genero, aceptado_de)
+
+
+def _excel_signature(path: Path) -> list | None:
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def load_synonyms(tax: TaxonomySnapshot, excel_path: Path = EXCEL_PATH,
+                  path: Path = CACHE_PATH, refresh: bool = False) -> SynonymIndex:
+    """Índice desde .cache/sinonimos.json si la firma coincide; si no, lo reconstruye y lo guarda."""
+    excel_path, path = Path(excel_path), Path(path)
+    signature = {'taxonomia': tax.signature, 'creado': tax.created_at, 'excel': _excel_signature(excel_path)}
+    if not refresh and path.exists():
+        try:
+            cached = SynonymIndex.from_json(json.loads(path.read_text(encoding='utf-8')))
+        except (ValueError, KeyError):
+            cached = None
+        if cached and cached.signature == signature:
+            return cached
+
+    excel = pd.read_excel(excel_path) if excel_path.exists() else None
+    index = build_synonyms(tax, excel)
+    index.signature = signature
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(index.to_json(), ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+    return index
@@ -0,0 +1,103 @@
+"""
+Planificador de carga de tablas según dependencias de Foreign Keys.
+
+Construye un DAG a partir de las FKs declaradas en la configuración de cada
+loader y ejecuta las tablas independientes en paralelo con un pool acotado de
+hilos. Cada tabla arranca en cuanto terminan todas sus tablas padre, de modo
+que la lectura del Excel y el I/O de red de ramas distintas se solapan.
+
+Uso:
+    from table_scheduler import build_dependencies, run_dag
+
+    deps = build_dependencies({'campobase': {'salida'}, 'salida': set()})
+    results, errors = run_dag(['salida', 'campobase'], deps, cargar, max_workers=4)
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 4
+
+
+def build_dependencies(fks_by_table):
+    """
+    Normaliza {tabla: iterable de tablas padre} a {tabla: set(padres)}.
+
+    Se ignoran auto-referencias y padres que no están en la carga (por ejemplo
+    tablas ya existentes en la BD), ya que no hay nada que esperar de ellos.
+    """
+    tables = set(fks_by_table)
+    return {
+        table: {p for p in parents if p in tables and p != table}
+        for table, parents in fks_by_table.items()
+    }
+
+
+def topological_order(nodes, deps):
+    """Orden topológico estable (respeta el orden de `nodes`); error si hay ciclos."""
+    pending = {n: set(deps.get(n, ())) for n in nodes}
+    order = []
+    while pending:
+        ready = [n for n in nodes if n in pending and not pending[n]]
+        if not ready:
+            raise ValueError(f"Ciclo de dependencias entre: {', '.join(sorted(pending))}")
+        for n in ready:
+            order.append(n)
+            del pending[n]
+        for parents in pending.values():
+            parents.difference_update(ready)
+    return order
+
+
+def run_dag(nodes, deps, worker, max_workers=DEFAULT_WORKERS):
+    """
+    Ejecuta worker(nodo) para cada nodo respetando `deps` ({nodo: set(padres)}).
+
+    El orden de `nodes` define la prioridad entre nodos listos al mismo tiempo.
+    Si un nodo falla, sus descendientes no se ejecutan.
+
+    Devuelve (resultados {nodo: valor}, errores {nodo: excepción o mensaje}).
+    """
+    topological_order(nodes, deps)  # valida que no haya ciclos
+
+    remaining = {n: set(deps.get(n, ())) for n in nodes}
+    children = {n: [] for n in nodes}
+    for n in nodes:
+        for parent in remaining[n]:
+            children[parent].append(n)
+
+    results = {}
+    errors = {}
+
+    def skip_descendants(node):
+        for child in children[node]:
+            if child in remaining:
+                del remaining[child]
+                errors[child] = f"omitida: depende de '{node}', que falló"
+                skip_descendants(child)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        running = {}
+
+        def submit_ready():
+            for n in nodes:
+                if n in remaining and not remaining[n]:
+                    del remaining[n]
+                    running[pool.submit(worker, n)] = n
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    errors[node] = e
+                    skip_descendants(node)
+                    continue
+                for child in children[node]:
+                    if child in remaining:
+                        remaining[child].discard(node)
+            submit_ready()
+
+    return results, errors
@@ -0,0 +1,63 @@
+"""
+Eliminación y fusión de taxones con public.fusionar_taxones.
+
+La función (supabase/migrations/20261017140000_fusionar_taxones.sql) hace en
+una sola transacción lo que antes eran tres DELETE por taxon desde Python
+(taxon_catalogo_awe, ficha_especie, taxon): reasigna al destino todas las
+referencias, descarta lo que el destino ya tiene y borra el taxon. Si algo
+falla a mitad no quedan filas huérfanas.
+
+Aquí se envía una llamada por chunk de pares. Un chunk que falla (p. ej. un
+taxon a eliminar que todavía tiene fotografías) se parte en mitades hasta
+aislar los pares problemáticos; el resto se aplica igual.
+
+Uso:
+    from taxon_dedup import fusionar_taxones
+
+    pares = [{'id_taxon': 812, 'id_taxon_destino': 45},      # fusionar 812 en 45
+             {'id_taxon': 913, 'id_taxon_destino': None}]    # eliminar 913
+    resumen, errores = fusionar_taxones(supabase, pares)
+"""
+
+from collections import Counter
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def _fusionar_chunk(supabase, chunk, resumen, errores):
+    try:
+        resp = supabase.rpc('fusionar_taxones', {'p_pares': chunk}).execute()
+        resumen.update({k: v for k, v in (resp.data or {}).items() if v})
+    except Exception as e:
+        if len(chunk) == 1:
+            errores.append((chunk[0], str(e)))
+            return
+        mid = len(chunk) // 2
+        _fusionar_chunk(supabase, chunk[:mid], resumen, errores)
+        _fusionar_chunk(supabase, chunk[mid:], resumen, errores)
+
+
+def fusionar_taxones(supabase, pares: list[dict], chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Aplica [{'id_taxon': ..., 'id_taxon_destino': ... | None}, ...] por chunks.
+
+    Devuelve (resumen, errores): resumen es un Counter {'tabla.accion': filas}
+    sumado sobre todos los chunks; errores, [(par, mensaje)] de los pares que
+    no se pudieron aplicar.
+    """
+    resumen = Counter()
+    errores = []
+    for i in range(0, len(pares), chunk_size):
+        chunk = pares[i:i + chunk_size]
+        _fusionar_chunk(supabase, chunk, resumen, errores)
+        print(f"  📊 Progreso: {min(i + chunk_size, len(pares))}/{len(pares)} taxones procesados...")
+    return resumen, errores
+
+
+def print_resumen(resumen: Counter) -> None:
+    """Filas afectadas por tabla, para auditoría."""
+    if not resumen:
+        print("  (sin filas afectadas)")
+        return
+    for clave, filas in sorted(resumen.items()):
+        print(f"    {clave}: {filas}")
@@ -0,0 +1,227 @@
+"""
+Snapshot de la taxonomía (taxon, ficha_especie, rank) compartido entre scripts.
+
+La primera llamada descarga las tres tablas (paginadas, ver supabase_fetch.py)
+y las guarda en .cache/taxonomia.json. Las siguientes reutilizan el archivo
+mientras:
+- no haya pasado el TTL (por defecto 6 horas), y
+- la firma de cada tabla (número de filas + id máximo) siga igual. Comprobarla
+  son dos consultas mínimas por tabla en lugar de descargarlas completas.
+
+Las tablas no tienen updated_at, así que un UPDATE en sitio (renombrar un taxon)
+no cambia la firma: para eso está el TTL, y los scripts que modifican taxon o
+ficha_especie llaman a invalidate() al terminar.
+
+Índices O(1) disponibles en el snapshot:
+    by_id[id_taxon]                       fila de taxon
+    by_binomial['genero especie']         id de la especie (minúsculas)
+    by_epithet['especie']                 [ids de especies con ese epíteto]
+    by_family['familia']                  id de la familia
+    by_genus_name['genero']               id del género
+    by_genus[(familia, genero)]           id del género
+    by_species[(familia, genero, especie)] id de la especie
+    ancestors[id_taxon]                   (padre, abuelo, ...) hasta la raíz
+    ficha_by_taxon[id_taxon]              id_ficha_especie
+
+Uso:
+    from taxonomy_cache import load_taxonomy
+
+    tax = load_taxonomy(supabase)
+    tax.species_id('Pristimantis unistrigatus')
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from supabase_fetch import fetch_all
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = ROOT_DIR / '.cache' / 'taxonomia.json'
+DEFAULT_TTL = 6 * 3600  # segundos
+
+RANK_ORDEN = 4
+RANK_FAMILIA = 5
+RANK_GENERO = 6
+RANK_ESPECIE = 7
+
+# (tabla, clave primaria, columnas)
+TABLES = (
+    ('taxon', 'id_taxon', 'id_taxon, taxon, taxon_id, rank_id, sinonimo, nombre_aceptado, id_taxon_correcto'),
+    ('ficha_especie', 'id_ficha_especie', 'id_ficha_especie, taxon_id'),
+    ('rank', 'id_rank', 'id_rank, rank, orden'),
+)
+
+
+def _norm(texto) -> str:
+    return ' '.join(str(texto or '').split()).lower()
+
+
+class TaxonomySnapshot:
+    """Filas de taxon/ficha_especie/rank más los índices construidos a partir de ellas."""
+
+    def __init__(self, taxa: list[dict], fichas: list[dict], ranks: list[dict],
+                 signature: dict | None = None, created_at: float | None = None):
+        self.taxa = taxa
+        self.fichas = fichas
+        self.ranks = ranks
+        self.signature = signature or {}
+        self.created_at = created_at or time.time()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self.by_id = {t['id_taxon']: t for t in self.taxa}
+        self.rank_name = {r['id_rank']: r['rank'] for r in self.ranks}
+        self.ficha_by_taxon = {f['taxon_id']: f['id_ficha_especie'] for f in self.fichas}
+
+        self.ancestors = {}
+        for tid in self.by_id:
+            self._ancestors_of(tid)
+
+        self.by_family = {}
+        self.by_genus_name = {}
+        self.by_genus = {}
+        self.by_species = {}
+        self.by_binomial = {}
+        self.by_epithet = {}
+
+        for t in self.taxa:
+            name = _norm(t['taxon'])
+            if not name:
+                continue
+            rank = t['rank_id']
+            if rank == RANK_FAMILIA:
+                self.by_family[name] = t['id_taxon']
+                continue
+            fam = self._ancestor_name(t['id_taxon'], RANK_FAMILIA)
+            if rank == RANK_GENERO:
+                self.by_genus_name.setdefault(name, t['id_taxon'])
+                if fam:
+                    self.by_genus[(fam, name)] = t['id_taxon']
+            elif rank == RANK_ESPECIE:
+                gen = self._ancestor_name(t['id_taxon'], RANK_GENERO)
+                self.by_epithet.setdefault(name, []).append(t['id_taxon'])
+                if gen:
+                    self.by_binomial[f'{gen} {name}'] = t['id_taxon']
+                    if fam:
+                        self.by_species[(fam, gen, name)] = t['id_taxon']
+
+    def _ancestors_of(self, tid) -> tuple:
+        """Cadena de ancestros memoizada; se corta si hay un ciclo en taxon_id."""
+        if tid in self.ancestors:
+            return self.ancestors[tid]
+        chain = []
+        seen = {tid}
+        parent = self.by_id[tid].get('taxon_id')
+        while parent is not None and parent in self.by_id and parent not in seen:
+            if parent in self.ancestors:
+                chain.append(parent)
+                chain.extend(a for a in self.ancestors[parent] if a not in seen)
+                break
+            chain.append(parent)
+            seen.add(parent)
+            parent = self.by_id[parent].get('taxon_id')
+        self.ancestors[tid] = tuple(chain)
+        return self.ancestors[tid]
+
+    def _ancestor_name(self, tid, rank_id) -> str | None:
+        for a in self.ancestors.get(tid, ()):
+            if self.by_id[a]['rank_id'] == rank_id:
+                return _norm(self.by_id[a]['taxon'])
+        return None
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def species_id(self, binomial: str) -> int | None:
+        """'Genero especie' (sin importar mayúsculas ni espacios extra) → id_taxon."""
+        return self.by_binomial.get(_norm(binomial))
+
+    def scientific_name(self, tid: int) -> str | None:
+        """Nombre científico: binomio para especies, el propio taxon para el resto."""
+        t = self.by_id.get(tid)
+        if t is None:
+            return None
+        if t['rank_id'] == RANK_ESPECIE:
+            gen = next((self.by_id[a]['taxon'].strip() for a in self.ancestors[tid]
+                        if self.by_id[a]['rank_id'] == RANK_GENERO), None)
+            if gen:
+                return f"{gen} {t['taxon'].strip()}"
+        return t['taxon'].strip()
+
+    def ancestor(self, tid: int, rank_id: int) -> int | None:
+        """Id del ancestro (o el propio taxon) con el rango dado."""
+        if tid in self.by_id and self.by_id[tid]['rank_id'] == rank_id:
+            return tid
+        return next((a for a in self.ancestors.get(tid, ()) if self.by_id[a]['rank_id'] == rank_id), None)
+
+    def of_rank(self, rank_id: int) -> list[dict]:
+        return [t for t in self.taxa if t['rank_id'] == rank_id]
+
+    # ─── Persistencia ─────────────────────────────────────────────────────────
+
+    def to_json(self) -> dict:
+        return {
+            'created_at': self.created_at,
+            'signature': self.signature,
+            'taxon': self.taxa,
+            'ficha_especie': self.fichas,
+            'rank': self.ranks,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'TaxonomySnapshot':
+        return cls(data['taxon'], data['ficha_especie'], data['rank'],
+                   signature=data.get('signature'), created_at=data.get('created_at'))
+
+
+def table_signature(supabase, table: str, key: str) -> list:
+    """[número de filas, id máximo] de la tabla."""
+    count = supabase.table(table).select(key, count='exact', head=True).execute().count
+    top = supabase.table(table).select(key).order(key, desc=True).limit(1).execute().data
+    return [count, top[0][key] if top else None]
+
+
+def current_signature(supabase) -> dict:
+    with ThreadPoolExecutor(max_workers=len(TABLES)) as pool:
+        futures = {table: pool.submit(table_signature, supabase, table, key) for table, key, _ in TABLES}
+    return {table: f.result() for table, f in futures.items()}
+
+
+def fetch_snapshot(supabase) -> TaxonomySnapshot:
+    """Descarga las tres tablas en paralelo."""
+    with ThreadPoolExecutor(max_workers=len(TABLES)) as pool:
+        futures = {table: pool.submit(fetch_all, supabase, table, columns, key) for table, key, columns in TABLES}
+    data = {table: f.result() for table, f in futures.items()}
+    signature = {table: [len(rows), max((r[key] for r in rows), default=None)]
+                 for (table, key, _), rows in zip(TABLES, data.values())}
+    return TaxonomySnapshot(data['taxon'], data['ficha_especie'], data['rank'], signature=signature)
+
+
+def load_taxonomy(supabase, ttl: float = DEFAULT_TTL, refresh: bool = False,
+                  path: Path = CACHE_PATH) -> TaxonomySnapshot:
+    """
+    Devuelve el snapshot desde el caché si sigue vigente (TTL y firma);
+    si no, lo descarga y reescribe el archivo.
+    """
+    path = Path(path)
+    if not refresh and path.exists():
+        try:
+            cached = TaxonomySnapshot.from_json(json.loads(path.read_text(encoding='utf-8')))
+        except (ValueError, KeyError):
+            cached = None
+        if cached and time.time() - cached.created_at < ttl and cached.signature == current_signature(supabase):
+            return cached
+
+    snapshot = fetch_snapshot(supabase)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(snapshot.to_json(), ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+    return snapshot
+
+
+def invalidate(path: Path = CACHE_PATH) -> None:
+    """Borra el caché; llamar tras modificar taxon o ficha_especie."""
+    Path(path).unlink(missing_ok=True)
@@ -0,0 +1,176 @@
+"""
+Índice de ubicacion_especie existentes para decidir insertar vs. actualizar.
+
+Las filas se leen por keyset (iter_pages de supabase_fetch, sin tope de
+max-rows) y de cada una se guarda solo un digest de 64 bits de la clave
+normalizada (ficha, taxon, lat, lon, voucher, localidad) junto a su
+id_ubicacion_especie, en dos arreglos numpy ordenados. Buscar un lote completo
+es un searchsorted; no quedan tuplas de floats en memoria.
+
+La normalización es la de siempre: coordenadas redondeadas a 6 decimales,
+texto sin espacios de borde, y 0 / '' cuentan como vacío. Ficha y taxon van
+como enteros: una página con algún NULL en esas columnas llega a pandas como
+float64 (100.0) y debe dar el mismo digest que la hoja (100).
+
+Modo con tolerancia (tolerancia_m): además, un punto a menos de N metros de
+uno existente con la misma ficha, taxon y voucher es el mismo registro. Esos
+puntos van a una grilla de celdas de ~N metros y cada consulta revisa solo las
+9 celdas vecinas.
+
+Uso:
+    from ubicacion_dedup import load_index
+
+    indice = load_index(supabase, tolerancia_m=50)
+    ids = indice.lookup(frame)    # Series id_ubicacion_especie (NA si es nuevo)
+"""
+
+import hashlib
+import math
+
+import numpy as np
+import pandas as pd
+
+from supabase_fetch import iter_pages
+
+COLUMNAS = ['id_ubicacion_especie', 'id_ficha_especie', 'id_taxon', 'latitud', 'longitud', 'voucher', 'localidad']
+METROS_POR_GRADO = 111_320
+
+
+def _coord(v):
+    return round(float(v), 6) if v and not pd.isna(v) else None
+
+
+def _entero(v):
+    return None if v is None or pd.isna(v) else int(v)
+
+
+def _texto(v):
+    if v is None or (isinstance(v, float) and pd.isna(v)) or not v:
+        return None
+    return str(v).strip()
+
+
+def normalized_key(ficha, taxon, lat, lon, voucher, localidad) -> str:
+    partes = (_entero(ficha), _entero(taxon), _coord(lat), _coord(lon), _texto(voucher), _texto(localidad))
+    return '\x1f'.join('' if p is None else str(p) for p in partes)
+
+
+def digest64(clave: str) -> int:
+    return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _digests(ficha, taxon, lat, lon, voucher, localidad) -> np.ndarray:
+    return np.fromiter(
+        (digest64(normalized_key(*fila)) for fila in zip(ficha, taxon, lat, lon, voucher, localidad)),
+        dtype=np.uint64, count=len(ficha),
+    )
+
+
+class UbicacionIndex:
+    def __init__(self, tolerancia_m: float | None = None):
+        self.tolerancia_m = tolerancia_m
+        self._digests = np.empty(0, dtype=np.uint64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._partes = []
+        # (ficha, taxon, voucher, celda_lat, celda_lon) → [(lat, lon, id)]
+        self.grilla = {}
+        self.celda_grados = tolerancia_m / METROS_POR_GRADO if tolerancia_m else None
+
+    def __len__(self):
+        return len(self._ids) + sum(len(ids) for _, ids in self._partes)
+
+    # ─── Construcción ─────────────────────────────────────────────────────────
+
+    def add_rows(self, filas: list[dict]) -> None:
+        if not filas:
+            return
+        df = pd.DataFrame(filas, columns=COLUMNAS)
+        self._partes.append((
+            _digests(df['id_ficha_especie'], df['id_taxon'], df['latitud'], df['longitud'],
+                     df['voucher'], df['localidad']),
+            df['id_ubicacion_especie'].to_numpy(dtype=np.int64),
+        ))
+        if self.tolerancia_m:
+            for fila in df.itertuples(index=False):
+                self._add_punto(fila.id_ficha_especie, fila.id_taxon, fila.voucher,
+                                fila.latitud, fila.longitud, fila.id_ubicacion_especie)
+
+    def finish(self) -> 'UbicacionIndex':
+        """Junta las páginas en arreglos ordenados por digest."""
+        if self._partes:
+            digests = np.concatenate([self._digests] + [d for d, _ in self._partes])
+            ids = np.concatenate([self._ids] + [i for _, i in self._partes])
+            orden = np.argsort(digests, kind='stable')
+            self._digests, self._ids = digests[orden], ids[orden]
+            self._partes = []
+        return self
+
+    def _celda(self, lat, lon) -> tuple[int, int]:
+        # Celdas de ~N metros: en longitud se corrige por la latitud
+        escala = max(math.cos(math.radians(lat)), 1e-6)
+        return math.floor(lat / self.celda_grados), math.floor(lon * escala / self.celda_grados)
+
+    def _add_punto(self, ficha, taxon, voucher, lat, lon, id_ubicacion):
+        voucher, lat, lon = _texto(voucher), _coord(lat), _coord(lon)
+        if voucher is None or lat is None or lon is None:
+            return
+        celda = self._celda(lat, lon)
+        self.grilla.setdefault((_entero(ficha), _entero(taxon), voucher) + celda, []).append((lat, lon, int(id_ubicacion)))
+
+    # ─── Consultas ────────────────────────────────────────────────────────────
+
+    def lookup(self, frame: pd.DataFrame) -> pd.Series:
+        """
+        id_ubicacion_especie existente para cada fila de `frame` (columnas
+        id_ficha_especie, id_taxon, latitud, longitud, voucher, localidad), o NA.
+        """
+        self.finish()
+        digests = _digests(frame['id_ficha_especie'], frame['id_taxon'], frame['latitud'],
+                           frame['longitud'], frame['voucher'], frame['localidad'])
+        if len(self._digests):
+            pos = np.searchsorted(self._digests, digests).clip(max=len(self._digests) - 1)
+            encontrado = self._digests[pos] == digests
+            valores = np.where(encontrado, self._ids[pos], 0)
+        else:
+            encontrado = np.zeros(len(digests), dtype=bool)
+            valores = np.zeros(len(digests), dtype=np.int64)
+        ids = pd.Series(pd.array(valores, dtype='Int64'), index=frame.index).mask(~encontrado)
+
+        if self.tolerancia_m:
+            faltan = ids.isna()
+            cercanos = [self.nearest(*fila) for fila in frame.loc[faltan, [
+                'id_ficha_especie', 'id_taxon', 'voucher', 'latitud', 'longitud']].itertuples(index=False)]
+            ids[faltan] = pd.array(cercanos, dtype='Int64')
+        return ids
+
+    def nearest(self, ficha, taxon, voucher, lat, lon) -> int | None:
+        """Id del punto existente más cercano dentro de la tolerancia con la misma ficha, taxon y voucher."""
+        voucher, lat, lon = _texto(voucher), _coord(lat), _coord(lon)
+        if voucher is None or lat is None or lon is None:
+            return None
+        ficha, taxon = _entero(ficha), _entero(taxon)
+        i, j = self._celda(lat, lon)
+        mejor, mejor_d = None, self.tolerancia_m
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for plat, plon, pid in self.grilla.get((ficha, taxon, voucher, i + di, j + dj), ()):
+                    d = distancia_m(lat, lon, plat, plon)
+                    if d <= mejor_d:
+                        mejor, mejor_d = pid, d
+        return mejor
+
+
+def distancia_m(lat1, lon1, lat2, lon2) -> float:
+    """Distancia aproximada (equirrectangular), suficiente para decenas o cientos de metros."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6_371_000 * math.hypot(x, y)
+
+
+def load_index(supabase, tolerancia_m: float | None = None, prefetch: bool = True) -> UbicacionIndex:
+    """Recorre ubicacion_especie por keyset y arma el índice."""
+    indice = UbicacionIndex(tolerancia_m)
+    for pagina in iter_pages(supabase, 'ubicacion_especie', ', '.join(COLUMNAS),
+                             key='id_ubicacion_especie', prefetch=prefetch):
+        indice.add_rows(pagina)
+    return indice.finish()
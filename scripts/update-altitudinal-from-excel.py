@@ -3,16 +3,24 @@
 Script para actualizar rangos altitudinales en ficha_especie desde Excel
 Usa MCP de Supabase para las operaciones
 """
+import argparse
 import pandas as pd
 import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from sheet_sync import print_changes, sync_from_frame
+from taxonomy_cache import load_taxonomy
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
 
 def main():
+    parser = argparse.ArgumentParser(description='Actualiza rangos altitudinales de ficha_especie desde el Excel')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Solo calcula y muestra las diferencias, sin escribir')
+    args = parser.parse_args()
+
     # Configurar cliente de Supabase
     supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
@@ -63,95 +71,66 @@ def main():
 
     print(f"\n📊 Total de registros a procesar: {len(df_clean)}")
 
-    # Obtener todas las especies de la BD con sus géneros
+    # Resolver especies con el snapshot de taxonomía (binomio → taxon → ficha)
     print("\n🔍 Obteniendo especies de la base de datos...")
-    especies_response = supabase.table('taxon').select('id_taxon, taxon, taxon_id').eq('rank_id', 7).execute()
+    tax = load_taxonomy(supabase)
 
-    if not especies_response.data:
+    if not tax.by_binomial:
         print("❌ Error: No se pudieron obtener las especies")
         sys.exit(1)
 
-    # Obtener géneros
-    generos_response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 6).execute()
-    generos_map = {}
-    if generos_response.data:
-        for gen in generos_response.data:
-            generos_map[gen['id_taxon']] = gen['taxon']
-
-    # Construir mapa: nombre_completo (género + especie) -> taxon_id
-    especies_map = {}
-    for especie in especies_response.data:
-        genero_id = especie['taxon_id']
-        nombre_especie = especie['taxon']
-        if genero_id and genero_id in generos_map:
-            genero_nombre = generos_map[genero_id]
-            nombre_completo = f"{genero_nombre} {nombre_especie}"
-            especies_map[nombre_completo] = especie['id_taxon']
-
-    print(f"✅ Especies en BD: {len(especies_map)}")
-
-    # Procesar actualizaciones
-    actualizados = 0
+    print(f"✅ Especies en BD: {len(tax.by_binomial)}")
+
     no_encontrados = []
     sin_altitud = []
-    errores = []
-
-    print("\n🔄 Procesando actualizaciones...")
-
-    for idx, row in df_clean.iterrows():
-        try:
-            nombre_cientifico = str(row[species_col]).strip()
-            alt_min = row[alt_min_col] if pd.notna(row[alt_min_col]) else None
-            alt_max = row[alt_max_col] if pd.notna(row[alt_max_col]) else None
-
-            # Si no hay valores de altitud, saltar
-            if alt_min is None and alt_max is None:
-                sin_altitud.append(nombre_cientifico)
-                continue
-
-            # Buscar especie en BD
-            if nombre_cientifico not in especies_map:
-                no_encontrados.append(nombre_cientifico)
-                continue
-
-            taxon_id = especies_map[nombre_cientifico]
-
-            # Preparar datos de actualización
-            update_data = {}
-            if alt_min is not None:
-                update_data['rango_altitudinal_min'] = int(alt_min)
-            if alt_max is not None:
-                update_data['rango_altitudinal_max'] = int(alt_max)
-
-            # Actualizar ficha_especie
-            update_response = supabase.table('ficha_especie').update(update_data).eq('taxon_id', taxon_id).execute()
-
-            if update_response.data:
-                actualizados += 1
-                if actualizados % 50 == 0:
-                    print(f"  📊 Progreso: {actualizados} actualizados...")
-            else:
-                errores.append(nombre_cientifico)
-
-        except Exception as e:
-            errores.append(f"{nombre_cientifico}: {str(e)}")
+    filas = []
+    for nombre, alt_min, alt_max in df_clean[[species_col, alt_min_col, alt_max_col]].itertuples(index=False):
+        nombre_cientifico = str(nombre).strip()
+
+        # Si no hay valores de altitud, saltar
+        if pd.isna(alt_min) and pd.isna(alt_max):
+            sin_altitud.append(nombre_cientifico)
+            continue
+
+        taxon_id = tax.species_id(nombre_cientifico)
+        id_ficha_especie = tax.ficha_by_taxon.get(taxon_id)
+        if id_ficha_especie is None:
+            no_encontrados.append(nombre_cientifico)
+            continue
+        filas.append((id_ficha_especie, alt_min, alt_max))
+
+    deseado = pd.DataFrame(filas, columns=['id_ficha_especie', 'rango_altitudinal_min', 'rango_altitudinal_max'])
+    deseado[['rango_altitudinal_min', 'rango_altitudinal_max']] = deseado[
+        ['rango_altitudinal_min', 'rango_altitudinal_max']].round().astype('Int64')
+
+    # Diff contra la tabla y escritura solo de las fichas que cambian
+    print("\n🔄 Comparando con ficha_especie...")
+    resultado = sync_from_frame(
+        supabase, 'ficha_especie', 'id_ficha_especie',
+        ['rango_altitudinal_min', 'rango_altitudinal_max'], deseado,
+        carry=['taxon_id'], dry_run=args.dry_run,
+    )
+    if args.dry_run:
+        etiquetas = {f: tax.scientific_name(t) for t, f in tax.ficha_by_taxon.items()}
+        print_changes(resultado.cambios, etiquetas)
 
     # Resumen
-    print(f"\n📊 Resumen:")
-    print(f"  ✅ Actualizados: {actualizados}")
+    print(f"\n📊 Resumen{' (dry-run, sin escribir)' if args.dry_run else ''}:")
+    print(f"  ✅ Actualizados: {resultado.actualizados}")
+    print(f"  ➖ Sin cambios: {resultado.sin_cambios}")
     print(f"  ⚠️  No encontrados: {len(no_encontrados)}")
     print(f"  ⚠️  Sin valores de altitud: {len(sin_altitud)}")
-    print(f"  ❌ Errores: {len(errores)}")
+    print(f"  ❌ Errores: {len(resultado.errores)}")
 
     if no_encontrados:
         print(f"\n⚠️  Especies no encontradas (primeras 10):")
         for nombre in no_encontrados[:10]:
             print(f"    - {nombre}")
 
-    if errores:
+    if resultado.errores:
         print(f"\n❌ Errores (primeros 10):")
-        for error in errores[:10]:
-            print(f"    - {error}")
+        for id_ficha, error in resultado.errores[:10]:
+            print(f"    - {id_ficha}: {error}")
 
 if __name__ == "__main__":
     main()
@@ -2,16 +2,27 @@
 """
 Script para actualizar rangos altitudinales en ficha_especie desde un archivo Excel
 """
+import argparse
 import pandas as pd
 import os
 import sys
+from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from sheet_sync import print_changes, sync_from_frame
+from taxonomy_cache import load_taxonomy
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
 
+REPORT_PATH = Path(__file__).resolve().parent.parent / 'reports' / 'diff-rango-altitudinal.csv'
+
 def main():
+    parser = argparse.ArgumentParser(description='Actualiza rangos altitudinales de ficha_especie desde el Excel')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Solo calcula y reporta las diferencias, sin escribir')
+    args = parser.parse_args()
+
     # Configurar cliente de Supabase
     supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
@@ -90,90 +101,62 @@ def main():
 
     print(f"\n📊 Total de registros a procesar: {len(df_clean)}")
 
-    # Obtener todas las especies de la base de datos
+    # Resolver especies con el snapshot de taxonomía (binomio → taxon → ficha)
     print("\n🔍 Obteniendo especies de la base de datos...")
-    response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 7).execute()
+    tax = load_taxonomy(supabase)
 
-    if not response.data:
+    if not tax.by_binomial:
         print("❌ Error: No se pudieron obtener las especies de la base de datos")
         sys.exit(1)
 
-    # Crear mapa de nombre científico -> id_taxon
-    taxon_map = {}
-    for taxon in response.data:
-        nombre = str(taxon['taxon']).strip()
-        taxon_map[nombre] = taxon['id_taxon']
+    print(f"✅ Se encontraron {len(tax.by_binomial)} especies en la base de datos")
 
-    print(f"✅ Se encontraron {len(taxon_map)} especies en la base de datos")
-
-    # Procesar cada fila del Excel
-    actualizados = 0
     no_encontrados = []
-    errores = []
-
-    print("\n🔄 Procesando actualizaciones...")
-
-    for idx, row in df_clean.iterrows():
-        nombre_cientifico = str(row[nombre_col]).strip()
-        alt_min = row[alt_min_col] if pd.notna(row[alt_min_col]) else None
-        alt_max = row[alt_max_col] if pd.notna(row[alt_max_col]) else None
-
-        # Buscar en el mapa
-        if nombre_cientifico not in taxon_map:
+    filas = []
+    for nombre, alt_min, alt_max in df_clean[[nombre_col, alt_min_col, alt_max_col]].itertuples(index=False):
+        nombre_cientifico = str(nombre).strip()
+        taxon_id = tax.species_id(nombre_cientifico)
+        if taxon_id is None:
             no_encontrados.append(nombre_cientifico)
             continue
-
-        taxon_id = taxon_map[nombre_cientifico]
-
-        # Actualizar en ficha_especie
-        try:
-            # Primero obtener el id_ficha_especie
-            ficha_response = supabase.table('ficha_especie').select('id_ficha_especie').eq('taxon_id', taxon_id).execute()
-
-            if not ficha_response.data or len(ficha_response.data) == 0:
-                no_encontrados.append(f"{nombre_cientifico} (sin ficha_especie)")
-                continue
-
-            id_ficha_especie = ficha_response.data[0]['id_ficha_especie']
-
-            # Preparar datos de actualización
-            update_data = {}
-            if alt_min is not None:
-                update_data['rango_altitudinal_min'] = int(alt_min)
-            if alt_max is not None:
-                update_data['rango_altitudinal_max'] = int(alt_max)
-
-            if not update_data:
-                continue
-
-            # Actualizar
-            update_response = supabase.table('ficha_especie').update(update_data).eq('id_ficha_especie', id_ficha_especie).execute()
-
-            if update_response.data:
-                actualizados += 1
-                print(f"  ✅ {nombre_cientifico}: min={alt_min}, max={alt_max}")
-            else:
-                errores.append(nombre_cientifico)
-
-        except Exception as e:
-            errores.append(f"{nombre_cientifico}: {str(e)}")
-            print(f"  ❌ Error actualizando {nombre_cientifico}: {str(e)}")
+        id_ficha_especie = tax.ficha_by_taxon.get(taxon_id)
+        if id_ficha_especie is None:
+            no_encontrados.append(f"{nombre_cientifico} (sin ficha_especie)")
+            continue
+        filas.append((id_ficha_especie, alt_min, alt_max))
+
+    deseado = pd.DataFrame(filas, columns=['id_ficha_especie', 'rango_altitudinal_min', 'rango_altitudinal_max'])
+    deseado[['rango_altitudinal_min', 'rango_altitudinal_max']] = deseado[
+        ['rango_altitudinal_min', 'rango_altitudinal_max']].round().astype('Int64')
+
+    # Diff contra la tabla y escritura solo de las fichas que cambian
+    print("\n🔄 Comparando con ficha_especie...")
+    resultado = sync_from_frame(
+        supabase, 'ficha_especie', 'id_ficha_especie',
+        ['rango_altitudinal_min', 'rango_altitudinal_max'], deseado,
+        carry=['taxon_id'], dry_run=args.dry_run, report_path=REPORT_PATH,
+    )
+    etiquetas = {f: tax.scientific_name(t) for t, f in tax.ficha_by_taxon.items()}
+    print_changes(resultado.cambios, etiquetas)
 
     # Resumen
-    print(f"\n📊 Resumen:")
-    print(f"  ✅ Actualizados: {actualizados}")
+    print(f"\n📊 Resumen{' (dry-run, sin escribir)' if args.dry_run else ''}:")
+    print(f"  ✅ Actualizados: {resultado.actualizados}")
+    print(f"  ➖ Sin cambios: {resultado.sin_cambios}")
     print(f"  ⚠️  No encontrados: {len(no_encontrados)}")
-    print(f"  ❌ Errores: {len(errores)}")
+    print(f"  ❌ Errores: {len(resultado.errores)}")
+    if not resultado.cambios.empty:
+        print(f"  📄 Diferencias: {REPORT_PATH}")
 
     if no_encontrados:
         print(f"\n⚠️  Especies no encontradas (primeras 10):")
         for nombre in no_encontrados[:10]:
             print(f"    - {nombre}")
 
-    if errores:
+    if resultado.errores:
         print(f"\n❌ Errores:")
-        for error in errores[:10]:
-            print(f"    - {error}")
+        for id_ficha, error in resultado.errores[:10]:
+            print(f"    - {etiquetas.get(id_ficha, id_ficha)}: {error}")
 
 if __name__ == "__main__":
     main()
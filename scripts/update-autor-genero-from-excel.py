@@ -13,10 +13,14 @@ from pathlib import Path
 import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from author_index import load_autores
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(ROOT_DIR / ".env.local")
 
+# ids por UPDATE ... WHERE id_autor IN (...): acota el largo de la URL
+UPDATE_CHUNK = 200
+
 
 def normalizar(s):
     if s is None or (isinstance(s, float) and pd.isna(s)):
@@ -78,9 +82,15 @@ def main():
         return 1
 
     supabase: Client = create_client(supabase_url, supabase_key)
-    updated = 0
+    print("Cargando autores...")
+    autores = load_autores(supabase, "id_autor, apellidos, nombres, genero")
+    print(f"Autores en BD: {len(autores)}")
+
+    # id_autor -> genero nuevo; se resuelve todo el Excel antes de escribir
+    nuevo_genero: dict[int, str] = {}
     not_found = []
     multi_updated = 0
+    sin_cambio = 0
 
     for _, row in df.iterrows():
         autor_str = row.get("Autor")
@@ -95,46 +105,35 @@ def main():
         if not apellidos:
             continue
 
-        # Buscar en la tabla autor
-        query = supabase.table("autor").select("id_autor, apellidos, nombres")
-        query = query.ilike("apellidos", apellidos)
-
-        if nombres_hint:
-            # Filtrar por nombres: que coincidan iniciales o contengan el nombre
-            # Ej: J.P. -> Juan P. / Juan Pablo; C. -> Carolina; Elke -> Elke
-            hint_clean = re.sub(r"[.\s]+", "", nombres_hint).lower()
-            res = query.execute()
-            if res.data:
-                matching = []
-                for a in res.data:
-                    nom = (a.get("nombres") or "")
-                    nom_clean = re.sub(r"[.\s]+", "", nom).lower()
-                    if hint_clean in nom_clean or nom_clean.startswith(hint_clean) or (len(hint_clean) <= 2 and nom_clean.startswith(hint_clean[:1])):
-                        matching.append(a)
-                    elif nombres_hint.lower() in (nom or "").lower():
-                        matching.append(a)
-                if not matching:
-                    not_found.append((autor_str, apellidos, nombres_hint))
-                    continue
-                ids = [m["id_autor"] for m in matching]
-            else:
-                not_found.append((autor_str, apellidos, nombres_hint))
-                continue
-        else:
-            res = query.execute()
-            if not res.data:
-                not_found.append((autor_str, apellidos, None))
-                continue
-            ids = [a["id_autor"] for a in res.data]
+        # Mismos apellidos normalizados; con hint, además nombres compatibles
+        # (J.P. -> Juan P. / Juan Pablo; C. -> Carolina; Elke -> Elke, no Erich)
+        ids = autores.buscar(apellidos, nombres_hint)
+        if not ids:
+            not_found.append((autor_str, apellidos, nombres_hint))
+            continue
 
         for id_autor in ids:
-            r = supabase.table("autor").update({"genero": genero}).eq("id_autor", id_autor).execute()
-            if r.data:
-                updated += 1
-                if len(ids) > 1 and not nombres_hint:
-                    multi_updated += 1
+            if autores.filas[id_autor].get("genero") == genero:
+                sin_cambio += 1
+                continue
+            nuevo_genero[id_autor] = genero
+            if len(ids) > 1 and not nombres_hint:
+                multi_updated += 1
+
+    # Un UPDATE por género y lote de ids
+    por_genero: dict[str, list[int]] = {}
+    for id_autor, genero in nuevo_genero.items():
+        por_genero.setdefault(genero, []).append(id_autor)
+    updated = 0
+    for genero, ids in por_genero.items():
+        ids = sorted(ids)
+        for i in range(0, len(ids), UPDATE_CHUNK):
+            r = supabase.table("autor").update({"genero": genero}).in_("id_autor", ids[i:i + UPDATE_CHUNK]).execute()
+            updated += len(r.data or [])
 
     print(f"Actualizados: {updated} autor(es)")
+    if sin_cambio:
+        print(f"Ya tenían el género correcto: {sin_cambio}")
     if multi_updated:
         print(f"(De ellos, {multi_updated} por coincidencia solo por apellidos)")
     if not_found:
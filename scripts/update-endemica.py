@@ -2,16 +2,24 @@
 """
 Script para actualizar el campo endemica en la tabla taxon desde un archivo Excel
 """
+import argparse
 import pandas as pd
 import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from sheet_sync import print_changes, sync_from_frame
+from taxonomy_cache import RANK_ESPECIE, load_taxonomy
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
 
 def main():
+    parser = argparse.ArgumentParser(description='Actualiza taxon.endemica desde el Excel')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Solo calcula y muestra las diferencias, sin escribir')
+    args = parser.parse_args()
+
     # Configurar cliente de Supabase
     supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
@@ -72,19 +80,13 @@ def main():
 
     # Obtener todas las especies de la base de datos
     print("\n🔍 Obteniendo especies de la base de datos...")
-    response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 7).execute()
+    tax = load_taxonomy(supabase)
 
-    if not response.data:
+    if not tax.by_binomial:
         print("❌ Error: No se pudieron obtener las especies de la base de datos")
         sys.exit(1)
 
-    # Crear mapa de nombre científico completo -> id_taxon
-    taxon_map = {}
-    for taxon in response.data:
-        nombre = str(taxon['taxon']).strip()
-        taxon_map[nombre] = taxon['id_taxon']
-
-    print(f"✅ Se encontraron {len(taxon_map)} especies en la base de datos")
+    print(f"✅ Se encontraron {len(tax.by_binomial)} especies en la base de datos")
 
     # Función para determinar si es endémica basándose en el valor del Excel
     def es_endemica(valor):
@@ -106,17 +108,13 @@ def main():
         # Por defecto, si tiene algún valor, asumir que es endémica
         return True
 
-    # Procesar cada fila del Excel
-    actualizados = 0
+    # Construir el estado deseado de taxon.endemica
     no_encontrados = []
-    errores = []
     valores_unicos_procesados = {}
+    filas = []
 
-    print("\n🔄 Procesando actualizaciones...")
-
-    for idx, row in df_clean.iterrows():
-        nombre_cientifico = str(row[species_col]).strip()
-        valor_endemismo = row[endemism_col]
+    for nombre, valor_endemismo in df_clean[[species_col, endemism_col]].itertuples(index=False):
+        nombre_cientifico = str(nombre).strip()
 
         # Determinar si es endémica
         endemica = es_endemica(valor_endemismo)
@@ -128,33 +126,31 @@ def main():
         if valor_endemismo not in valores_unicos_procesados:
             valores_unicos_procesados[valor_endemismo] = endemica
 
-        # Buscar en el mapa
-        if nombre_cientifico not in taxon_map:
+        # Buscar por nombre científico completo
+        taxon_id = tax.species_id(nombre_cientifico)
+        if taxon_id is None:
             no_encontrados.append(nombre_cientifico)
             continue
 
-        taxon_id = taxon_map[nombre_cientifico]
-
-        # Actualizar en taxon
-        try:
-            update_response = supabase.table('taxon').update({'endemica': endemica}).eq('id_taxon', taxon_id).execute()
+        filas.append((taxon_id, endemica))
 
-            if update_response.data:
-                actualizados += 1
-                estado = "Endémica" if endemica else "No endémica"
-                print(f"  ✅ {nombre_cientifico}: {estado} (valor Excel: '{valor_endemismo}')")
-            else:
-                errores.append(nombre_cientifico)
+    deseado = pd.DataFrame(filas, columns=['id_taxon', 'endemica'])
 
-        except Exception as e:
-            errores.append(f"{nombre_cientifico}: {str(e)}")
-            print(f"  ❌ Error actualizando {nombre_cientifico}: {str(e)}")
+    # Diff contra taxon y escritura solo de las especies que cambian
+    print("\n🔄 Comparando con taxon...")
+    resultado = sync_from_frame(
+        supabase, 'taxon', 'id_taxon', ['endemica'], deseado,
+        carry=['taxon'], where=lambda q: q.eq('rank_id', RANK_ESPECIE),
+        dry_run=args.dry_run,
+    )
+    print_changes(resultado.cambios, {tid: tax.scientific_name(tid) for tid in deseado['id_taxon']})
 
     # Resumen
-    print(f"\n📊 Resumen:")
-    print(f"  ✅ Actualizados: {actualizados}")
+    print(f"\n📊 Resumen{' (dry-run, sin escribir)' if args.dry_run else ''}:")
+    print(f"  ✅ Actualizados: {resultado.actualizados}")
+    print(f"  ➖ Sin cambios: {resultado.sin_cambios}")
     print(f"  ⚠️  No encontrados: {len(no_encontrados)}")
-    print(f"  ❌ Errores: {len(errores)}")
+    print(f"  ❌ Errores: {len(resultado.errores)}")
 
     print(f"\n📋 Mapeo de valores de endemismo:")
     for valor, es_end in valores_unicos_procesados.items():
@@ -166,10 +162,10 @@ def main():
         for nombre in no_encontrados[:10]:
             print(f"    - {nombre}")
 
-    if errores:
+    if resultado.errores:
         print(f"\n❌ Errores:")
-        for error in errores[:10]:
-            print(f"    - {error}")
+        for tid, error in resultado.errores[:10]:
+            print(f"    - {tax.scientific_name(tid)}: {error}")
 
 if __name__ == "__main__":
     main()
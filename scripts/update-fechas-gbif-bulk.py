@@ -1,31 +1,50 @@
 #!/usr/bin/env python3
 """
 Script BULK para actualizar fechas en coleccion_externa desde GBIF.
-Descarga TODOS los anfibios de Ecuador de GBIF de una sola vez (paginando de 300 en 300)
-y cruza en memoria con nuestros registros.
+Descarga TODOS los anfibios de Ecuador de GBIF (cosecha concurrente por año,
+ver gbif_harvester.py) y cruza en memoria con nuestros registros.
 
 Mucho más rápido que el script individual porque:
 - 1 descarga masiva vs 54K requests individuales
-- Cruce en memoria O(1) por registro
+- Cruce vectorizado: todas las variantes de catálogo en un solo merge
+  (ver gbif_matcher.py), con reporte de tasa de match por catálogo en
+  reports/match-gbif-por-catalogo.csv
+
+GBIF se guarda en un índice local SQLite (.cache/gbif/, ver gbif_index.py):
+la primera ejecución cosecha todo y las siguientes solo traen las ocurrencias
+reinterpretadas desde la última cosecha. La cosecha guarda checkpoints por
+slice: si el proceso muere, la siguiente ejecución continúa donde quedó.
+
+Las fechas encontradas se escriben por chunks (upsert sobre id o RPC
+actualizar_fechas_coleccion_externa), no con un UPDATE por registro.
 
 Uso:
     python3 scripts/update-fechas-gbif-bulk.py [--dry-run]
+    python3 scripts/update-fechas-gbif-bulk.py --modo rpc --chunk-size 2000 --concurrency 4
+    python3 scripts/update-fechas-gbif-bulk.py --reusar-indice --dry-run   # sin tocar GBIF
+    python3 scripts/update-fechas-gbif-bulk.py --cosecha-completa          # reconstruir el índice
 """
 import os
 import sys
-import time
 import argparse
 import logging
 from datetime import datetime
+from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
-try:
-    import httpx
-except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'httpx'])
-    import httpx
+from gbif_harvester import DEFAULT_CONCURRENCY as GBIF_CONCURRENCY
+from gbif_harvester import DEFAULT_RATE as GBIF_RATE
+from gbif_harvester import refresh
+from gbif_index import GbifIndex
+from gbif_matcher import load_index_frame, match_fechas, match_report
+from supabase_fetch import fetch_all
+from gbif_fechas import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    MODOS,
+    aplicar_fechas_bulk,
+)
 
 load_dotenv('.env.local')
 
@@ -36,157 +55,33 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
-GBIF_BASE = 'https://api.gbif.org/v1/occurrence/search'
-
-
-def parse_event_date(event_date: str) -> str | None:
-    if not event_date:
-        return None
-    # Handle ISO dates like "2015-03-21T00:00:00"
-    if 'T' in event_date:
-        event_date = event_date.split('T')[0]
-    partes = event_date.split('-')
-    if len(partes) >= 3:
-        return f"{partes[0]}-{partes[1]}-{partes[2][:2]}"
-    elif len(partes) == 2:
-        return f"{partes[0]}-{partes[1]}-01"
-    elif len(partes) == 1 and partes[0].isdigit() and len(partes[0]) == 4:
-        return f"{partes[0]}-01-01"
-    return None
-
-
-def download_gbif_amphibia_ecuador(client: httpx.Client) -> dict[str, dict]:
-    """
-    Descarga TODOS los registros de anfibios de Ecuador desde GBIF.
-    Retorna un dict: (institutionCode, catalogNumber) → {eventDate, ...}
-    """
-    log.info('=== Descargando todos los anfibios de Ecuador desde GBIF ===')
-
-    # GBIF max offset es 100,000. Usamos filtros para segmentar si es necesario
-    all_records: dict[tuple[str, str], str] = {}
-    offset = 0
-    page_size = 300
-    total_gbif = None
-    errors_consecutivos = 0
-    max_errors = 10
-
-    while True:
-        try:
-            resp = client.get(GBIF_BASE, params={
-                'country': 'EC',
-                'classKey': '131',  # Amphibia
-                'basisOfRecord': 'PRESERVED_SPECIMEN',
-                'limit': str(page_size),
-                'offset': str(offset),
-            }, timeout=60.0)
-
-            if resp.status_code == 429:
-                log.warning('GBIF 429 Rate Limited — esperando 60s...')
-                time.sleep(60)
-                continue
-
-            if resp.status_code == 503:
-                log.warning('GBIF 503 — esperando 30s...')
-                time.sleep(30)
-                errors_consecutivos += 1
-                if errors_consecutivos >= max_errors:
-                    log.error('Demasiados errores consecutivos, abortando descarga')
-                    break
-                continue
-
-            if resp.status_code != 200:
-                log.warning(f'GBIF HTTP {resp.status_code}')
-                errors_consecutivos += 1
-                if errors_consecutivos >= max_errors:
-                    break
-                time.sleep(5)
-                continue
-
-            errors_consecutivos = 0
-            data = resp.json()
-
-            if total_gbif is None:
-                total_gbif = data.get('count', 0)
-                log.info(f'Total registros en GBIF (Amphibia Ecuador): {total_gbif}')
-
-            results = data.get('results', [])
-            if not results:
-                break
-
-            for rec in results:
-                inst_code = (rec.get('institutionCode') or '').strip()
-                cat_num = (rec.get('catalogNumber') or '').strip()
-                event_date = rec.get('eventDate', '')
-
-                if inst_code and cat_num and event_date:
-                    fecha = parse_event_date(event_date)
-                    if fecha:
-                        key = (inst_code.upper(), cat_num)
-                        if key not in all_records:
-                            all_records[key] = fecha
-
-            offset += len(results)
-
-            if offset % 3000 == 0 or offset >= (total_gbif or 0):
-                pct = (offset / max(total_gbif or 1, 1)) * 100
-                log.info(f'  Descargados: {offset}/{total_gbif} ({pct:.1f}%) — Fechas únicas: {len(all_records)}')
+REPORT_PATH = Path(__file__).resolve().parent.parent / 'reports' / 'match-gbif-por-catalogo.csv'
 
-            if offset >= (total_gbif or 0) or len(results) < page_size:
-                break
-
-            # Pausa entre páginas
-            time.sleep(0.3)
-
-        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
-            log.warning(f'Error red: {type(e).__name__} — esperando 10s...')
-            time.sleep(10)
-            errors_consecutivos += 1
-            if errors_consecutivos >= max_errors:
-                break
-
-    log.info(f'=== Descarga completa: {len(all_records)} registros con fecha ===')
-    return all_records
-
-
-def build_lookup_keys(catalogo: str, numero: str) -> list[tuple[str, str]]:
-    """
-    Genera las variantes de (institutionCode, catalogNumber) para buscar en el índice GBIF.
-    Misma lógica que GbifLink de la mapoteca.
-    """
-    keys = []
-    num = numero.strip()
-    cat = catalogo.strip().upper()
-
-    if cat in ('QCAZA', 'QCAZ'):
-        keys.append(('QCAZ', f'QCAZA{num}'))
-        keys.append(('QCAZ', num))
-        keys.append(('QCAZA', num))
-        keys.append(('QCAZA', f'QCAZA{num}'))
-    elif cat == 'KU':
-        keys.append(('KU', num))
-        keys.append(('KUBI', num))
-    elif cat == 'AMNH':
-        keys.append(('AMNH', f'A-{num}'))
-        keys.append(('AMNH', num))
-    elif cat == 'USNM':
-        keys.append(('USNM', f'USNM {num}'))
-        keys.append(('USNM', num))
-    elif cat == 'DHMECN':
-        keys.append(('DHMECN', f'DHMECN {num}'))
-        keys.append(('DHMECN', num))
-        keys.append(('MECN', num))
-    elif cat == 'MCZ':
-        keys.append(('MCZ', f'MCZ:Herp:A-{num}'))
-        keys.append(('MCZ', num))
-    else:
-        keys.append((cat, num))
-
-    return keys
+# Rangos de id leídos en paralelo al traer los registros sin fecha
+DEFAULT_READ_WORKERS = 4
 
 
 def main():
     parser = argparse.ArgumentParser(description='Bulk update fechas desde GBIF')
     parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--modo', choices=MODOS, default='upsert',
+                        help='Escritura en BD: upsert sobre id o RPC actualizar_fechas_coleccion_externa (default: upsert)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Registros por petición de escritura (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Chunks enviados en paralelo (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--read-workers', type=int, default=DEFAULT_READ_WORKERS,
+                        help=f'Rangos de id leídos en paralelo de coleccion_externa (default: {DEFAULT_READ_WORKERS})')
+    parser.add_argument('--gbif-concurrency', type=int, default=GBIF_CONCURRENCY,
+                        help=f'Slices de GBIF descargados en paralelo (default: {GBIF_CONCURRENCY})')
+    parser.add_argument('--gbif-rate', type=float, default=GBIF_RATE,
+                        help=f'Peticiones por segundo a GBIF (default: {GBIF_RATE})')
+    parser.add_argument('--reusar-indice', action='store_true',
+                        help='Usar el índice GBIF local tal cual, sin consultar GBIF')
+    parser.add_argument('--cosecha-completa', action='store_true',
+                        help='Reconstruir el índice GBIF completo en lugar de la actualización incremental')
+    parser.add_argument('--nueva-cosecha', action='store_true',
+                        help='Ignorar checkpoints pendientes y planificar la cosecha desde cero')
     args = parser.parse_args()
 
     url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
@@ -198,92 +93,67 @@ def main():
     supabase: Client = create_client(url, key)
     inicio = datetime.now()
 
-    # Paso 1: Descargar índice GBIF
-    with httpx.Client(
-        headers={'User-Agent': 'amphibians-wiki-jambatu/1.0 (https://anfibiosecuador.ec)'},
-        timeout=60.0,
-    ) as client:
-        gbif_index = download_gbif_amphibia_ecuador(client)
+    indice = GbifIndex()
 
-    if not gbif_index:
+    # Paso 1: Actualizar (o reanudar) el índice GBIF local
+    if args.reusar_indice and indice.count():
+        log.info(f'Usando índice GBIF local: {indice.path}')
+    else:
+        refresh(
+            indice,
+            concurrency=args.gbif_concurrency,
+            rate=args.gbif_rate,
+            full=args.cosecha_completa,
+            fresh=args.nueva_cosecha,
+        )
+    total_gbif = indice.count()
+
+    if not total_gbif:
         log.error('No se pudieron descargar datos de GBIF')
         return
 
     # Paso 2: Obtener registros sin fecha de nuestra BD
     log.info('Obteniendo registros sin fecha de coleccion_externa...')
-    all_registros = []
-    page_size = 1000
-    offset = 0
-
-    while True:
-        resp = supabase.table('coleccion_externa') \
-            .select('id, catalogo_museo, numero_museo') \
-            .is_('fecha', 'null') \
-            .not_.is_('catalogo_museo', 'null') \
-            .not_.is_('numero_museo', 'null') \
-            .range(offset, offset + page_size - 1) \
-            .execute()
-
-        batch = resp.data
-        if not batch:
-            break
-        all_registros.extend(batch)
-        offset += len(batch)
-        if len(batch) < page_size:
-            break
+    all_registros = fetch_all(
+        supabase, 'coleccion_externa', 'id, catalogo_museo, numero_museo', key='id',
+        where=lambda q: q.is_('fecha', 'null').not_.is_('catalogo_museo', 'null').not_.is_('numero_museo', 'null'),
+        workers=args.read_workers,
+    )
 
     total = len(all_registros)
     log.info(f'Total registros sin fecha: {total}')
 
     if total == 0:
         log.info('No hay registros para procesar.')
+        indice.close()
         return
 
-    # Paso 3: Cruzar en memoria
+    # Paso 3: Cruzar con el índice local
     log.info('Cruzando registros con índice GBIF...')
-    actualizaciones = []
-    no_encontrados = 0
-
-    for rec in all_registros:
-        catalogo = rec['catalogo_museo']
-        numero = str(rec['numero_museo']).strip()
-
-        keys = build_lookup_keys(catalogo, numero)
-        fecha = None
-        for k in keys:
-            fecha = gbif_index.get(k)
-            if fecha:
-                break
-
-        if fecha:
-            actualizaciones.append({'id': rec['id'], 'fecha': fecha})
-        else:
-            no_encontrados += 1
-
+    matches = match_fechas(all_registros, load_index_frame(indice))
+    indice.close()
+    actualizaciones = matches[['id', 'fecha']].to_dict('records')
     encontrados = len(actualizaciones)
+    no_encontrados = total - encontrados
+
+    reporte = match_report(all_registros, matches)
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    reporte.to_csv(REPORT_PATH, index=False)
+    log.info(f'Tasa de match por catálogo ({REPORT_PATH}):\n{reporte.to_string(index=False)}')
     log.info(f'Matches: {encontrados} de {total} ({encontrados/max(total,1)*100:.1f}%)')
     log.info(f'Sin fecha en GBIF: {no_encontrados}')
 
     # Paso 4: Actualizar BD
+    actualizados = 0
     if actualizaciones and not args.dry_run:
-        log.info(f'Actualizando {encontrados} registros en la BD...')
-        errores = 0
-        actualizados = 0
-
-        for i, upd in enumerate(actualizaciones):
-            try:
-                supabase.table('coleccion_externa') \
-                    .update({'fecha': upd['fecha']}) \
-                    .eq('id', upd['id']) \
-                    .execute()
-                actualizados += 1
-            except Exception as e:
-                log.error(f'Error actualizando id={upd["id"]}: {e}')
-                errores += 1
-
-            if (i + 1) % 500 == 0:
-                log.info(f'  Actualizados: {actualizados}/{encontrados}')
-
+        log.info(f'Actualizando {encontrados} registros en la BD '
+                 f'(modo {args.modo}, chunks de {args.chunk_size}, {args.concurrency} en paralelo)...')
+        actualizados, errores = aplicar_fechas_bulk(
+            supabase, actualizaciones,
+            modo=args.modo,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+        )
         log.info(f'Actualizados: {actualizados}, Errores: {errores}')
     elif actualizaciones and args.dry_run:
         log.info(f'[DRY RUN] Se actualizarían {encontrados} registros')
@@ -294,7 +164,7 @@ def main():
     elapsed = datetime.now() - inicio
     print('\n' + '=' * 60)
     print('RESUMEN FINAL (BULK)')
-    print(f'  Registros GBIF descargados:  {len(gbif_index)}')
+    print(f'  Ocurrencias en índice GBIF:  {total_gbif}')
     print(f'  Registros sin fecha en BD:   {total}')
     print(f'  Fechas encontradas:          {encontrados} ({encontrados/max(total,1)*100:.1f}%)')
     print(f'  Sin match en GBIF:           {no_encontrados}')
@@ -4,12 +4,24 @@ Script para actualizar fechas en coleccion_externa consultando la API de GBIF.
 Busca registros por catalogNumber + institutionCode (misma lógica que la mapoteca)
 y actualiza el campo fecha.
 
+Con --usar-indice se consulta primero el índice GBIF local (.cache/gbif/, lo
+mantiene update-fechas-gbif-bulk.py) y solo se llama a la API para los registros
+que no están en él; --solo-indice no llama a la API.
+
+Con --concurrency N los registros se procesan en N corrutinas que comparten un
+httpx.AsyncClient y un limitador global (--rate peticiones/s). Las variantes de
+un mismo registro se lanzan a la vez y gana la de mayor prioridad que tenga
+fecha; las fechas se acumulan y se escriben en lotes (ver gbif_fechas.py).
+
 Uso:
     python3 scripts/update-fechas-gbif.py [--dry-run] [--batch-size 100] [--catalogo QCAZA] [--limit 500]
+    python3 scripts/update-fechas-gbif.py --usar-indice [--solo-indice]
+    python3 scripts/update-fechas-gbif.py --concurrency 8 --rate 5 [--flush-size 500]
 """
 import os
 import sys
 import time
+import asyncio
 import argparse
 import logging
 from datetime import datetime
@@ -23,6 +35,11 @@ except ImportError:
     subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'httpx'])
     import httpx
 
+from gbif_fechas import DEFAULT_CHUNK_SIZE, MODOS, aplicar_fechas_bulk
+from gbif_harvester import DEFAULT_RATE, USER_AGENT, GbifError, TokenBucket, gbif_get
+from gbif_index import GbifIndex
+from supabase_fetch import iter_pages
+
 # ─── Configuración ────────────────────────────────────────────────────────────
 
 load_dotenv('.env.local')
@@ -213,6 +230,113 @@ def buscar_fecha_gbif(client: httpx.Client, catalogo: str, numero: str) -> str |
     return None
 
 
+# ─── Modo asíncrono (--concurrency) ───────────────────────────────────────────
+
+async def _fecha_variante(client: httpx.AsyncClient, bucket: TokenBucket, params_dict: dict) -> str | None:
+    search_params = {
+        **params_dict,
+        'classKey': '131',  # Amphibia
+        'limit': '1',
+    }
+    try:
+        data = await gbif_get(client, bucket, search_params)
+    except GbifError as e:
+        log.warning(f'{params_dict}: {e}')
+        return None
+    results = data.get('results', [])
+    if results:
+        return parse_event_date(results[0].get('eventDate', ''))
+    return None
+
+
+async def buscar_fecha_gbif_async(client: httpx.AsyncClient, bucket: TokenBucket,
+                                  catalogo: str, numero: str) -> str | None:
+    """
+    Como buscar_fecha_gbif, pero lanza todas las variantes a la vez. Devuelve la
+    fecha de la variante de mayor prioridad que tenga una y cancela las que
+    todavía no han respondido.
+    """
+    tareas = [asyncio.create_task(_fecha_variante(client, bucket, p))
+              for p in get_gbif_params(catalogo, numero)]
+    try:
+        for tarea in tareas:
+            fecha = await tarea
+            if fecha:
+                return fecha
+        return None
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+
+async def procesar_async(registros: list[dict], args, supabase: Client, indice: GbifIndex | None):
+    """
+    Procesa los registros con args.concurrency corrutinas.
+    Devuelve (encontrados, desde_indice, no_encontrados, actualizados, errores).
+    """
+    total = len(registros)
+    bucket = TokenBucket(args.rate)
+    pendientes = []
+    encontrados = desde_indice = no_encontrados = actualizados = errores = 0
+    procesados = 0
+    inicio = datetime.now()
+
+    async def flush():
+        nonlocal actualizados, errores
+        lote = pendientes[:]
+        pendientes.clear()
+        if not lote or args.dry_run:
+            return
+        ok, err = await asyncio.to_thread(aplicar_fechas_bulk, supabase, lote, args.modo, args.flush_size, 1)
+        actualizados += ok
+        errores += err
+
+    async def worker(cola, client):
+        nonlocal encontrados, desde_indice, no_encontrados, procesados
+        for rec in cola:
+            catalogo = rec['catalogo_museo']
+            numero = str(rec['numero_museo']).strip()
+
+            fecha = indice.buscar_fecha(catalogo, numero) if indice else None
+            if fecha:
+                desde_indice += 1
+            elif not args.solo_indice:
+                fecha = await buscar_fecha_gbif_async(client, bucket, catalogo, numero)
+
+            if fecha:
+                encontrados += 1
+                pendientes.append({'id': rec['id'], 'fecha': fecha})
+                if len(pendientes) >= args.flush_size:
+                    await flush()
+                if (encontrados % 10 == 0) or encontrados == 1:
+                    log.info(f'  ✓ {catalogo} {numero} → {fecha} (total encontrados: {encontrados})')
+            else:
+                no_encontrados += 1
+
+            procesados += 1
+            if procesados % args.batch_size == 0 or procesados == total:
+                elapsed = (datetime.now() - inicio).total_seconds()
+                rps = procesados / max(elapsed, 0.001)
+                eta = int((total - procesados) / max(rps, 0.01))
+                log.info(
+                    f'[{procesados / total * 100:.1f}%] {procesados}/{total} | '
+                    f'Encontrados: {encontrados} | Sin fecha: {no_encontrados} | '
+                    f'{rps:.1f} reg/s | ETA: {eta//60}m{eta%60}s'
+                )
+
+    # Un solo iterador compartido: cada corrutina toma el siguiente registro libre
+    cola = iter(registros)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    try:
+        async with httpx.AsyncClient(headers={'User-Agent': USER_AGENT}, limits=limits) as client:
+            await asyncio.gather(*(worker(cola, client) for _ in range(args.concurrency)))
+    finally:
+        # Las fechas ya encontradas se escriben aunque un worker falle o se interrumpa la corrida
+        await flush()
+
+    return encontrados, desde_indice, no_encontrados, actualizados, errores
+
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
@@ -222,6 +346,16 @@ def main():
     parser.add_argument('--catalogo', type=str, default=None, help='Procesar solo este catálogo')
     parser.add_argument('--limit', type=int, default=None, help='Límite total de registros')
     parser.add_argument('--delay', type=float, default=0.35, help='Segundos entre requests GBIF (default: 0.35)')
+    parser.add_argument('--usar-indice', action='store_true', help='Consultar primero el índice GBIF local')
+    parser.add_argument('--solo-indice', action='store_true', help='Usar solo el índice local, sin llamar a la API')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='Registros en paralelo con cliente asíncrono (default: 0, secuencial)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f'Con --concurrency: peticiones por segundo a GBIF (default: {DEFAULT_RATE})')
+    parser.add_argument('--flush-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Con --concurrency: fechas acumuladas por escritura en BD (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--modo', choices=MODOS, default='upsert',
+                        help='Con --concurrency: upsert sobre id o RPC actualizar_fechas_coleccion_externa')
     args = parser.parse_args()
 
     url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
@@ -232,36 +366,23 @@ def main():
 
     supabase: Client = create_client(url, key)
 
-    # Obtener registros sin fecha — paginar para superar límite de 1000
+    # Obtener registros sin fecha — paginación keyset sobre id
     log.info('Obteniendo registros sin fecha...')
-    all_registros = []
-    page_size = 1000
-    offset = 0
 
-    while True:
-        query = supabase.table('coleccion_externa') \
-            .select('id, catalogo_museo, numero_museo') \
+    def sin_fecha(query):
+        query = query \
             .is_('fecha', 'null') \
             .not_.is_('catalogo_museo', 'null') \
-            .not_.is_('numero_museo', 'null') \
-            .range(offset, offset + page_size - 1)
-
+            .not_.is_('numero_museo', 'null')
         if args.catalogo:
             query = query.eq('catalogo_museo', args.catalogo)
+        return query
 
-        resp = query.execute()
-        batch = resp.data
-        if not batch:
-            break
-
+    all_registros = []
+    for batch in iter_pages(supabase, 'coleccion_externa', 'id, catalogo_museo, numero_museo',
+                            key='id', where=sin_fecha):
         all_registros.extend(batch)
-        offset += len(batch)
-
-        if len(batch) < page_size:
-            break
-
         if args.limit and len(all_registros) >= args.limit:
-            all_registros = all_registros[:args.limit]
             break
 
     if args.limit:
@@ -274,55 +395,69 @@ def main():
         log.info('No hay registros para procesar.')
         return
 
+    indice = None
+    if args.usar_indice or args.solo_indice:
+        indice = GbifIndex()
+        log.info(f'Índice GBIF local: {indice.count()} ocurrencias ({indice.path})')
+
     encontrados = 0
+    desde_indice = 0
     no_encontrados = 0
     actualizados = 0
     errores = 0
     inicio = datetime.now()
 
-    with httpx.Client(
-        headers={'User-Agent': 'amphibians-wiki-jambatu/1.0 (https://anfibiosecuador.ec)'}
-    ) as client:
-
-        for i, rec in enumerate(all_registros):
-            rid = rec['id']
-            catalogo = rec['catalogo_museo']
-            numero = str(rec['numero_museo']).strip()
-
-            fecha = buscar_fecha_gbif(client, catalogo, numero)
-
-            if fecha:
-                encontrados += 1
-                if not args.dry_run:
-                    try:
-                        supabase.table('coleccion_externa') \
-                            .update({'fecha': fecha}) \
-                            .eq('id', rid) \
-                            .execute()
-                        actualizados += 1
-                    except Exception as e:
-                        log.error(f'Error actualizando id={rid}: {e}')
-                        errores += 1
-
-                if (encontrados % 10 == 0) or encontrados == 1:
-                    log.info(f'  ✓ {catalogo} {numero} → {fecha} (total encontrados: {encontrados})')
-            else:
-                no_encontrados += 1
-
-            # Pausa respetuosa para GBIF
-            time.sleep(args.delay)
-
-            # Progreso cada batch_size registros
-            if (i + 1) % args.batch_size == 0 or (i + 1) == total:
-                elapsed = (datetime.now() - inicio).total_seconds()
-                pct = (i + 1) / total * 100
-                rps = (i + 1) / max(elapsed, 1)
-                eta = int((total - i - 1) / max(rps, 0.01))
-                log.info(
-                    f'[{pct:.1f}%] {i+1}/{total} | '
-                    f'Encontrados: {encontrados} | Sin fecha: {no_encontrados} | '
-                    f'ETA: {eta//60}m{eta%60}s'
-                )
+    if args.concurrency > 0:
+        log.info(f'Modo asíncrono: {args.concurrency} registros en paralelo, {args.rate} req/s')
+        encontrados, desde_indice, no_encontrados, actualizados, errores = \
+            asyncio.run(procesar_async(all_registros, args, supabase, indice))
+    else:
+        with httpx.Client(
+            headers={'User-Agent': 'amphibians-wiki-jambatu/1.0 (https://anfibiosecuador.ec)'}
+        ) as client:
+
+            for i, rec in enumerate(all_registros):
+                rid = rec['id']
+                catalogo = rec['catalogo_museo']
+                numero = str(rec['numero_museo']).strip()
+
+                fecha = indice.buscar_fecha(catalogo, numero) if indice else None
+                if fecha:
+                    desde_indice += 1
+                elif not args.solo_indice:
+                    fecha = buscar_fecha_gbif(client, catalogo, numero)
+                    # Pausa respetuosa para GBIF
+                    time.sleep(args.delay)
+
+                if fecha:
+                    encontrados += 1
+                    if not args.dry_run:
+                        try:
+                            supabase.table('coleccion_externa') \
+                                .update({'fecha': fecha}) \
+                                .eq('id', rid) \
+                                .execute()
+                            actualizados += 1
+                        except Exception as e:
+                            log.error(f'Error actualizando id={rid}: {e}')
+                            errores += 1
+
+                    if (encontrados % 10 == 0) or encontrados == 1:
+                        log.info(f'  ✓ {catalogo} {numero} → {fecha} (total encontrados: {encontrados})')
+                else:
+                    no_encontrados += 1
+
+                # Progreso cada batch_size registros
+                if (i + 1) % args.batch_size == 0 or (i + 1) == total:
+                    elapsed = (datetime.now() - inicio).total_seconds()
+                    pct = (i + 1) / total * 100
+                    rps = (i + 1) / max(elapsed, 1)
+                    eta = int((total - i - 1) / max(rps, 0.01))
+                    log.info(
+                        f'[{pct:.1f}%] {i+1}/{total} | '
+                        f'Encontrados: {encontrados} | Sin fecha: {no_encontrados} | '
+                        f'ETA: {eta//60}m{eta%60}s'
+                    )
 
     # Resumen
     elapsed_total = datetime.now() - inicio
@@ -330,6 +465,9 @@ def main():
     print('RESUMEN FINAL')
     print(f'  Total procesados:     {total}')
     print(f'  Fecha encontrada:     {encontrados} ({encontrados/max(total,1)*100:.1f}%)')
+    if indice:
+        print(f'  Desde índice local:   {desde_indice}')
+        indice.close()
     print(f'  Sin fecha en GBIF:    {no_encontrados} ({no_encontrados/max(total,1)*100:.1f}%)')
     if not args.dry_run:
         print(f'  Actualizados en BD:   {actualizados}')
@@ -337,6 +475,7 @@ def main():
     else:
         print('  [DRY RUN] No se realizaron cambios')
     print(f'  Tiempo total:         {elapsed_total}')
+    print(f'  Registros/s:          {total / max(elapsed_total.total_seconds(), 0.001):.1f}')
     print('=' * 60)
 
 
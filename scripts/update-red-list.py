@@ -2,16 +2,26 @@
 """
 Script para actualizar la Lista Roja UICN en taxon_catalogo_awe desde un archivo Excel
 """
+import argparse
 import pandas as pd
 import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from red_list_sync import MODOS, catalogo_resolver, load_catalogos, sync_red_list
+from taxonomy_cache import load_taxonomy
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
 
 def main():
+    parser = argparse.ArgumentParser(description='Actualiza la Lista Roja UICN en taxon_catalogo_awe desde el Excel')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Solo calcula el plan (inserciones, reasignaciones, duplicados), sin escribir')
+    parser.add_argument('--modo', choices=MODOS, default='bulk',
+                        help="bulk: peticiones por lotes; rpc: una transacción con sincronizar_lista_roja")
+    args = parser.parse_args()
+
     # Configurar cliente de Supabase
     supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
@@ -57,28 +67,17 @@ def main():
 
     # Obtener catálogos de Lista Roja UICN
     print("\n🔍 Obteniendo catálogos de Lista Roja UICN...")
-    catalogo_response = supabase.table('catalogo_awe').select('id_catalogo_awe, nombre, sigla').eq('tipo_catalogo_awe_id', 10).execute()
+    catalogos = load_catalogos(supabase)
 
-    if not catalogo_response.data:
+    if not catalogos:
         print("❌ Error: No se pudieron obtener los catálogos de Lista Roja UICN")
         sys.exit(1)
 
-    # Crear mapa de sigla/nombre -> id_catalogo_awe
-    catalogo_map = {}
     print("\n📋 Catálogos disponibles:")
-    for cat in catalogo_response.data:
-        sigla = str(cat['sigla']).strip().upper() if cat['sigla'] else None
-        nombre = str(cat['nombre']).strip()
-        id_cat = cat['id_catalogo_awe']
-
-        # Mapear por sigla
-        if sigla:
-            catalogo_map[sigla] = id_cat
-        # También mapear por nombre (normalizado)
-        nombre_upper = nombre.upper()
-        catalogo_map[nombre_upper] = id_cat
-
-        print(f"  {sigla or 'N/A'}: {nombre} (ID: {id_cat})")
+    for cat in catalogos:
+        print(f"  {cat['sigla'] or 'N/A'}: {cat['nombre']} (ID: {cat['id_catalogo_awe']})")
+    nombre_catalogo = {c['id_catalogo_awe']: c['nombre'] for c in catalogos}
+    obtener_id_catalogo = catalogo_resolver(catalogos)
 
     # Limpiar datos del Excel
     df_clean = df[[species_col, red_list_col]].copy()
@@ -98,61 +97,21 @@ def main():
 
     # Obtener todas las especies de la base de datos
     print("\n🔍 Obteniendo especies de la base de datos...")
-    response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 7).execute()
+    tax = load_taxonomy(supabase)
 
-    if not response.data:
+    if not tax.by_binomial:
         print("❌ Error: No se pudieron obtener las especies de la base de datos")
         sys.exit(1)
 
-    # Crear mapa de nombre científico completo -> id_taxon
-    taxon_map = {}
-    for taxon in response.data:
-        nombre = str(taxon['taxon']).strip()
-        taxon_map[nombre] = taxon['id_taxon']
-
-    print(f"✅ Se encontraron {len(taxon_map)} especies en la base de datos")
-
-    # Función para mapear valor del Excel a id_catalogo_awe
-    def obtener_id_catalogo(valor):
-        if pd.isna(valor) or valor == '' or str(valor).lower() == 'nan':
-            return None
-
-        valor_str = str(valor).strip().upper()
-
-        # Manejar casos especiales primero
-        # "CR (PE)" o "CR(PE)" -> Posiblemente extinta
-        if 'CR' in valor_str and ('PE' in valor_str or '(PE)' in valor_str):
-            return catalogo_map.get('CR(PE)') or catalogo_map.get('POSIBLEMENTE EXTINTA')
-
-        # Buscar por sigla exacta
-        if valor_str in catalogo_map:
-            return catalogo_map[valor_str]
+    print(f"✅ Se encontraron {len(tax.by_binomial)} especies en la base de datos")
 
-        # Normalizar espacios y paréntesis para búsqueda
-        valor_normalizado = valor_str.replace(' ', '').replace('(', '').replace(')', '')
-        if valor_normalizado in catalogo_map:
-            return catalogo_map[valor_normalizado]
-
-        # Buscar por coincidencia parcial en el nombre
-        for key, id_cat in catalogo_map.items():
-            key_normalizado = key.replace(' ', '').replace('(', '').replace(')', '')
-            if valor_normalizado in key_normalizado or key_normalizado in valor_normalizado:
-                return id_cat
-
-        return None
-
-    # Procesar cada fila del Excel
-    actualizados = 0
-    creados = 0
+    # Estado deseado: taxon_id -> id_catalogo_awe
+    deseado = {}
     no_encontrados = []
     sin_catalogo = []
-    errores = []
-
-    print("\n🔄 Procesando actualizaciones...")
 
-    for idx, row in df_clean.iterrows():
-        nombre_cientifico = str(row[species_col]).strip()
-        valor_red_list = row[red_list_col]
+    for nombre, valor_red_list in df_clean[[species_col, red_list_col]].itertuples(index=False):
+        nombre_cientifico = str(nombre).strip()
 
         # Obtener id_catalogo_awe
         id_catalogo_awe = obtener_id_catalogo(valor_red_list)
@@ -162,48 +121,30 @@ def main():
                 sin_catalogo.append(f"{nombre_cientifico}: '{valor_red_list}'")
             continue
 
-        # Buscar en el mapa
-        if nombre_cientifico not in taxon_map:
+        # Buscar por nombre científico completo
+        taxon_id = tax.species_id(nombre_cientifico)
+        if taxon_id is None:
             no_encontrados.append(nombre_cientifico)
             continue
 
-        taxon_id = taxon_map[nombre_cientifico]
-
-        # Verificar si ya existe un registro para este taxon y tipo de catálogo
-        try:
-            # Buscar registros existentes
-            existing_response = supabase.table('taxon_catalogo_awe').select('id_taxon_catalogo_awe').eq('taxon_id', taxon_id).eq('catalogo_awe_id', id_catalogo_awe).execute()
-
-            if existing_response.data and len(existing_response.data) > 0:
-                # Ya existe, no hacer nada (o actualizar si es necesario)
-                actualizados += 1
-                print(f"  ✓ {nombre_cientifico}: Ya tiene Red List asignada (ID catálogo: {id_catalogo_awe})")
-            else:
-                # Crear nuevo registro
-                insert_response = supabase.table('taxon_catalogo_awe').insert({
-                    'taxon_id': taxon_id,
-                    'catalogo_awe_id': id_catalogo_awe
-                }).execute()
-
-                if insert_response.data:
-                    creados += 1
-                    # Obtener nombre del catálogo para mostrar
-                    cat_nombre = next((c['nombre'] for c in catalogo_response.data if c['id_catalogo_awe'] == id_catalogo_awe), 'N/A')
-                    print(f"  ✅ {nombre_cientifico}: {cat_nombre} (valor Excel: '{valor_red_list}')")
-                else:
-                    errores.append(nombre_cientifico)
-
-        except Exception as e:
-            errores.append(f"{nombre_cientifico}: {str(e)}")
-            print(f"  ❌ Error procesando {nombre_cientifico}: {str(e)}")
+        deseado[taxon_id] = id_catalogo_awe
+
+    # Reconciliar contra taxon_catalogo_awe en bloque
+    print("\n🔄 Reconciliando Lista Roja...")
+    plan, resultado = sync_red_list(supabase, deseado, modo=args.modo, dry_run=args.dry_run)
+
+    for fila in (plan.inserciones + plan.reasignaciones)[:20]:
+        print(f"  {'➕' if 'id_taxon_catalogo_awe' not in fila else '🔄'} "
+              f"{tax.scientific_name(fila['taxon_id'])}: {nombre_catalogo.get(fila['catalogo_awe_id'], 'N/A')}")
 
     # Resumen
-    print(f"\n📊 Resumen:")
-    print(f"  ✅ Actualizados (ya existían): {actualizados}")
-    print(f"  ➕ Creados: {creados}")
+    print(f"\n📊 Resumen{' (dry-run, sin escribir)' if args.dry_run else ''}:")
+    print(f"  ✅ Sin cambios (ya asignadas): {plan.sin_cambios}")
+    print(f"  ➕ Creados: {resultado.get('insertados', 0)}")
+    print(f"  🔄 Reasignados: {resultado.get('reasignados', 0)}")
+    print(f"  ➖ Duplicados eliminados: {resultado.get('eliminados', 0)}")
     print(f"  ⚠️  No encontrados: {len(no_encontrados)}")
     print(f"  ❓ Sin catálogo correspondiente: {len(sin_catalogo)}")
-    print(f"  ❌ Errores: {len(errores)}")
 
     if sin_catalogo:
         print(f"\n❓ Valores de Red List sin catálogo correspondiente (primeros 10):")
@@ -215,11 +156,6 @@ def main():
         for nombre in no_encontrados[:10]:
             print(f"    - {nombre}")
 
-    if errores:
-        print(f"\n❌ Errores:")
-        for error in errores[:10]:
-            print(f"    - {error}")
-
 if __name__ == "__main__":
     main()
 
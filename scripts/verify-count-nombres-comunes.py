@@ -7,6 +7,7 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
 from collections import defaultdict
 
 # Cargar variables de entorno
@@ -25,21 +26,23 @@ def main():
     
     # Obtener todas las especies de ficha_especie
     print("🔍 Obteniendo especies de ficha_especie...")
-    ficha_response = supabase.table('ficha_especie').select('taxon_id').execute()
-    taxon_ids = [f['taxon_id'] for f in ficha_response.data]
+    fichas = fetch_all(supabase, 'ficha_especie', 'taxon_id', key='id_ficha_especie')
+    taxon_ids = [f['taxon_id'] for f in fichas]
     print(f"  - Total especies: {len(taxon_ids)}")
     
     # Obtener todos los nombres comunes para estas especies
     print("\n🔍 Obteniendo nombres comunes...")
-    nombres_response = supabase.table('nombre_comun').select(
-        'id_nombre_comun, taxon_id, catalogo_awe_idioma_id, nombre'
-    ).in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]).execute()
+    nombres = fetch_all(
+        supabase, 'nombre_comun', 'id_nombre_comun, taxon_id, catalogo_awe_idioma_id, nombre',
+        key='id_nombre_comun',
+        where=lambda q: q.in_('taxon_id', taxon_ids).in_('catalogo_awe_idioma_id', [1, 8]),
+    )
     
-    print(f"  - Total registros: {len(nombres_response.data)}")
+    print(f"  - Total registros: {len(nombres)}")
     
     # Contar por idioma
     registros_por_especie_idioma = defaultdict(list)
-    for nc in nombres_response.data:
+    for nc in nombres:
         key = (nc['taxon_id'], nc['catalogo_awe_idioma_id'])
         registros_por_especie_idioma[key].append(nc)
     
@@ -7,6 +7,7 @@ import os
 import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from supabase_fetch import fetch_all
 
 # Cargar variables de entorno
 load_dotenv('.env.local')
@@ -64,15 +65,16 @@ def main():
 
     # Obtener todas las especies de la base de datos
     print("\n🔍 Obteniendo especies de la base de datos...")
-    response = supabase.table('taxon').select('id_taxon, taxon').eq('rank_id', 7).execute()
+    especies = fetch_all(supabase, 'taxon', 'id_taxon, taxon', key='id_taxon',
+                         where=lambda q: q.eq('rank_id', 7))
 
-    if not response.data:
+    if not especies:
         print("❌ Error: No se pudieron obtener las especies de la base de datos")
         sys.exit(1)
 
     # Crear mapa de nombre científico completo -> id_taxon
     taxon_map = {}
-    for taxon in response.data:
+    for taxon in especies:
         nombre = str(taxon['taxon']).strip()
         taxon_map[nombre] = taxon['id_taxon']
 
@@ -80,11 +82,14 @@ def main():
 
     # Obtener todas las especies con Lista Roja en la base de datos
     print("\n🔍 Obteniendo especies con Lista Roja en la base de datos...")
-    red_list_response = supabase.table('taxon_catalogo_awe').select('taxon_id, catalogo_awe!inner(tipo_catalogo_awe_id)').eq('catalogo_awe.tipo_catalogo_awe_id', 10).execute()
+    red_list = fetch_all(
+        supabase, 'taxon_catalogo_awe', 'taxon_id, catalogo_awe!inner(tipo_catalogo_awe_id)',
+        key='id_taxon_catalogo_awe', where=lambda q: q.eq('catalogo_awe.tipo_catalogo_awe_id', 10),
+    )
 
     taxon_ids_with_red_list = set()
-    if red_list_response.data:
-        for record in red_list_response.data:
+    if red_list:
+        for record in red_list:
             taxon_ids_with_red_list.add(record['taxon_id'])
 
     print(f"✅ Se encontraron {len(taxon_ids_with_red_list)} especies con Lista Roja en la base de datos")
@@ -0,0 +1,193 @@
+"""
+Título y meta description de páginas web, en paralelo y con caché en disco.
+
+La clasificación con --web (assign-sin-asignar-publicaciones.py) bajaba cada
+enlace en serie con urllib, leía el HTML completo y repetía todo en cada
+corrida. Aquí:
+- las URLs se agrupan por host y cada host tiene su cola con `por_host`
+  consumidores (httpx.AsyncClient, como gbif_harvester), así no se satura un
+  mismo servidor (muchos enlaces son de doi.org); un semáforo global deja a lo
+  sumo `workers` peticiones en curso. Un host lento solo frena su propia cola:
+  los cupos libres los toman las colas de los demás hosts;
+- el cuerpo se lee en streaming y se corta al ver </head> (o MAX_BYTES): el
+  título y la description están en el encabezado; lo que no es HTML (PDF,
+  imágenes) no se lee;
+- cada respuesta se guarda en .cache/web-metadata.json por URL con su ETag y
+  Last-Modified. Una entrada con menos de `frescura_dias` se usa sin red; una
+  más vieja se revalida con If-None-Match / If-Modified-Since y un 304 la
+  renueva sin bajar nada. Los errores de red no se guardan: se reintentan en
+  la siguiente corrida.
+
+Uso:
+    from web_metadata import obtener_metadatos
+
+    textos = obtener_metadatos(urls)     # url → 'título description' ('' si no hay)
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = ROOT_DIR / '.cache' / 'web-metadata.json'
+
+USER_AGENT = 'Mozilla/5.0 (compatible; Bot)'
+DEFAULT_WORKERS = 16
+DEFAULT_POR_HOST = 2
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_FRESCURA_DIAS = 7
+MAX_BYTES = 256 * 1024         # tope de lectura si la página no cierra </head>
+GUARDAR_CADA = 50              # respuestas entre escrituras de la caché
+
+TITLE_RE = re.compile(r"<title[^>]*>([^<]+)</title>", re.I)
+META_RE = (
+    re.compile(r'<meta[^>]+name=["\']description["\'][^>]+content=["\']([^"\']+)["\']', re.I),
+    re.compile(r'<meta[^>]+content=["\']([^"\']+)["\'][^>]+name=["\']description["\']', re.I),
+)
+
+
+def extraer_metadatos(html: str) -> str:
+    """'título description' del encabezado HTML ('' si no hay ninguno)."""
+    partes = []
+    title = TITLE_RE.search(html)
+    if title:
+        partes.append(title.group(1).strip())
+    meta = META_RE[0].search(html) or META_RE[1].search(html)
+    if meta:
+        partes.append(meta.group(1).strip())
+    return ' '.join(partes)
+
+
+# ─── Caché ────────────────────────────────────────────────────────────────────
+
+def leer_cache(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except ValueError:
+        log.warning(f'Caché ilegible, se descarta: {path}')
+        return {}
+
+
+def guardar_cache(path: Path, cache: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding='utf-8')
+    tmp.replace(path)
+
+
+def _fresca(entrada: dict | None, frescura_dias: float) -> bool:
+    return entrada is not None and time.time() - entrada.get('revisado', 0) < frescura_dias * 86400
+
+
+def _condicionales(entrada: dict | None) -> dict:
+    headers = {}
+    if entrada and entrada.get('etag'):
+        headers['If-None-Match'] = entrada['etag']
+    if entrada and entrada.get('last_modified'):
+        headers['If-Modified-Since'] = entrada['last_modified']
+    return headers
+
+
+# ─── Descarga ─────────────────────────────────────────────────────────────────
+
+async def _leer_encabezado(resp: httpx.Response) -> str:
+    """Lee el cuerpo hasta </head> o MAX_BYTES y lo decodifica."""
+    buffer = bytearray()
+    async for chunk in resp.aiter_bytes():
+        inicio = max(0, len(buffer) - 6)
+        buffer.extend(chunk)
+        if b'</head' in buffer[inicio:].lower() or len(buffer) >= MAX_BYTES:
+            break
+    return bytes(buffer).decode(resp.encoding or 'utf-8', errors='ignore')
+
+
+async def _obtener(client: httpx.AsyncClient, url: str, entrada: dict | None) -> tuple[dict, bool]:
+    """(entrada de caché para `url`, True si el servidor respondió 304 y se renovó la anterior)."""
+    async with client.stream('GET', url, headers=_condicionales(entrada)) as resp:
+        if resp.status_code == 304 and entrada is not None:
+            return {**entrada, 'revisado': time.time()}, True
+        texto = ''
+        tipo = resp.headers.get('content-type', '')
+        if resp.status_code == 200 and ('html' in tipo or not tipo):
+            texto = extraer_metadatos(await _leer_encabezado(resp))
+        return {
+            'status': resp.status_code,
+            'texto': texto,
+            'etag': resp.headers.get('etag'),
+            'last_modified': resp.headers.get('last-modified'),
+            'revisado': time.time(),
+        }, False
+
+
+async def _obtener_todos(urls: list[str], cache: dict, cache_path: Path, workers: int, por_host: int,
+                         timeout: float) -> dict:
+    colas: dict[str, deque] = defaultdict(deque)
+    for url in urls:
+        colas[urlsplit(url).netloc.lower()].append(url)
+    en_curso = asyncio.Semaphore(workers)
+    stats = {'descargadas': 0, 'revalidadas': 0, 'errores': 0}
+    pendientes_guardar = 0
+
+    async with httpx.AsyncClient(
+        headers={'User-Agent': USER_AGENT},
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+    ) as client:
+
+        async def consumidor(cola: deque):
+            nonlocal pendientes_guardar
+            while cola:
+                url = cola.popleft()
+                try:
+                    async with en_curso:
+                        entrada, sin_cambios = await _obtener(client, url, cache.get(url))
+                except (httpx.HTTPError, httpx.InvalidURL, UnicodeError) as e:
+                    stats['errores'] += 1
+                    log.warning(f'[web] Error al obtener {url[:60]}: {type(e).__name__}: {e}')
+                    continue
+                stats['revalidadas' if sin_cambios else 'descargadas'] += 1
+                cache[url] = entrada
+                pendientes_guardar += 1
+                if pendientes_guardar >= GUARDAR_CADA:
+                    pendientes_guardar = 0
+                    guardar_cache(cache_path, cache)
+
+        # por_host consumidores por host: nunca hay más peticiones simultáneas a un mismo host
+        await asyncio.gather(*(consumidor(cola) for cola in colas.values()
+                               for _ in range(min(por_host, len(cola)))))
+
+    guardar_cache(cache_path, cache)
+    return stats
+
+
+def obtener_metadatos(urls, cache_path: Path = CACHE_PATH, workers: int = DEFAULT_WORKERS,
+                      por_host: int = DEFAULT_POR_HOST, timeout: float = DEFAULT_TIMEOUT,
+                      frescura_dias: float = DEFAULT_FRESCURA_DIAS) -> dict[str, str]:
+    """
+    url → texto ('título description') para cada URL http(s) de `urls`.
+    Las que fallan quedan fuera del resultado.
+    """
+    cache_path = Path(cache_path)
+    cache = leer_cache(cache_path)
+    urls = list(dict.fromkeys(u for u in urls if u and u.startswith('http')))
+    por_revisar = [u for u in urls if not _fresca(cache.get(u), frescura_dias)]
+
+    if por_revisar:
+        log.info(f'[web] {len(urls) - len(por_revisar)} URLs desde caché, {len(por_revisar)} por revisar')
+        stats = asyncio.run(_obtener_todos(por_revisar, cache, cache_path, workers, por_host, timeout))
+        log.info(f"[web] descargadas {stats['descargadas']}, sin cambios (304) {stats['revalidadas']}, "
+                 f"errores {stats['errores']}")
+
+    return {u: cache[u].get('texto', '') for u in urls if u in cache}
@@ -0,0 +1,28 @@
+-- ============================================================================
+-- actualizar_fechas_coleccion_externa: backfill masivo de fechas desde GBIF
+-- Recibe un arreglo jsonb [{"id": 1, "fecha": "2015-03-21"}, ...] y lo aplica
+-- con un único UPDATE ... FROM por llamada (un chunk de
+-- scripts/update-fechas-gbif-bulk.py --modo rpc).
+-- Solo rellena fechas vacías, para no pisar ediciones manuales hechas mientras
+-- el script corría. Devuelve el número de filas actualizadas.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.actualizar_fechas_coleccion_externa(p_pares jsonb)
+RETURNS integer
+LANGUAGE sql
+SET search_path = public
+AS $$
+  WITH datos AS (
+    SELECT d.id, d.fecha
+    FROM jsonb_populate_recordset(NULL::public.coleccion_externa, p_pares) d
+  ),
+  actualizados AS (
+    UPDATE public.coleccion_externa ce
+    SET fecha = datos.fecha
+    FROM datos
+    WHERE ce.id = datos.id
+      AND ce.fecha IS NULL
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM actualizados;
+$$;
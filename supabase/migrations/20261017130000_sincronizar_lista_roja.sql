@@ -0,0 +1,78 @@
+-- ============================================================================
+-- sincronizar_lista_roja: asignación de Lista Roja UICN en una transacción
+-- Recibe el estado deseado [{"taxon_id": 1, "catalogo_awe_id": 2}, ...] y
+-- reconcilia las filas de taxon_catalogo_awe cuyo catálogo es de tipo 10:
+--   - cada especie queda con una sola fila de Lista Roja (se conserva la que ya
+--     tiene la categoría deseada o, si no, la de id más bajo; el resto se borra),
+--   - la fila conservada se reasigna a la categoría deseada
+--     (salvo p_solo_faltantes = true, que solo completa especies sin categoría),
+--   - las especies deseadas sin fila se insertan.
+-- Un advisory lock serializa ejecuciones concurrentes, así que dos scripts no
+-- pueden crear duplicados a la vez. Las especies que no vienen en
+-- p_asignaciones conservan su categoría (solo se eliminan sus duplicados).
+-- Lo usa scripts/red_list_sync.py (--modo rpc).
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.sincronizar_lista_roja(
+  p_asignaciones jsonb,
+  p_solo_faltantes boolean DEFAULT false
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_eliminados integer := 0;
+  v_reasignados integer := 0;
+  v_insertados integer := 0;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('public.sincronizar_lista_roja'));
+
+  CREATE TEMP TABLE _lista_roja_deseada ON COMMIT DROP AS
+  SELECT DISTINCT ON (d.taxon_id) d.taxon_id, d.catalogo_awe_id
+  FROM jsonb_to_recordset(p_asignaciones) AS d(taxon_id bigint, catalogo_awe_id bigint);
+
+  CREATE TEMP TABLE _lista_roja_actual ON COMMIT DROP AS
+  SELECT tc.id_taxon_catalogo_awe,
+         tc.taxon_id,
+         tc.catalogo_awe_id,
+         d.catalogo_awe_id AS catalogo_deseado,
+         row_number() OVER (
+           PARTITION BY tc.taxon_id
+           ORDER BY (tc.catalogo_awe_id = d.catalogo_awe_id) IS TRUE DESC, tc.id_taxon_catalogo_awe
+         ) AS orden
+  FROM taxon_catalogo_awe tc
+  JOIN catalogo_awe c ON c.id_catalogo_awe = tc.catalogo_awe_id
+  LEFT JOIN _lista_roja_deseada d ON d.taxon_id = tc.taxon_id
+  WHERE c.tipo_catalogo_awe_id = 10;
+
+  DELETE FROM taxon_catalogo_awe tc
+  USING _lista_roja_actual a
+  WHERE tc.id_taxon_catalogo_awe = a.id_taxon_catalogo_awe
+    AND a.orden > 1;
+  GET DIAGNOSTICS v_eliminados = ROW_COUNT;
+
+  IF NOT p_solo_faltantes THEN
+    UPDATE taxon_catalogo_awe tc
+    SET catalogo_awe_id = a.catalogo_deseado
+    FROM _lista_roja_actual a
+    WHERE tc.id_taxon_catalogo_awe = a.id_taxon_catalogo_awe
+      AND a.orden = 1
+      AND a.catalogo_deseado IS NOT NULL
+      AND a.catalogo_awe_id <> a.catalogo_deseado;
+    GET DIAGNOSTICS v_reasignados = ROW_COUNT;
+  END IF;
+
+  INSERT INTO taxon_catalogo_awe (taxon_id, catalogo_awe_id)
+  SELECT d.taxon_id, d.catalogo_awe_id
+  FROM _lista_roja_deseada d
+  WHERE NOT EXISTS (SELECT 1 FROM _lista_roja_actual a WHERE a.taxon_id = d.taxon_id);
+  GET DIAGNOSTICS v_insertados = ROW_COUNT;
+
+  RETURN jsonb_build_object(
+    'eliminados', v_eliminados,
+    'reasignados', v_reasignados,
+    'insertados', v_insertados
+  );
+END;
+$$;
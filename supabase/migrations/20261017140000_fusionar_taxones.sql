@@ -0,0 +1,161 @@
+-- ============================================================================
+-- fusionar_taxones: elimina o fusiona taxones en una sola transacción
+-- Recibe [{"id_taxon": 10, "id_taxon_destino": 3}, {"id_taxon": 11, "id_taxon_destino": null}, ...]
+--   - con destino: todo lo que apunta al taxon pasa al destino y el taxon se
+--     borra. Las filas que el destino ya tiene (misma categoría, geopolítica,
+--     publicación, nombre común o ficha) se descartan en lugar de duplicarse;
+--     una segunda categoría de Lista Roja (tipo 10) también.
+--   - sin destino: se borran sus filas de taxon_catalogo_awe, ficha_especie,
+--     nombre_comun, taxon_geopolitica y taxon_publicacion, y luego el taxon.
+--     Si otra tabla (fotografías, colecciones, taxones hijos...) aún lo
+--     referencia, la llamada falla y no se aplica nada.
+-- La reasignación recorre todas las FK de una columna que apuntan a
+-- taxon(id_taxon), así que cubre tablas nuevas sin tocar esta función.
+-- Devuelve las filas afectadas por tabla: {"tabla.accion": n, ...}.
+-- Lo usa scripts/taxon_dedup.py (clean-duplicate-species.py).
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.fusionar_taxones(p_pares jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_resumen jsonb := '{}'::jsonb;
+  v_filas integer;
+  r record;
+BEGIN
+  CREATE TEMP TABLE _fusion ON COMMIT DROP AS
+  SELECT DISTINCT ON (p.id_taxon) p.id_taxon, p.id_taxon_destino
+  FROM jsonb_to_recordset(p_pares) AS p(id_taxon bigint, id_taxon_destino bigint)
+  WHERE p.id_taxon IS DISTINCT FROM p.id_taxon_destino;
+
+  IF EXISTS (SELECT 1 FROM _fusion f JOIN _fusion g ON g.id_taxon = f.id_taxon_destino) THEN
+    RAISE EXCEPTION 'fusionar_taxones: un id_taxon_destino también está marcado para eliminar';
+  END IF;
+
+  PERFORM 1 FROM taxon t
+  WHERE t.id_taxon IN (SELECT id_taxon FROM _fusion UNION SELECT id_taxon_destino FROM _fusion)
+  FOR UPDATE;
+
+  -- taxon_catalogo_awe: descartar lo que el destino ya tiene y, en eliminaciones, todo
+  DELETE FROM taxon_catalogo_awe tc
+  USING _fusion f, catalogo_awe c
+  WHERE tc.taxon_id = f.id_taxon
+    AND c.id_catalogo_awe = tc.catalogo_awe_id
+    AND (f.id_taxon_destino IS NULL
+         OR EXISTS (SELECT 1
+                    FROM taxon_catalogo_awe k
+                    JOIN catalogo_awe kc ON kc.id_catalogo_awe = k.catalogo_awe_id
+                    WHERE k.taxon_id = f.id_taxon_destino
+                      AND (k.catalogo_awe_id = tc.catalogo_awe_id
+                           OR (c.tipo_catalogo_awe_id = 10 AND kc.tipo_catalogo_awe_id = 10))));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('taxon_catalogo_awe.eliminadas', v_filas);
+
+  -- Varios duplicados con la misma categoría hacia un mismo destino: queda la de id más bajo
+  DELETE FROM taxon_catalogo_awe tc
+  USING _fusion f, catalogo_awe c
+  WHERE tc.taxon_id = f.id_taxon
+    AND c.id_catalogo_awe = tc.catalogo_awe_id
+    AND EXISTS (SELECT 1
+                FROM taxon_catalogo_awe o
+                JOIN _fusion g ON g.id_taxon = o.taxon_id
+                JOIN catalogo_awe oc ON oc.id_catalogo_awe = o.catalogo_awe_id
+                WHERE g.id_taxon_destino = f.id_taxon_destino
+                  AND o.id_taxon_catalogo_awe < tc.id_taxon_catalogo_awe
+                  AND (o.catalogo_awe_id = tc.catalogo_awe_id
+                       OR (c.tipo_catalogo_awe_id = 10 AND oc.tipo_catalogo_awe_id = 10)));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object(
+    'taxon_catalogo_awe.eliminadas', (v_resumen->>'taxon_catalogo_awe.eliminadas')::integer + v_filas);
+
+  -- ficha_especie: una por taxon; si el destino ya tiene, se borra la del duplicado
+  DELETE FROM ficha_especie fe
+  USING _fusion f
+  WHERE fe.taxon_id = f.id_taxon
+    AND (f.id_taxon_destino IS NULL
+         OR EXISTS (SELECT 1 FROM ficha_especie k WHERE k.taxon_id = f.id_taxon_destino)
+         OR EXISTS (SELECT 1
+                    FROM ficha_especie o
+                    JOIN _fusion g ON g.id_taxon = o.taxon_id
+                    WHERE g.id_taxon_destino = f.id_taxon_destino
+                      AND o.id_ficha_especie < fe.id_ficha_especie));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('ficha_especie.eliminadas', v_filas);
+
+  DELETE FROM nombre_comun nc
+  USING _fusion f
+  WHERE nc.taxon_id = f.id_taxon
+    AND (f.id_taxon_destino IS NULL
+         OR EXISTS (SELECT 1
+                    FROM nombre_comun k
+                    WHERE k.taxon_id = f.id_taxon_destino
+                      AND k.catalogo_awe_idioma_id IS NOT DISTINCT FROM nc.catalogo_awe_idioma_id
+                      AND lower(trim(k.nombre)) = lower(trim(nc.nombre))));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('nombre_comun.eliminadas', v_filas);
+
+  DELETE FROM taxon_geopolitica tg
+  USING _fusion f
+  WHERE tg.taxon_id = f.id_taxon
+    AND (f.id_taxon_destino IS NULL
+         OR EXISTS (SELECT 1
+                    FROM taxon_geopolitica k
+                    WHERE k.taxon_id = f.id_taxon_destino
+                      AND k.geopolitica_id = tg.geopolitica_id));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('taxon_geopolitica.eliminadas', v_filas);
+
+  DELETE FROM taxon_publicacion tp
+  USING _fusion f
+  WHERE tp.taxon_id = f.id_taxon
+    AND (f.id_taxon_destino IS NULL
+         OR EXISTS (SELECT 1
+                    FROM taxon_publicacion k
+                    WHERE k.taxon_id = f.id_taxon_destino
+                      AND k.publicacion_id = tp.publicacion_id));
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('taxon_publicacion.eliminadas', v_filas);
+
+  -- Reasignar al destino todo lo que todavía apunta a los taxones fusionados
+  FOR r IN
+    SELECT cl.relname AS tabla, a.attname AS columna
+    FROM pg_constraint con
+    JOIN pg_class cl ON cl.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = cl.relnamespace
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+    WHERE con.contype = 'f'
+      AND con.confrelid = 'public.taxon'::regclass
+      AND cardinality(con.conkey) = 1
+      AND n.nspname = 'public'
+    ORDER BY 1, 2
+  LOOP
+    EXECUTE format(
+      'UPDATE public.%I t SET %I = f.id_taxon_destino
+       FROM _fusion f
+       WHERE t.%I = f.id_taxon AND f.id_taxon_destino IS NOT NULL',
+      r.tabla, r.columna, r.columna);
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    IF v_filas > 0 THEN
+      v_resumen := v_resumen || jsonb_build_object(r.tabla || '.' || r.columna || '.reasignadas', v_filas);
+    END IF;
+  END LOOP;
+
+  -- Sinónimos que apuntaban al taxon eliminado
+  UPDATE taxon t
+  SET id_taxon_correcto = f.id_taxon_destino
+  FROM _fusion f
+  WHERE t.id_taxon_correcto = f.id_taxon;
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('taxon.id_taxon_correcto.reasignadas', v_filas);
+
+  DELETE FROM taxon t
+  USING _fusion f
+  WHERE t.id_taxon = f.id_taxon;
+  GET DIAGNOSTICS v_filas = ROW_COUNT;
+  v_resumen := v_resumen || jsonb_build_object('taxon.eliminadas', v_filas);
+
+  RETURN v_resumen;
+END;
+$$;
@@ -0,0 +1,18 @@
+-- ============================================================================
+-- nombre_comun: clave natural (taxon_id, catalogo_awe_idioma_id, nombre)
+-- Las cargas de nombres comunes insertaban sin comprobar, así que repetir una
+-- carga duplicaba filas. Primero se borran las repeticiones exactas (queda la
+-- de id más bajo) y luego se crea el índice único que usa el upsert de
+-- scripts/common_names_sync.py (load-nombres-comunes-multiidioma-from-excel.py).
+-- Un taxon puede seguir teniendo varios nombres distintos por idioma.
+-- ============================================================================
+
+DELETE FROM public.nombre_comun a
+USING public.nombre_comun b
+WHERE a.taxon_id = b.taxon_id
+  AND a.catalogo_awe_idioma_id = b.catalogo_awe_idioma_id
+  AND a.nombre = b.nombre
+  AND a.id_nombre_comun > b.id_nombre_comun;
+
+CREATE UNIQUE INDEX IF NOT EXISTS nombre_comun_taxon_idioma_nombre_key
+  ON public.nombre_comun (taxon_id, catalogo_awe_idioma_id, nombre);
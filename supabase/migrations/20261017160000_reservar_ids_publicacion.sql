@@ -0,0 +1,37 @@
+-- ============================================================================
+-- reservar_ids_publicacion: reserva un bloque de id_publicacion
+-- La carga masiva de publicaciones (scripts/load-publicaciones-from-excel.py)
+-- arma en memoria las publicaciones y sus filas hijas (año, catálogo,
+-- autores) antes de insertar nada, así que necesita los ids de antemano.
+-- Primero sube la secuencia por encima del id más alto ya usado y de
+-- p_minimo (ids que el Excel fuerza), de modo que la reserva no choque con
+-- ellos, y luego toma p_cantidad valores. nextval no se revierte: un id
+-- reservado que al final no se usa queda como hueco.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION public.reservar_ids_publicacion(p_cantidad integer, p_minimo bigint DEFAULT 0)
+RETURNS SETOF bigint
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+  v_seq text := pg_get_serial_sequence('public.publicacion', 'id_publicacion');
+  v_max bigint;
+BEGIN
+  IF v_seq IS NULL THEN
+    RAISE EXCEPTION 'reservar_ids_publicacion: publicacion.id_publicacion no tiene secuencia';
+  END IF;
+
+  -- Serializa reservas concurrentes mientras se ajusta la secuencia
+  PERFORM pg_advisory_xact_lock(hashtext('reservar_ids_publicacion'));
+
+  SELECT greatest(coalesce(max(id_publicacion), 0), coalesce(p_minimo, 0)) INTO v_max FROM publicacion;
+  IF v_max > 0 THEN
+    PERFORM setval(v_seq, greatest(v_max, (SELECT last_value FROM pg_sequences
+                                           WHERE format('%I.%I', schemaname, sequencename)::regclass
+                                                 = v_seq::regclass)));
+  END IF;
+
+  RETURN QUERY SELECT nextval(v_seq) FROM generate_series(1, greatest(p_cantidad, 0));
+END;
+$$;